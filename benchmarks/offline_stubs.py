@@ -0,0 +1,265 @@
+"""
+Sustitutos locales y deterministas de Gemini, Vertex AI Search y DuckDuckGo.
+
+Permiten ejecutar el equipo real (``build_team`` + ``get_all_agents``, agno,
+SQLite, telemetría...) sin red: sólo se reemplaza el último salto a cada
+servicio externo, con una latencia artificial configurable.
+
+- Gemini: cliente ``google.genai`` falso que devuelve ``GenerateContentResponse``
+  reales. El orquestador delega en los miembros (``transfer_task_to_member``)
+  y los agentes con herramientas llaman a su primera herramienta antes de
+  responder, de modo que se recorren los mismos caminos que en producción.
+- Vertex AI Search: ``SearchServiceClient`` y ``SearchServiceAsyncClient`` falsos
+  con documentos sintéticos (segmentos extractivos o chunks si la petición los pide).
+- DuckDuckGo: ``DDGS`` falso con resultados sintéticos.
+
+Uso:
+    from benchmarks.offline_stubs import StubLatency, install_stubs
+    stats = install_stubs(StubLatency(model_ms=50, search_ms=20, web_ms=30))
+"""
+import contextvars
+import threading
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+# Miembros a los que delega el orquestador falso (member_id de agno)
+RESEARCH_MEMBERS = ["rag-agent", "web-agent"]
+CODE_MEMBER = "code-standards-agent"
+CODE_KEYWORDS = ("código", "codigo", "code", "pyspark", "sql", "script", "dag")
+
+
+@dataclass
+class StubLatency:
+    """Latencia artificial (ms) de cada servicio y tamaño de las respuestas."""
+    model_ms: float = 50.0
+    search_ms: float = 20.0
+    web_ms: float = 30.0
+    response_words: int = 120
+
+
+# Acumulador del turno en curso; viaja con el contexto a los hilos del fan-out paralelo
+_turn_simulated: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar(
+    "turn_simulated", default=None
+)
+
+
+@dataclass
+class StubStats:
+    """Llamadas a cada servicio y latencia simulada del turno en curso."""
+    calls: Dict[str, int] = field(default_factory=lambda: {"model": 0, "search": 0, "web": 0})
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def begin_turn(self) -> List[float]:
+        """Empieza a acumular la latencia simulada del turno (en segundos)."""
+        holder = [0.0]
+        _turn_simulated.set(holder)
+        return holder
+
+    def sleep(self, kind: str, ms: float) -> None:
+        with self._lock:
+            self.calls[kind] += 1
+        if ms > 0:
+            time.sleep(ms / 1000)
+        holder = _turn_simulated.get()
+        if holder is not None:
+            with self._lock:
+                holder[0] += ms / 1000
+
+
+def _words(prefix: str, count: int) -> str:
+    filler = "pipeline particionado idempotente con validación de calidad y linaje".split()
+    return prefix + " " + " ".join(filler[i % len(filler)] for i in range(count))
+
+
+def _config_value(config, name: str):
+    if config is None:
+        return None
+    if isinstance(config, dict):
+        return config.get(name)
+    return getattr(config, name, None)
+
+
+def _function_names(config) -> List[str]:
+    names = []
+    for tool in _config_value(config, "tools") or []:
+        declarations = _config_value(tool, "function_declarations") or []
+        names.extend(_config_value(declaration, "name") for declaration in declarations)
+    return [name for name in names if name]
+
+
+def _conversation_state(contents) -> SimpleNamespace:
+    """Última consulta de usuario y cuántas respuestas de herramientas llegaron después."""
+    query, tool_results = "", 0
+    for content in reversed(contents or []):
+        parts = _config_value(content, "parts") or []
+        if any(_config_value(part, "function_response") is not None for part in parts):
+            tool_results += 1
+            continue
+        if _config_value(content, "role") == "user":
+            query = " ".join(_config_value(part, "text") or "" for part in parts)
+            break
+    return SimpleNamespace(query=query, tool_results=tool_results)
+
+
+class _StubModels:
+    """Equivalente a ``client.models`` de ``google.genai``."""
+
+    def __init__(self, latency: StubLatency, stats: StubStats):
+        self.latency = latency
+        self.stats = stats
+
+    def _response(self, model: str, contents, config):
+        from google.genai import types
+
+        self.stats.sleep("model", self.latency.model_ms)
+        state = _conversation_state(contents)
+        functions = _function_names(config)
+        part = None
+
+        if "transfer_task_to_member" in functions:
+            members = list(RESEARCH_MEMBERS)
+            if any(keyword in state.query.lower() for keyword in CODE_KEYWORDS):
+                members.append(CODE_MEMBER)
+            if state.tool_results < len(members):
+                part = types.Part(function_call=types.FunctionCall(
+                    name="transfer_task_to_member",
+                    args={
+                        "member_id": members[state.tool_results],
+                        "task_description": state.query[:300],
+                        "expected_output": "Hallazgos relevantes",
+                    },
+                ))
+        elif functions and state.tool_results == 0:
+            part = types.Part(function_call=types.FunctionCall(name=functions[0], args={"query": state.query[:200]}))
+
+        if part is None:
+            part = types.Part(text=_words(f"[{model}]", self.latency.response_words))
+
+        prompt_tokens = len(str(contents)) // 4 + len(str(_config_value(config, "system_instruction") or "")) // 4
+        output_tokens = self.latency.response_words if part.text else 20
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(
+                content=types.Content(role="model", parts=[part]),
+                finish_reason="STOP",
+            )],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+            ),
+        )
+
+    def generate_content(self, model: str, contents=None, config=None, **kwargs):
+        return self._response(model, contents, config)
+
+    def generate_content_stream(self, model: str, contents=None, config=None, **kwargs):
+        yield self._response(model, contents, config)
+
+
+class StubGenAIClient:
+    def __init__(self, latency: StubLatency, stats: StubStats):
+        self.models = _StubModels(latency, stats)
+
+
+class _StubChunk(SimpleNamespace):
+    """``Chunk`` de Discovery Engine (``"campo" in chunk`` indica si un campo opcional viene)."""
+
+    def __contains__(self, name: str) -> bool:
+        return getattr(self, name, None) is not None
+
+
+class StubSearchServiceClient:
+    """``SearchServiceClient.search`` con documentos sintéticos."""
+
+    def __init__(self, latency: StubLatency, stats: StubStats):
+        self.latency = latency
+        self.stats = stats
+
+    def _results(self, request):
+        query = getattr(request, "query", "")
+        page_size = getattr(request, "page_size", 3) or 3
+        spec = getattr(request, "content_search_spec", None)
+        chunks = spec is not None and spec.search_result_mode == spec.SearchResultMode.CHUNKS
+        segments = spec.extractive_content_spec.max_extractive_segment_count if spec is not None else 0
+        results = []
+        for i in range(page_size):
+            document_id, title, score = f"book-{i + 1}", f"Libro {i + 1}", round(0.9 - 0.1 * i, 2)
+            text = _words(f"Libro {i + 1} sobre '{query}':", 80) + "."
+            data = {"title": title}
+            if segments:
+                data["extractive_segments"] = [
+                    {"content": _words(f"Segmento {j + 1} del libro {i + 1}:", 40) + ".", "relevanceScore": score - 0.05 * j}
+                    for j in range(segments)
+                ]
+            else:
+                data["content"] = text
+            results.append(SimpleNamespace(
+                id=document_id,
+                document=SimpleNamespace(id=document_id, derived_struct_data=data),
+                chunk=_StubChunk(
+                    id=f"{document_id}-c1", content=text, relevance_score=score,
+                    document_metadata=SimpleNamespace(title=title, uri=""),
+                ) if chunks else None,
+                model_scores={"relevance_score": SimpleNamespace(values=[score])},
+            ))
+        return SimpleNamespace(results=results)
+
+    def search(self, request=None, **kwargs):
+        self.stats.sleep("search", self.latency.search_ms)
+        return self._results(request)
+
+
+class StubSearchServiceAsyncClient(StubSearchServiceClient):
+    """``SearchServiceAsyncClient.search``: la espera no bloquea el event loop."""
+
+    async def search(self, request=None, **kwargs):
+        import asyncio
+
+        with self.stats._lock:
+            self.stats.calls["search"] += 1
+        await asyncio.sleep(self.latency.search_ms / 1000)
+        return self._results(request)
+
+
+def make_stub_ddgs(latency: StubLatency, stats: StubStats):
+    """Clase compatible con ``ddgs.DDGS`` (context manager con ``text`` y ``news``)."""
+
+    class StubDDGS:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def text(self, query: str, max_results: int = 5, **kwargs):
+            stats.sleep("web", latency.web_ms)
+            return [
+                {"title": f"Doc {i + 1}: {query}", "href": f"https://example.com/{i}", "body": _words("", 40)}
+                for i in range(max_results or 5)
+            ]
+
+        news = text
+
+    return StubDDGS
+
+
+def install_stubs(latency: Optional[StubLatency] = None) -> StubStats:
+    """Reemplaza los clientes externos en el proceso actual y devuelve los contadores."""
+    import agno.tools.duckduckgo as duckduckgo
+    import src.tools.vector_embedding as vector_embedding
+    from src.agents.models import RateLimitedGemini
+
+    latency = latency or StubLatency()
+    stats = StubStats()
+    genai_client = StubGenAIClient(latency, stats)
+
+    RateLimitedGemini.get_client = lambda self: genai_client
+    vector_embedding._search_client = StubSearchServiceClient(latency, stats)
+    vector_embedding._async_search_client = StubSearchServiceAsyncClient(latency, stats)
+    duckduckgo.DDGS = make_stub_ddgs(latency, stats)
+    return stats
@@ -0,0 +1,147 @@
+"""
+Benchmark del prefijo estático de los system prompts (caché de contexto de Gemini).
+
+- Modo offline (por defecto, sin red): construye dos equipos con usuarios y
+  sesiones distintos, con los stubs de ``offline_stubs``, y comprueba que el
+  system prompt del orquestador y de cada agente comparte un prefijo idéntico
+  byte a byte hasta ``SESSION_CONTEXT_TAG``. Reporta los tokens estimados del
+  prefijo (cacheable) y de la cola variable. Sale con código 1 si algún prefijo
+  difiere o si el contexto de sesión aparece antes de la marca.
+- ``--live N``: N consultas reales con la caché de contexto desactivada y luego
+  activada; compara tokens de entrada, tokens en caché y el tiempo hasta el
+  primer token (TTFT) a partir de la telemetría. Necesita credenciales.
+
+Uso:
+    python benchmarks/prompt_prefix.py
+    python benchmarks/prompt_prefix.py --live 5 [--json-output resultados.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LIVE_QUERIES = [
+    "¿Qué estrategia de particionado recomiendas para una tabla de eventos de 5 TB en BigQuery?",
+    "¿Cuándo conviene usar Z-ordering en Delta Lake?",
+    "Diferencias entre SCD tipo 2 y snapshots en dbt",
+    "¿Cómo dimensionar los shuffle partitions de Spark?",
+    "Buenas prácticas para backfills idempotentes en Airflow",
+]
+
+
+def system_messages(team, user: str, session_id: str) -> Dict[str, str]:
+    """System prompt de cada componente tal como se envía a Gemini en un turno."""
+    from src.core.runner import prepare_turn
+    from src.core.team_builder import unwrap_team
+
+    prepare_turn(team, user, session_id)
+    inner = unwrap_team(team)
+    messages = {"Orquestador": inner.get_system_message(session_id=session_id, user_id=user).content}
+    for member in inner.members:
+        message = member.get_system_message(session_id=session_id, user_id=user)
+        messages[member.name] = message.content if message else ""
+    return messages
+
+
+def offline_benchmark() -> Dict:
+    from benchmarks.offline_stubs import install_stubs
+
+    install_stubs()
+    from src.agents.models import split_static_prefix
+    from src.core.team_builder import build_team, generate_session_id
+    from src.storage.turns import estimate_tokens
+
+    snapshots = []
+    for user in ("bench_user_a", "bench_user_b"):
+        session_id = generate_session_id(user)
+        snapshots.append((user, session_id, system_messages(build_team(user, session_id), user, session_id)))
+
+    rows: List[Dict] = []
+    for name, first in snapshots[0][2].items():
+        second = snapshots[1][2].get(name, "")
+        prefix_a, tail_a = split_static_prefix(first)
+        prefix_b, _ = split_static_prefix(second)
+        leaked = any(value in prefix_a for value in snapshots[0][:2])
+        rows.append({
+            "component": name,
+            "identical": prefix_a == prefix_b and bool(tail_a) and not leaked,
+            "prefix_tokens": estimate_tokens(prefix_a),
+            "tail_tokens": estimate_tokens(tail_a),
+        })
+    return {"components": rows, "ok": all(row["identical"] for row in rows)}
+
+
+def live_benchmark(count: int) -> Dict:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    from src.config import settings
+    from src.core.runner import run_turn
+    from src.core.team_builder import build_team, generate_session_id
+    from src.core.telemetry import component_stats
+
+    settings.require_gcp()
+    queries = (LIVE_QUERIES * (count // len(LIVE_QUERIES) + 1))[:count]
+    results = []
+    for enabled in (False, True):
+        settings.gemini_context_cache_enabled = enabled
+        user = f"bench_prefix_{'cache' if enabled else 'nocache'}"
+        session_id = generate_session_id(user)
+        team = build_team(user, session_id)
+        for query in queries:
+            run_turn(team, query, user, session_id)
+        models = [row for row in component_stats(since_hours=1, user=user) if row.kind == "model"]
+        first_tokens = [row.first_token_p50_ms for row in models if row.first_token_p50_ms is not None]
+        results.append({
+            "context_cache": "on" if enabled else "off",
+            "calls": sum(row.count for row in models),
+            "input_tokens": sum(row.input_tokens for row in models),
+            "cached_tokens": sum(row.cached_tokens for row in models),
+            "first_token_p50_ms": round(max(first_tokens), 1) if first_tokens else None,
+            "model_p50_ms": round(max((row.p50_ms for row in models), default=0.0), 1),
+        })
+    return {"live": results}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", type=int, default=0, help="Consultas reales por modo (necesita credenciales)")
+    parser.add_argument("--json-output", help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AGNO_TELEMETRY", "false")
+    if args.live:
+        summary = live_benchmark(args.live)
+        print(f"{'caché':<8} {'llamadas':>9} {'tokens in':>10} {'en caché':>10} {'TTFT p50':>10} {'p50 ms':>10}")
+        for row in summary["live"]:
+            print(f"{row['context_cache']:<8} {row['calls']:>9} {row['input_tokens']:>10} {row['cached_tokens']:>10} "
+                  f"{str(row['first_token_p50_ms']):>10} {row['model_p50_ms']:>10}")
+        ok = True
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ.update({
+                "DB_FILE_PATH": os.path.join(tmp, "agents.db"),
+                "GOOGLE_PROJECT_ID": "bench-project",
+                "GOOGLE_API_KEY": "bench-key",
+                "DATA_STORE_ID": "bench-datastore",
+            })
+            summary = offline_benchmark()
+        print(f"{'componente':<24} {'prefijo idéntico':>17} {'tokens prefijo':>15} {'tokens cola':>12}")
+        for row in summary["components"]:
+            mark = "sí" if row["identical"] else "NO"
+            print(f"{row['component']:<24} {mark:>17} {row['prefix_tokens']:>15} {row['tail_tokens']:>12}")
+        ok = summary["ok"]
+
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
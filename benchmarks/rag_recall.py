@@ -0,0 +1,197 @@
+"""
+Benchmark de recall y latencia del índice vectorial local frente a Vertex AI Search.
+
+Dos modos:
+
+- ``--synthetic N``: corpus aleatorio de N vectores agrupados (sin red ni
+  credenciales). Compara la búsqueda exacta con el IVF (recall@k y latencia).
+- ``--queries archivo``: consultas reales (una por línea o lista JSON) contra el
+  índice construido con ``build-local-index``. Mide latencia del índice local
+  (exacto e IVF) y de Vertex, recall@k del IVF frente al exacto y el solapamiento
+  con Vertex: fracción de pasajes de Vertex con un pasaje local parecido
+  (Jaccard de palabras >= ``--overlap-threshold``).
+
+Uso:
+    python benchmarks/rag_recall.py --synthetic 200000 --dims 768 --nlist 512 --nprobe 8
+    python benchmarks/rag_recall.py --queries consultas.txt [--index-dir tmp/local_index]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORD = re.compile(r"\w+")
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def timed(call):
+    start = time.perf_counter()
+    result = call()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def recall(approx: Sequence[int], exact: Sequence[int]) -> float:
+    return len(set(approx) & set(exact)) / len(exact) if exact else 1.0
+
+
+def jaccard(a: str, b: str) -> float:
+    left, right = set(WORD.findall(a.lower())), set(WORD.findall(b.lower()))
+    return len(left & right) / len(left | right) if left and right else 0.0
+
+
+def latency_row(name: str, values: List[float]) -> Dict:
+    return {"backend": name, "p50_ms": round(percentile(values, 50), 2), "p95_ms": round(percentile(values, 95), 2)}
+
+
+def synthetic_benchmark(args) -> Dict:
+    """Corpus aleatorio agrupado en clusters: recall y latencia sin red."""
+    from src.tools.local_index import LocalVectorIndex, write_index
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((max(16, args.nlist), args.dims)).astype(np.float32)
+
+    def sample(count: int) -> np.ndarray:
+        points = centers[rng.integers(0, len(centers), count)] + 0.6 * rng.standard_normal((count, args.dims))
+        return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+    chunks = ((f"doc_{i // 100}", f"fragmento {i}") for i in range(args.synthetic))
+    with tempfile.TemporaryDirectory() as directory:
+        _, build_ms = timed(lambda: write_index(
+            directory, chunks, lambda texts: sample(len(texts)), args.dims, nlist=args.nlist, batch_size=4096,
+        ))
+        index = LocalVectorIndex(directory)
+        exact_ms, ivf_ms, recalls = [], [], []
+        for query in sample(args.num_queries):
+            exact, elapsed = timed(lambda: index.top_k(query, args.k, nprobe=0))
+            exact_ms.append(elapsed)
+            approx, elapsed = timed(lambda: index.top_k(query, args.k, nprobe=args.nprobe))
+            ivf_ms.append(elapsed)
+            recalls.append(recall([r for r, _ in approx], [r for r, _ in exact]))
+        size = os.path.getsize(os.path.join(directory, "vectors.f16"))
+
+    return {
+        "vectors": args.synthetic,
+        "dims": args.dims,
+        "nlist": args.nlist,
+        "nprobe": args.nprobe,
+        "build_s": round(build_ms / 1000, 2),
+        "index_mb": round(size / (1024 * 1024), 1),
+        f"ivf_recall@{args.k}": round(float(np.mean(recalls)), 3),
+        "latency": [latency_row("local exacto", exact_ms), latency_row("local IVF", ivf_ms)],
+    }
+
+
+def load_queries(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        raw = f.read()
+    if raw.lstrip().startswith("["):
+        return [q for q in json.loads(raw) if q]
+    return [line.strip() for line in raw.splitlines() if line.strip()]
+
+
+def corpus_benchmark(args) -> Dict:
+    """Consultas reales: índice local frente a Vertex AI Search."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    from src.config import settings
+    from src.tools.local_index import GeminiTextEmbedder, LocalVectorIndex, default_index_dir
+    from src.tools.vector_embedding import VERTEX_BACKEND, VertexSearchTool
+
+    index = LocalVectorIndex(args.index_dir or default_index_dir())
+    embedder = GeminiTextEmbedder()
+    vertex = None if args.skip_vertex else VertexSearchTool(
+        settings.google_project_id, settings.data_store_id, backend=VERTEX_BACKEND,
+    )
+    if vertex is not None:
+        vertex.cache = None  # medir la latencia real del servicio
+
+    embed_ms, exact_ms, ivf_ms, vertex_ms, recalls, overlaps = [], [], [], [], [], []
+    for query in load_queries(args.queries):
+        vector, elapsed = timed(lambda: embedder.embed([query], task_type="RETRIEVAL_QUERY")[0])
+        embed_ms.append(elapsed)
+        exact, elapsed = timed(lambda: index.top_k(vector, args.k, nprobe=0))
+        exact_ms.append(elapsed)
+        if index.nlist:
+            approx, elapsed = timed(lambda: index.top_k(vector, args.k, nprobe=args.nprobe))
+            ivf_ms.append(elapsed)
+            recalls.append(recall([r for r, _ in approx], [r for r, _ in exact]))
+        if vertex is not None:
+            chunks, elapsed = timed(lambda: vertex.search_chunks(query, args.k))
+            vertex_ms.append(elapsed)
+            local_texts = [hit.text[:500] for hit in index.fetch(exact)]
+            matched = [
+                any(jaccard(chunk.text, text) >= args.overlap_threshold for text in local_texts) for chunk in chunks
+            ]
+            if matched:
+                overlaps.append(sum(matched) / len(matched))
+
+    latency = [latency_row("embedding consulta", embed_ms), latency_row("local exacto", exact_ms)]
+    if ivf_ms:
+        latency.append(latency_row("local IVF", ivf_ms))
+    if vertex_ms:
+        latency.append(latency_row("vertex", vertex_ms))
+    return {
+        "queries": len(embed_ms),
+        "vectors": index.count,
+        "nlist": index.nlist,
+        "nprobe": args.nprobe,
+        f"ivf_recall@{args.k}": round(float(np.mean(recalls)), 3) if recalls else None,
+        f"vertex_overlap@{args.k}": round(float(np.mean(overlaps)), 3) if overlaps else None,
+        "latency": latency,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, help="Vectores del corpus sintético (sin red)")
+    parser.add_argument("--queries", help="Archivo de consultas reales (texto o lista JSON)")
+    parser.add_argument("--index-dir", help="Directorio del índice local (por defecto LOCAL_INDEX_DIR)")
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--num-queries", type=int, default=200, help="Consultas del modo sintético")
+    parser.add_argument("--overlap-threshold", type=float, default=0.3)
+    parser.add_argument("--skip-vertex", action="store_true", help="No consultar Vertex AI Search")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json-output", help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    if bool(args.synthetic) == bool(args.queries):
+        parser.error("usa --synthetic N o --queries archivo")
+
+    os.environ.setdefault("AGNO_TELEMETRY", "false")
+    summary = synthetic_benchmark(args) if args.synthetic else corpus_benchmark(args)
+
+    print(f"{'métrica':<24} {'valor':>14}")
+    for key, value in summary.items():
+        if key != "latency":
+            print(f"{key:<24} {str(value):>14}")
+    print(f"\n{'backend':<24} {'p50 ms':>10} {'p95 ms':>10}")
+    for row in summary["latency"]:
+        print(f"{row['backend']:<24} {row['p50_ms']:>10} {row['p95_ms']:>10}")
+
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
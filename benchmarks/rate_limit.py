@@ -0,0 +1,176 @@
+"""
+Benchmark offline del limitador de tasa bajo contención entre procesos.
+
+Simula una API con cuota (``--quota`` peticiones/minuto compartidas por todos
+los procesos, token bucket con ráfaga de 1 s) que responde 429 con
+``retry-after`` al superarla. Lanza ``--processes`` procesos con ``--threads``
+hilos cada uno, que llaman durante ``--seconds`` a través de
+``call_with_retries``, en tres modos:
+
+- ``naive``: sin límite ni reintentos (el comportamiento anterior: cada 429 es un error).
+- ``retry``: reintentos con backoff y bloqueo compartido tras un 429, sin límite configurado.
+- ``adaptive``: además, límite configurado (``--client-rpm``, por defecto un 20 % por
+  encima de la cuota, como una configuración imprecisa) con buckets compartidos en SQLite y AIMD.
+
+Reporta llamadas completadas por segundo, errores, 429 recibidos por la API y
+la espera en cola p50/p95.
+
+Uso:
+    python benchmarks/rate_limit.py [--quota 600] [--processes 4] [--threads 4] [--seconds 10]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ("naive", "retry", "adaptive")
+
+
+class QuotaExceeded(Exception):
+    """429 simulado, con la forma de los errores de google-genai (code + response.headers)."""
+
+    code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"429 RESOURCE_EXHAUSTED (retry after {retry_after:.2f}s)")
+        self.response = type("Response", (), {"headers": {"retry-after": f"{retry_after:.2f}"}})()
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def fake_api(quota_state, lock, quota_per_second: float, latency_s: float):
+    """Llamada simulada: consume de la cuota compartida o lanza un 429."""
+    with lock:
+        now = time.time()
+        tokens = min(quota_per_second, quota_state[0] + (now - quota_state[1]) * quota_per_second)
+        quota_state[1] = now
+        if tokens < 1:
+            quota_state[0] = tokens
+            quota_state[2] += 1
+            raise QuotaExceeded((1 - tokens) / quota_per_second)
+        quota_state[0] = tokens - 1
+    time.sleep(latency_s)
+    return "ok"
+
+
+def worker(mode: str, args, quota_state, lock, results) -> None:
+    """Proceso cliente: ``--threads`` hilos llamando hasta agotar el tiempo."""
+    from src.core.rate_limit import call_with_retries
+
+    deadline = time.time() + args.seconds
+    outcome = {"ok": 0, "errors": 0, "waits": []}
+    outcome_lock = threading.Lock()
+
+    class Span:
+        def __init__(self):
+            self.attributes: Dict = {}
+
+    def loop():
+        while time.time() < deadline:
+            span = Span()
+            try:
+                call_with_retries(
+                    "gemini",
+                    lambda: fake_api(quota_state, lock, args.quota / 60, args.latency_ms / 1000),
+                    model="bench-model",
+                    span=span,
+                )
+                ok = True
+            except QuotaExceeded:
+                ok = False
+            if time.time() > deadline:
+                break
+            with outcome_lock:
+                outcome["ok" if ok else "errors"] += 1
+                outcome["waits"].append(span.attributes.get("rate_limit_wait_ms", 0.0))
+
+    threads = [threading.Thread(target=loop) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(outcome)
+
+
+def run_mode(mode: str, args, tmp: str) -> Dict:
+    client_rpm = args.client_rpm or int(args.quota * 1.2)
+    os.environ.update({
+        "DB_FILE_PATH": os.path.join(tmp, f"{mode}.db"),
+        "RATE_LIMIT_DB_FILE_PATH": os.path.join(tmp, f"{mode}_rate_limits.db"),
+        "RATE_LIMIT_SHARED": "true",
+        "RATE_LIMIT_MAX_RETRIES": "0" if mode == "naive" else "8",
+        "RATE_LIMIT_BACKOFF_SECONDS": "0.05",
+        "RATE_LIMIT_MAX_BACKOFF_SECONDS": "2",
+        "GEMINI_REQUESTS_PER_MINUTE": str(client_rpm) if mode == "adaptive" else "0",
+    })
+    context = multiprocessing.get_context("spawn")
+    quota_state = context.Array("d", [args.quota / 60, time.time(), 0.0])
+    lock = context.Lock()
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(mode, args, quota_state, lock, results))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    waits = [wait for outcome in outcomes for wait in outcome["waits"]]
+    ok = sum(outcome["ok"] for outcome in outcomes)
+    return {
+        "mode": mode,
+        # Llamadas terminadas dentro de la ventana de --seconds de cada proceso (sin contar el arranque)
+        "ok_per_s": round(ok / args.seconds, 1),
+        "errors": sum(outcome["errors"] for outcome in outcomes),
+        "api_429": int(quota_state[2]),
+        "wait_p50_ms": round(percentile(waits, 50), 1),
+        "wait_p95_ms": round(percentile(waits, 95), 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quota", type=float, default=600, help="Cuota de la API simulada (peticiones/minuto)")
+    parser.add_argument("--client-rpm", type=int, default=0, help="Límite configurado en modo adaptive")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latencia de cada llamada correcta")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--json-output", help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes.split(","):
+            rows.append(run_mode(mode, args, tmp))
+
+    print(f"cuota: {args.quota / 60:.1f}/s, {args.processes} procesos x {args.threads} hilos, {args.seconds:g}s")
+    print(f"{'modo':<10} {'ok/s':>8} {'errores':>8} {'429 API':>8} {'espera p50':>11} {'espera p95':>11}")
+    for row in rows:
+        print(f"{row['mode']:<10} {row['ok_per_s']:>8} {row['errors']:>8} {row['api_429']:>8} "
+              f"{row['wait_p50_ms']:>9} ms {row['wait_p95_ms']:>9} ms")
+
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Benchmark offline: reproduce sesiones multi-turno con el equipo real.
+
+Construye los equipos con ``build_team`` (agentes de ``get_all_agents``, agno,
+SQLite, historial, telemetría) y sustituye sólo Gemini, Vertex AI Search y
+DuckDuckGo por los stubs deterministas de ``offline_stubs``. Reporta por turno
+el overhead propio (tiempo total menos la latencia simulada de los servicios;
+en modo ``parallel`` las esperas simultáneas se suman, así que es una cota
+inferior),
+el crecimiento de la base de datos, la memoria y el throughput. No necesita
+red ni credenciales, así que sirve para detectar regresiones en CI.
+
+Uso:
+    python benchmarks/session_replay.py [--sessions 4] [--turns 6] [--concurrency 2]
+        [--model-latency-ms 50] [--storage-mode shared] [--execution-mode parallel]
+        [--script sesiones.json] [--json-output resultados.json] [--max-overhead-ms 250]
+
+``--script`` acepta un JSON con una lista de sesiones, cada una una lista de consultas.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_SCRIPT = [
+    "¿Qué estrategia de particionado recomiendas para una tabla de eventos de 5 TB en BigQuery?",
+    "¿Y cómo afecta eso al costo de las consultas incrementales?",
+    "Escribe un job de PySpark que compacte los archivos pequeños de esa tabla",
+    "Añade validaciones de calidad de datos al código anterior",
+    "¿Qué novedades trae la última versión de Delta Lake para este caso?",
+    "Resume las decisiones que tomamos en esta sesión",
+]
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def db_size(path: str) -> int:
+    """Tamaño de la base de datos incluyendo WAL y shared memory."""
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal", "-shm") if os.path.exists(path + suffix))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def replay_session(index: int, queries: List[str], stats, stream: bool) -> List[Dict]:
+    from src.core.runner import run_turn, stream_turn
+    from src.core.team_builder import build_team, generate_session_id
+
+    user = f"bench_user_{index}"
+    session_id = generate_session_id(user)
+    start = time.perf_counter()
+    team = build_team(user, session_id)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    turns = []
+    for number, query in enumerate(queries, start=1):
+        simulated = stats.begin_turn()
+        start = time.perf_counter()
+        if stream:
+            for _ in stream_turn(team, query, user, session_id):
+                pass
+        else:
+            run_turn(team, query, user, session_id)
+        wall_ms = (time.perf_counter() - start) * 1000
+        simulated_ms = simulated[0] * 1000
+        turns.append({
+            "session": index,
+            "turn": number,
+            "wall_ms": wall_ms,
+            "simulated_ms": simulated_ms,
+            "overhead_ms": wall_ms - simulated_ms,
+            "build_ms": build_ms if number == 1 else 0.0,
+        })
+    return turns
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=4, help="Sesiones a reproducir")
+    parser.add_argument("--turns", type=int, default=len(DEFAULT_SCRIPT), help="Turnos por sesión (guion por defecto)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Sesiones en paralelo")
+    parser.add_argument("--script", help="JSON con una lista de sesiones (listas de consultas)")
+    parser.add_argument("--model-latency-ms", type=float, default=50.0)
+    parser.add_argument("--search-latency-ms", type=float, default=20.0)
+    parser.add_argument("--web-latency-ms", type=float, default=30.0)
+    parser.add_argument("--response-words", type=int, default=120)
+    parser.add_argument("--storage-mode", choices=["per_session", "shared"], default="shared")
+    parser.add_argument("--execution-mode", choices=["coordinate", "parallel"], default="coordinate")
+    parser.add_argument("--stream", action="store_true", help="Usar el camino streaming")
+    parser.add_argument("--trace-memory", action="store_true", help="Medir el pico del heap con tracemalloc (más lento)")
+    parser.add_argument("--json-output", help="Guardar resultados detallados en JSON")
+    parser.add_argument("--max-overhead-ms", type=float, help="Falla (código 1) si el overhead p95 lo supera")
+    args = parser.parse_args()
+
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            sessions = json.load(f)
+    else:
+        sessions = [(DEFAULT_SCRIPT * (args.turns // len(DEFAULT_SCRIPT) + 1))[:args.turns]] * args.sessions
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "agents.db")
+        # Entorno aislado: DB temporal, credenciales ficticias y sin telemetría de agno
+        os.environ.update({
+            "DB_FILE_PATH": db_path,
+            "GOOGLE_PROJECT_ID": "bench-project",
+            "GOOGLE_API_KEY": "bench-key",
+            "DATA_STORE_ID": "bench-datastore",
+            "SESSION_STORAGE_MODE": args.storage_mode,
+            "TEAM_EXECUTION_MODE": args.execution_mode,
+            "AGNO_TELEMETRY": "false",
+        })
+
+        from benchmarks.offline_stubs import StubLatency, install_stubs
+
+        stats = install_stubs(StubLatency(
+            model_ms=args.model_latency_ms,
+            search_ms=args.search_latency_ms,
+            web_ms=args.web_latency_ms,
+            response_words=args.response_words,
+        ))
+
+        if args.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+            futures = [
+                executor.submit(replay_session, index, queries, stats, args.stream)
+                for index, queries in enumerate(sessions)
+            ]
+            turns = [turn for future in futures for turn in future.result()]
+        wall_s = time.perf_counter() - start
+        traced_peak = None
+        if args.trace_memory:
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        final_db = db_size(db_path)
+
+    overheads = [turn["overhead_ms"] for turn in turns]
+    builds = [turn["build_ms"] for turn in turns if turn["build_ms"]]
+    summary = {
+        "sessions": len(sessions),
+        "turns": len(turns),
+        "concurrency": args.concurrency,
+        "storage_mode": args.storage_mode,
+        "execution_mode": args.execution_mode,
+        "wall_s": round(wall_s, 3),
+        "throughput_turns_per_min": round(len(turns) / wall_s * 60, 1) if wall_s else 0.0,
+        "overhead_p50_ms": round(percentile(overheads, 50), 2),
+        "overhead_p95_ms": round(percentile(overheads, 95), 2),
+        "build_team_p50_ms": round(percentile(builds, 50), 2),
+        "db_bytes": final_db,
+        "db_bytes_per_turn": round(final_db / len(turns)) if turns else 0,
+        "python_heap_peak_mb": round(traced_peak / (1024 * 1024), 1) if traced_peak is not None else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stub_calls": dict(stats.calls),
+    }
+
+    print(f"{'métrica':<28} {'valor':>14}")
+    for key, value in summary.items():
+        print(f"{key:<28} {str(value):>14}")
+
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "turns": turns}, f, indent=2, ensure_ascii=False)
+
+    if args.max_overhead_ms is not None and summary["overhead_p95_ms"] > args.max_overhead_ms:
+        print(f"EXCEDIDO: overhead p95 {summary['overhead_p95_ms']} ms > {args.max_overhead_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Benchmark de tiempo de arranque en frío del CLI.
+
+Ejecuta cada comando en un proceso nuevo con ``python -X importtime`` y compara
+el tiempo total de importación con un presupuesto por comando. Sale con código
+1 si algún comando lo excede, para detectar regresiones (p.ej. un import de
+agno o de Discovery Engine que vuelve a subir al nivel de módulo).
+
+Uso:
+    python benchmarks/startup_time.py [--runs 3]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# comando -> (argumentos de python, presupuesto de importación en ms)
+COMMANDS: Dict[str, Tuple[List[str], int]] = {
+    "help": (["main.py", "--help"], 600),
+    "version": (["main.py", "version"], 600),
+    "list-sessions": (["main.py", "list-sessions", "--user", "bench"], 900),
+    "cleanup-sessions": (["main.py", "cleanup-sessions", "--user", "bench"], 900),
+    # chat es interactivo: se mide sólo el coste de importar su pila (agno + GCP)
+    "chat (imports)": (["-c", "import main, src.core.team_builder"], 6000),
+}
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def total_import_ms(stderr: str) -> float:
+    """Suma el tiempo acumulado de los imports de primer nivel."""
+    total_us = 0
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            total_us += int(match.group(2))
+    return total_us / 1000
+
+
+def measure(args: List[str], env: Dict[str, str]) -> float:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+    )
+    return total_import_ms(result.stderr)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Ejecuciones por comando (se toma la mínima)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # DB aislada y sin variables de GCP: los comandos ligeros no deben necesitarlas
+        env = {k: v for k, v in os.environ.items() if not k.startswith(("GOOGLE_", "DATA_STORE"))}
+        env["DB_FILE_PATH"] = os.path.join(tmp, "agents.db")
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+
+        failures = 0
+        print(f"{'comando':<20} {'import (ms)':>12} {'presupuesto':>12}")
+        for name, (command_args, budget_ms) in COMMANDS.items():
+            elapsed = min(measure(command_args, env) for _ in range(max(1, args.runs)))
+            status = "OK" if elapsed <= budget_ms else "EXCEDIDO"
+            failures += status != "OK"
+            print(f"{name:<20} {elapsed:>12.0f} {budget_ms:>12} {status}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
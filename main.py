@@ -30,12 +30,12 @@ from rich.panel import Panel
 from dotenv import load_dotenv
 import logging
 import sys
+import time
 from datetime import datetime
 import uuid
 
-# Importaciones modulares
-from src.core.team_builder import build_team, generate_session_id
-from src.storage.db_utils import list_user_sessions, clear_session_history
+# Las importaciones modulares (agno, Gemini, Discovery Engine...) se hacen dentro
+# de cada comando para que los comandos ligeros arranquen rápido.
 
 # Configuración
 load_dotenv()
@@ -74,13 +74,68 @@ def print_welcome_banner(session_id: str, user: str, is_new_session: bool = True
         padding=(1, 2)
     ))
 
+def render_streamed_response(team, query: str, turn: int, user: str, session_id: str) -> str:
+    """Muestra la respuesta del orquestador token a token en un panel en vivo."""
+    from rich.console import Group
+    from rich.live import Live
+    from rich.markdown import Markdown
+    from rich.text import Text
+    from src.core.runner import stream_turn
+
+    content = ""
+    status = "🤖 Orquestando agentes con contexto..."
+    start = time.perf_counter()
+    first_token_at = None
+
+    def render():
+        elapsed = time.perf_counter() - start
+        ttft = f" • primer token: {first_token_at:.1f}s" if first_token_at is not None else ""
+        return Group(
+            Text(f"{status} ({elapsed:.1f}s{ttft})", style="cyan"),
+            Panel(
+                Markdown(content) if content else Text("..."),
+                title=f"[bold magenta]📊 Respuesta del Equipo ({turn})[/bold magenta]",
+                border_style="magenta",
+                padding=(1, 2)
+            ),
+        )
+
+    with Live(render(), console=console, refresh_per_second=12) as live:
+        for update in stream_turn(team, query, user, session_id):
+            if update.active_member:
+                status = f"⚙️ Ejecutando: {update.active_member}..."
+            elif update.member_finished:
+                status = "🤖 Orquestador consolidando respuesta..."
+            if update.content:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter() - start
+                content += update.content
+                status = "✍️ Generando respuesta..."
+            live.update(render())
+
+        status = "✅ Respuesta completada"
+        live.update(render())
+
+    return content
+
 @app.command()
 def chat(
     user: str = typer.Option("default_user", help="ID de usuario"),
     session: str = typer.Option(None, help="Session ID específica (opcional)"),
-    clear_history: bool = typer.Option(False, help="Limpiar historial de sesión existente")
+    clear_history: bool = typer.Option(False, help="Limpiar historial de sesión existente"),
+    stream: bool = typer.Option(False, "--stream", help="Mostrar la respuesta token a token"),
+    semantic_cache: bool = typer.Option(
+        None, "--semantic-cache/--no-semantic-cache",
+        help="Reutilizar respuestas de consultas casi idénticas (por defecto: ANSWER_CACHE_ENABLED)"
+    )
 ):
     """Chat interactivo con el equipo orquestado (multi-agente)."""
+    from src.config import settings
+    from src.core.runner import record_turn, run_turn
+    from src.core.team_builder import build_team, generate_session_id
+    from src.storage.db_utils import clear_session_history
+    from src.storage.tool_memo import delete_session_memo
+    from src.storage.turns import delete_session_turns
     
     is_new_session = session is None
     session_id = session if session else generate_session_id(user)
@@ -99,6 +154,13 @@ def chat(
         logger.info(f"Team initialized for user '{user}' with session '{session_id}'")
         console.print(f"[green]✅[/green] Equipo inicializado con memoria contextual")
         
+        answer_cache = None
+        use_answer_cache = settings.answer_cache_enabled if semantic_cache is None else semantic_cache
+        if use_answer_cache:
+            from src.core.answer_cache import get_answer_cache, is_cacheable_query
+            answer_cache = get_answer_cache()
+            console.print(f"[green]✅[/green] Caché semántica de respuestas activa")
+        
     except Exception as e:
         logger.error(f"Error initializing team: {e}", exc_info=True)
         console.print(Panel(
@@ -127,6 +189,8 @@ def chat(
                 
             elif query.lower() in ["clear", "limpiar"]:
                 conversation_count = 0
+                delete_session_turns(user, session_id)
+                delete_session_memo(user, session_id)
                 console.print("[yellow]🔄 Contexto reiniciado para esta sesión[/yellow]")
                 continue
                 
@@ -140,24 +204,52 @@ def chat(
                 console.print("[yellow]⚠️ La consulta no puede estar vacía[/yellow]")
                 continue
 
+            # Caché semántica: respuestas previas a consultas casi idénticas
+            query_embedding = None
+            if answer_cache is not None and is_cacheable_query(query):
+                cached, query_embedding = answer_cache.lookup(query, user)
+                if cached is not None:
+                    conversation_count += 1
+                    record_turn(user, session_id, query, cached.answer, agent="cache")
+                    console.print(Panel(
+                        cached.answer,
+                        title=(
+                            f"[bold magenta]📊 Respuesta del Equipo ({conversation_count})[/bold magenta] "
+                            f"[dim]💾 cached • similitud {cached.similarity:.2f}[/dim]"
+                        ),
+                        border_style="magenta",
+                        padding=(1, 2)
+                    ))
+                    continue
+
             # Procesar consulta
-            with console.status(
-                "[cyan]🤖 Orquestando agentes con contexto...[/cyan]", 
-                spinner="dots"
-            ):
-                response = team.run(query)
+            if stream:
+                response_content = render_streamed_response(
+                    team, query, conversation_count + 1, user, session_id
+                )
                 conversation_count += 1
                 logger.info(f"Processed query #{conversation_count} for session {session_id}")
+            else:
+                with console.status(
+                    "[cyan]🤖 Orquestando agentes con contexto...[/cyan]", 
+                    spinner="dots"
+                ):
+                    response = run_turn(team, query, user, session_id)
+                    conversation_count += 1
+                    logger.info(f"Processed query #{conversation_count} for session {session_id}")
 
-            # Mostrar respuesta
-            response_content = getattr(response, "content", str(response))
+                # Mostrar respuesta
+                response_content = getattr(response, "content", str(response))
+                
+                console.print(Panel(
+                    response_content,
+                    title=f"[bold magenta]📊 Respuesta del Equipo ({conversation_count})[/bold magenta]",
+                    border_style="magenta",
+                    padding=(1, 2)
+                ))
             
-            console.print(Panel(
-                response_content,
-                title=f"[bold magenta]📊 Respuesta del Equipo ({conversation_count})[/bold magenta]",
-                border_style="magenta",
-                padding=(1, 2)
-            ))
+            if query_embedding is not None and response_content:
+                answer_cache.store(query, response_content, user, query_embedding)
             
             # Sugerencia después de varias consultas
             if conversation_count % 3 == 0:
@@ -182,18 +274,171 @@ def chat(
                 border_style="red"
             ))
 
+@app.command()
+def batch(
+    input_file: str = typer.Argument(..., help="Archivo JSONL o CSV con una columna/campo 'query' (opcionales: 'id', 'user', 'session')"),
+    output: str = typer.Option("batch_results.jsonl", help="Archivo JSONL de resultados"),
+    user: str = typer.Option("batch_user", help="Usuario por defecto si la fila no trae 'user'"),
+    workers: int = typer.Option(4, help="Número de workers concurrentes")
+):
+    """
+    Ejecuta un lote de consultas de forma no interactiva.
+    
+    Cada consulta usa una sesión nueva; las filas con la misma 'session' se
+    ejecutan en orden compartiendo historial.
+    """
+    from rich.progress import Progress
+    from src.config import settings
+    from src.core.batch import load_queries, run_batch
+    
+    try:
+        queries = load_queries(input_file, user)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]❌ No se pudo leer el lote: {e}[/red]")
+        raise typer.Exit(code=1)
+    if not queries:
+        console.print("[yellow]⚠️ No se encontraron consultas en el archivo[/yellow]")
+        raise typer.Exit(code=1)
+    
+    console.print(Panel(
+        f"[bold]📦 Lote:[/bold] [cyan]{input_file}[/cyan] ({len(queries)} consultas)\n"
+        f"[bold]👷 Workers:[/bold] [yellow]{workers}[/yellow] • "
+        f"[bold]⏱️ Límites/min:[/bold] Gemini {settings.gemini_requests_per_minute or '∞'}, "
+        f"Vertex {settings.vertex_requests_per_minute or '∞'}\n"
+        f"[bold]📝 Salida:[/bold] [cyan]{output}[/cyan]",
+        border_style="blue"
+    ))
+    
+    with Progress(console=console) as progress:
+        task = progress.add_task("[cyan]Procesando consultas...", total=len(queries))
+        summary = run_batch(
+            queries,
+            output,
+            workers=workers,
+            on_result=lambda result: progress.advance(task),
+        )
+    
+    console.print(Panel(
+        f"[green]✅ Correctas:[/green] {summary.succeeded} • [red]❌ Errores:[/red] {summary.failed}\n"
+        f"⏱️ Tiempo total: {summary.wall_time_s:.1f}s • "
+        f"Throughput: {summary.throughput_per_min:.1f} consultas/min\n"
+        f"📈 Latencia p50: {summary.percentile(50) / 1000:.1f}s • p95: {summary.percentile(95) / 1000:.1f}s",
+        title="Resumen del Lote",
+        border_style="green" if summary.failed == 0 else "yellow"
+    ))
+
+@app.command()
+def serve(
+    host: str = typer.Option(
+        "127.0.0.1",
+        help="Interfaz en la que escuchar (por defecto sólo local; sin SERVER_API_KEYS no hay autenticación)"
+    ),
+    port: int = typer.Option(8000, help="Puerto HTTP"),
+    pool_size: int = typer.Option(4, help="Equipos precalentados (consultas simultáneas)")
+):
+    """
+    Inicia el servidor HTTP con un pool de equipos precalentados.
+    
+    Escucha en 127.0.0.1 por defecto. Con SERVER_API_KEYS (JSON clave → usuario)
+    cada petición se autentica con la cabecera X-API-Key; sin claves, cualquier
+    cliente que alcance el puerto puede leer o borrar sesiones de otros usuarios.
+    """
+    import uvicorn
+    from src.config import settings
+    from src.server.app import create_app
+    
+    auth = f"X-API-Key ({len(settings.server_api_keys)} claves)" if settings.server_api_keys else "desactivada"
+    if not settings.server_api_keys and host not in ("127.0.0.1", "localhost", "::1"):
+        console.print(
+            f"[yellow]⚠️ Escuchando en {host} sin SERVER_API_KEYS: "
+            f"cualquier cliente podrá acceder a las sesiones de todos los usuarios[/yellow]"
+        )
+    
+    console.print(Panel(
+        f"[bold]🌐 Servidor:[/bold] [cyan]http://{host}:{port}[/cyan]\n"
+        f"[bold]🏊 Pool de equipos:[/bold] [yellow]{pool_size}[/yellow]\n"
+        f"[bold]🔐 Autenticación:[/bold] {auth}\n"
+        f"[bold]📖 Endpoints:[/bold] /health, /sessions, /query (stream=true → SSE)",
+        border_style="blue"
+    ))
+    uvicorn.run(create_app(pool_size), host=host, port=port, log_level="warning")
+
 @app.command()
 def list_sessions(
     user: str = typer.Option("default_user", help="ID de usuario"),
     detailed: bool = typer.Option(False, help="Mostrar información detallada")
 ):
     """Lista las sesiones existentes para un usuario."""
+    from src.storage.db_utils import list_user_sessions
+    
     console.print(Panel(
         f"[bold]📋 Sesiones para usuario:[/bold] [cyan]{user}[/cyan]",
         border_style="blue"
     ))
     list_user_sessions(user, console, detailed)
 
+def parse_date(value: str) -> datetime:
+    """Fecha YYYY-MM-DD de una opción de la CLI; sale con error si no es válida."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        console.print(f"[red]❌ Fecha inválida: {value} (formato YYYY-MM-DD)[/red]")
+        raise typer.Exit(code=1)
+
+@app.command()
+def search_history(
+    text: str = typer.Argument(..., help="Texto a buscar en consultas y respuestas"),
+    user: str = typer.Option(None, help="Filtrar por usuario (opcional)"),
+    since: str = typer.Option(None, help="Desde esta fecha (YYYY-MM-DD)"),
+    until: str = typer.Option(None, help="Hasta esta fecha, incluida (YYYY-MM-DD)"),
+    limit: int = typer.Option(10, help="Número máximo de resultados"),
+    match_any: bool = typer.Option(False, help="Basta con que coincida uno de los términos"),
+    all_turns: bool = typer.Option(False, help="Mostrar todos los turnos, no sólo el mejor de cada sesión")
+):
+    """Busca en el historial de sesiones (índice de texto completo)."""
+    from datetime import timedelta
+    from rich.markup import escape
+    from rich.table import Table
+    from src.storage.turns import MATCH_END, MATCH_START, search_turns
+    
+    def highlight(snippet: str) -> str:
+        return escape(snippet).replace(MATCH_START, "[bold yellow]").replace(MATCH_END, "[/bold yellow]")
+    
+    start = time.perf_counter()
+    matches = search_turns(
+        text,
+        user=user,
+        since=parse_date(since).timestamp() if since else None,
+        until=(parse_date(until) + timedelta(days=1)).timestamp() if until else None,
+        limit=limit,
+        match_any=match_any,
+        group_sessions=not all_turns,
+    )
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    if not matches:
+        console.print(f"[yellow]⚠️ Sin resultados para: {escape(text)}[/yellow]")
+        return
+    
+    table = Table(title=f"🔎 Historial: \"{escape(text)}\" ({elapsed_ms:.1f} ms)", border_style="blue", show_lines=True)
+    table.add_column("Sesión", style="cyan")
+    table.add_column("Turno", justify="right")
+    table.add_column("Fecha", style="dim", no_wrap=True)
+    table.add_column("Consulta / respuesta")
+    
+    for match in matches:
+        session = f"{escape(match.session_id)}\n[dim]{escape(match.user_id)}[/dim]"
+        if match.session_matches > 1:
+            session += f"\n[dim]{match.session_matches} turnos[/dim]"
+        table.add_row(
+            session,
+            str(match.turn),
+            datetime.fromtimestamp(match.created_at).strftime("%Y-%m-%d %H:%M"),
+            f"[bold]❓[/bold] {highlight(match.query_snippet)}\n[bold]💬[/bold] {highlight(match.answer_snippet)}",
+        )
+    console.print(table)
+    console.print("[dim]💡 Retoma una sesión con: python main.py chat --user <usuario> --session <sesión>[/dim]")
+
 @app.command()
 def cleanup_sessions(
     user: str = typer.Option("default_user", help="ID de usuario"),
@@ -215,10 +460,215 @@ def cleanup_sessions(
     else:
         console.print("[blue]💡 No se encontraron sesiones para eliminar[/blue]")
 
+@app.command()
+def migrate_sessions(
+    keep_old_tables: bool = typer.Option(False, help="Conservar las tablas por sesión tras copiarlas")
+):
+    """Migra las tablas por sesión a la tabla compartida e indexada."""
+    from src.config import settings
+    from src.storage.sessions import migrate_per_session_tables, SHARED_MODE
+    
+    console.print(Panel(
+        f"[bold]🚚 Migrando sesiones a la tabla compartida:[/bold] [cyan]{settings.db_sessions_table}[/cyan]",
+        border_style="yellow"
+    ))
+    
+    result = migrate_per_session_tables(drop_old=not keep_old_tables)
+    
+    if result.tables > 0:
+        console.print(f"[green]✅ {result.tables} tablas migradas ({result.rows} filas)[/green]")
+    elif not result.skipped_tables and not result.conflicts:
+        console.print("[blue]💡 No se encontraron tablas por sesión para migrar[/blue]")
+    for table in result.skipped_tables:
+        console.print(f"[yellow]⚠️ Tabla conservada sin migrar: {table}[/yellow]")
+    for conflict in result.conflicts:
+        console.print(f"[red]❌ session_id en uso por otro usuario (tabla conservada): {conflict}[/red]")
+    
+    if settings.session_storage_mode != SHARED_MODE:
+        console.print(
+            f"[yellow]⚠️ Activa el modo compartido con SESSION_STORAGE_MODE={SHARED_MODE}[/yellow]"
+        )
+
+@app.command()
+def export_sessions(
+    output: str = typer.Option(..., help="Archivo Parquet de destino"),
+    user: str = typer.Option(None, help="Exportar sólo este usuario (opcional)"),
+    since: str = typer.Option(None, help="Desde esta fecha (YYYY-MM-DD)"),
+    until: str = typer.Option(None, help="Hasta esta fecha, incluida (YYYY-MM-DD)"),
+    batch_size: int = typer.Option(10000, help="Turnos por lote (row group)")
+):
+    """Exporta el historial de sesiones a Parquet (una fila por turno)."""
+    from datetime import timedelta
+    from src.storage.export import export_turns
+    
+    with console.status("[cyan]Exportando turnos...[/cyan]") as status:
+        result = export_turns(
+            output,
+            user=user,
+            since=parse_date(since).timestamp() if since else None,
+            until=(parse_date(until) + timedelta(days=1)).timestamp() if until else None,
+            batch_size=batch_size,
+            on_batch=lambda done: status.update(f"[cyan]Exportando turnos... {done}[/cyan]"),
+        )
+    
+    if result.rows == 0:
+        console.print("[yellow]⚠️ No hay turnos que exportar con esos filtros[/yellow]")
+    size_mb = os.path.getsize(result.path) / (1024 * 1024)
+    console.print(
+        f"[green]✅ {result.rows} turnos exportados a {result.path} "
+        f"({size_mb:.1f} MB, {result.elapsed_s:.1f}s)[/green]"
+    )
+
+@app.command()
+def import_sessions(
+    path: str = typer.Argument(..., help="Archivo Parquet generado por export-sessions"),
+    overwrite: bool = typer.Option(False, help="Sobrescribir los turnos que ya existen"),
+    batch_size: int = typer.Option(10000, help="Turnos por transacción")
+):
+    """Restaura el historial de sesiones desde un Parquet de export-sessions."""
+    from src.storage.export import import_turns
+    
+    if not os.path.exists(path):
+        console.print(f"[red]❌ No existe el archivo: {path}[/red]")
+        raise typer.Exit(code=1)
+    
+    try:
+        with console.status("[cyan]Importando turnos...[/cyan]") as status:
+            result = import_turns(
+                path,
+                overwrite=overwrite,
+                batch_size=batch_size,
+                on_batch=lambda done: status.update(f"[cyan]Importando turnos... {done}[/cyan]"),
+            )
+    except ValueError as e:
+        console.print(f"[red]❌ {e}[/red]")
+        raise typer.Exit(code=1)
+    
+    console.print(f"[green]✅ {result.rows} turnos importados en {result.elapsed_s:.1f}s[/green]")
+    if result.skipped:
+        console.print(f"[blue]💡 {result.skipped} turnos ya existían (usa --overwrite para reemplazarlos)[/blue]")
+
+@app.command()
+def stats(
+    since_hours: float = typer.Option(24, help="Ventana de tiempo en horas"),
+    user: str = typer.Option(None, help="Filtrar por usuario (opcional)")
+):
+    """Muestra latencia p50/p95 y tokens por componente (orquestador, agentes, herramientas, SQLite)."""
+    from rich.table import Table
+    from src.core.telemetry import component_stats, default_telemetry_path, tier_stats, turn_tier_counts
+    
+    rows = component_stats(since_hours, user)
+    if not rows:
+        console.print(f"[yellow]⚠️ No hay trazas en las últimas {since_hours:g} horas ({default_telemetry_path()})[/yellow]")
+        return
+    
+    table = Table(title=f"📈 Latencia por componente (últimas {since_hours:g} h)", border_style="blue")
+    table.add_column("Componente", style="cyan", no_wrap=True)
+    table.add_column("Llamadas", justify="right")
+    table.add_column("p50", justify="right", style="green")
+    table.add_column("p95", justify="right", style="yellow")
+    table.add_column("Total", justify="right")
+    table.add_column("Tokens in/out", justify="right", style="magenta")
+    table.add_column("En caché", justify="right", style="magenta")
+    table.add_column("1er token p50", justify="right", style="green")
+    table.add_column("Espera cuota", justify="right", style="yellow")
+    table.add_column("Errores", justify="right", style="red")
+    
+    for row in rows:
+        table.add_row(
+            row.name,
+            str(row.count),
+            f"{row.p50_ms:,.0f} ms",
+            f"{row.p95_ms:,.0f} ms",
+            f"{row.total_ms / 1000:.1f}s",
+            f"{row.input_tokens}/{row.output_tokens}" if row.kind in ("model", "turn") else "-",
+            str(row.cached_tokens) if row.cached_tokens else (f"{row.memo_hits} memo" if row.memo_hits else "-"),
+            f"{row.first_token_p50_ms:,.0f} ms" if row.first_token_p50_ms is not None else "-",
+            (f"{row.queue_wait_ms / 1000:.1f}s" + (f" ({row.retries} reint.)" if row.retries else ""))
+            if row.queue_wait_ms or row.retries else "-",
+            str(row.errors) if row.errors else "-",
+        )
+    console.print(table)
+    
+    tiers = tier_stats(since_hours, user)
+    if not tiers:
+        return
+    turns = turn_tier_counts(since_hours, user)
+    tier_table = Table(title="🎚️ Llamadas al modelo por nivel", border_style="blue")
+    tier_table.add_column("Nivel", style="cyan", no_wrap=True)
+    tier_table.add_column("Modelo", style="yellow")
+    tier_table.add_column("Llamadas", justify="right")
+    tier_table.add_column("p50", justify="right", style="green")
+    tier_table.add_column("Tokens in/out", justify="right", style="magenta")
+    tier_table.add_column("Coste est.", justify="right", style="green")
+    tier_table.add_column("Turnos", justify="right")
+    
+    shown = set()
+    for row in tiers:
+        tier_table.add_row(
+            row.tier,
+            row.model,
+            str(row.count),
+            f"{row.p50_ms:,.0f} ms",
+            f"{row.input_tokens}/{row.output_tokens}",
+            f"${row.cost_usd:.4f}" if row.cost_usd is not None else "-",
+            str(turns.get(row.tier, 0)) if row.tier not in shown else "",
+        )
+        shown.add(row.tier)
+    console.print(tier_table)
+    total = sum(row.cost_usd or 0 for row in tiers)
+    console.print(f"[dim]Coste estimado total: ${total:.4f} · cada turno cuenta en el nivel más alto que usó[/dim]")
+
+@app.command()
+def build_local_index(
+    source: str = typer.Option(..., help="Archivo o directorio del corpus (.txt, .md, .pdf)"),
+    output_dir: str = typer.Option(None, help="Directorio del índice (por defecto LOCAL_INDEX_DIR)"),
+    nlist: int = typer.Option(None, help="Listas IVF (0 = búsqueda exacta; por defecto LOCAL_INDEX_NLIST)"),
+    chunk_words: int = typer.Option(300, help="Palabras por fragmento"),
+    overlap_words: int = typer.Option(50, help="Palabras de solapamiento entre fragmentos"),
+    batch_size: int = typer.Option(64, help="Fragmentos por llamada de embeddings")
+):
+    """Construye el índice vectorial local (RAG sin Vertex AI Search)."""
+    from src.config import settings
+    from src.tools.local_index import build_local_index as build_index, default_index_dir, iter_corpus_files
+    
+    files = iter_corpus_files(source)
+    if not files:
+        console.print(f"[yellow]⚠️ No se encontraron documentos en {source}[/yellow]")
+        raise typer.Exit(code=1)
+    
+    target = output_dir or default_index_dir()
+    console.print(Panel(
+        f"[bold]📚 Corpus:[/bold] [cyan]{source}[/cyan] ({len(files)} documentos)\n"
+        f"[bold]🧮 Embeddings:[/bold] [yellow]{settings.embedding_model}[/yellow] "
+        f"({settings.embedding_dimensions} dims, float16)\n"
+        f"[bold]📁 Índice:[/bold] [cyan]{target}[/cyan]",
+        border_style="blue"
+    ))
+    
+    start = time.perf_counter()
+    with console.status("[cyan]Generando embeddings...[/cyan]") as status:
+        count = build_index(
+            source,
+            target,
+            nlist=nlist,
+            chunk_words=chunk_words,
+            overlap_words=overlap_words,
+            batch_size=batch_size,
+            on_batch=lambda done: status.update(f"[cyan]Generando embeddings... {done} fragmentos[/cyan]"),
+        )
+    
+    if count == 0:
+        console.print("[yellow]⚠️ Los documentos no contienen texto indexable[/yellow]")
+        raise typer.Exit(code=1)
+    console.print(f"[green]✅ {count} fragmentos indexados en {time.perf_counter() - start:.1f}s[/green]")
+    if settings.rag_backend == "vertex":
+        console.print("[blue]💡 Actívalo con RAG_BACKEND=hybrid (o local)[/blue]")
+
 @app.command()
 def test_connection():
     """Prueba la conexión con los servicios de Google Cloud."""
-    from src.tools.vector_embedding import VertexSearchTool
+    from src.tools.vector_embedding import NO_RESULTS, VERTEX_BACKEND, VertexSearchTool
     from src.config import settings
     
     console.print(Panel(
@@ -227,6 +677,8 @@ def test_connection():
     ))
     
     try:
+        settings.require_gcp()
+        
         # Test configuración
         console.print(f"[bold]⚙️ Configuración:[/bold]")
         console.print(f"  • Project ID: [cyan]{settings.google_project_id}[/cyan]")
@@ -237,19 +689,59 @@ def test_connection():
         console.print(f"\n[bold]🔍 Probando Vertex AI Search...[/bold]")
         tool = VertexSearchTool(
             project_id=settings.google_project_id,
-            data_store_id=settings.data_store_id
+            data_store_id=settings.data_store_id,
+            backend=VERTEX_BACKEND
         )
         
         test_query = "data engineering best practices"
-        result = tool.search(test_query, page_size=1)
+        start = time.perf_counter()
+        # Fallo = excepción o sin resultados; el contenido de los pasajes no se inspecciona
+        try:
+            result = tool.search(test_query, page_size=1)
+            vertex_ok = result != NO_RESULTS
+        except Exception as e:
+            result, vertex_ok = str(e), False
+        first_ms = (time.perf_counter() - start) * 1000
         
-        if "error" in result.lower():
+        if not vertex_ok:
             console.print(f"[red]❌ Error en Vertex AI: {result}[/red]")
         else:
             console.print(f"[green]✅ Vertex AI Search conectado correctamente[/green]")
             console.print(f"[dim]Muestra: {result[:100]}...[/dim]")
         
-        console.print(f"\n[green]🎉 Todas las conexiones funcionan correctamente![/green]")
+        # Test caché de búsquedas (segunda llamada idéntica)
+        if tool.cache is not None and vertex_ok:
+            start = time.perf_counter()
+            tool.search(test_query, page_size=1)
+            second_ms = (time.perf_counter() - start) * 1000
+            stats = tool.cache.stats()
+            console.print(f"\n[bold]🗄️ Caché de búsquedas:[/bold]")
+            console.print(f"  • Latencia: [cyan]{first_ms:.0f} ms[/cyan] → [green]{second_ms:.1f} ms[/green]")
+            console.print(
+                f"  • Hits memoria/disco: [green]{stats['memory_hits']}/{stats['disk_hits']}[/green] "
+                f"• Misses: [yellow]{stats['misses']}[/yellow] "
+                f"• Hit rate: [cyan]{stats['hit_rate']:.0%}[/cyan]"
+            )
+        elif tool.cache is None:
+            console.print(f"\n[dim]🗄️ Caché de búsquedas deshabilitada[/dim]")
+        
+        # Índice local (backends local/hybrid)
+        from src.tools.local_index import default_index_dir, get_local_index
+        
+        index = get_local_index()
+        console.print(f"\n[bold]📚 Índice local ({settings.rag_backend}):[/bold]")
+        if index is None:
+            console.print(f"  • [dim]No construido en {default_index_dir()} (usa build-local-index)[/dim]")
+        else:
+            console.print(
+                f"  • [cyan]{index.count}[/cyan] fragmentos • {index.dimensions} dims • "
+                f"IVF: {index.nlist or 'exacto'}"
+            )
+        
+        if vertex_ok:
+            console.print(f"\n[green]🎉 Todas las conexiones funcionan correctamente![/green]")
+        else:
+            console.print(f"\n[yellow]⚠️ Vertex AI Search no respondió correctamente[/yellow]")
         
     except Exception as e:
         console.print(Panel(
@@ -266,15 +758,21 @@ def test_connection():
 @app.command()
 def version():
     """Muestra la versión e información del sistema."""
-    import agno
-    import google.cloud.discoveryengine
+    from importlib.metadata import PackageNotFoundError, version as package_version
+    
+    # Versiones desde los metadatos instalados: no importa agno ni los clientes de GCP
+    def installed(package: str) -> str:
+        try:
+            return package_version(package)
+        except PackageNotFoundError:
+            return "no instalado"
     
     console.print(Panel(
         f"[bold]📦 Sistema Multi-Agente para Ingeniería de Datos[/bold]\n\n"
         f"🔢 [bold]Versión:[/bold] [cyan]1.0.0[/cyan]\n"
         f"🐍 [bold]Python:[/bold] [yellow]{sys.version}[/yellow]\n"
-        f"🤖 [bold]Agno:[/bold] [green]{agno.__version__}[/green]\n"
-        f"☁️ [bold]Google Cloud:[/bold] [blue]{google.cloud.discoveryengine.__version__}[/blue]\n\n"
+        f"🤖 [bold]Agno:[/bold] [green]{installed('agno')}[/green]\n"
+        f"☁️ [bold]Google Cloud:[/bold] [blue]{installed('google-cloud-discoveryengine')}[/blue]\n\n"
         f"📚 [bold]Características:[/bold]\n"
         f"  • 🎯 Orquestación multi-agente\n"
         f"  • 📊 RAG con Vertex AI Search\n"
@@ -1,32 +1,23 @@
 from agno.agent import Agent
-from agno.models.google import Gemini
-from agno.tools.duckduckgo import DuckDuckGoTools
 from agno.storage.sqlite import SqliteStorage
 
 # Importación corregida - ahora desde src.tools
-from src.tools.vector_embedding import VertexSearchTool
-from src.tools.prompts import WEB_SEARCH, RAG, CODE_STANDARDS_PROMPT
+from src.tools.vector_embedding import AsyncVertexSearchTool
+from src.tools.web_search import CachedDuckDuckGoTools
+from src.tools.prompts import (
+    WEB_AGENT_INSTRUCTIONS, RAG_AGENT_INSTRUCTIONS, CODE_STANDARDS_AGENT_INSTRUCTIONS, session_context
+)
+from src.agents.models import build_model
 from src.config import settings
-from datetime import datetime
 
 def create_web_agent(user: str, session_id: str, storage: SqliteStorage) -> Agent:
     agent = Agent(
         name="Web Agent",
         role="Experto en documentación técnica actualizada sobre ingeniería de datos",
-        model=Gemini(id=settings.default_llm_flash, api_key=settings.google_api_key),
-        tools=[DuckDuckGoTools()],
-        instructions=WEB_SEARCH + f"""
-        
-        CONTEXTO DE SESIÓN:
-        - Usuario: {user}
-        - Session ID: {session_id}
-        - Fecha: {datetime.now().strftime('%Y-%m-%d')}
-        
-        REGLAS DE CONTEXTO:
-        - Siempre considera el historial de la conversación antes de buscar.
-        - Si el usuario referencia búsquedas anteriores, prioriza continuidad.
-        - No repitas información ya proporcionada en conversaciones previas.
-        """,
+        model=build_model(settings.default_llm_flash),
+        tools=[CachedDuckDuckGoTools()],
+        instructions=WEB_AGENT_INSTRUCTIONS,  # estático: prefijo cacheable
+        additional_context=session_context(user, session_id),
         show_tool_calls=True,
         markdown=True
     )
@@ -37,7 +28,7 @@ def create_web_agent(user: str, session_id: str, storage: SqliteStorage) -> Agen
 
 def create_rag_agent(user: str, session_id: str, storage: SqliteStorage) -> Agent:
     # Crear la herramienta con la configuración centralizada
-    search_tool = VertexSearchTool(
+    search_tool = AsyncVertexSearchTool(
         project_id=settings.google_project_id,
         data_store_id=settings.data_store_id
     )
@@ -45,22 +36,11 @@ def create_rag_agent(user: str, session_id: str, storage: SqliteStorage) -> Agen
     agent = Agent(
         name="RAG Agent",
         role="Experto en investigación y sintetización de información.",
-        model=Gemini(id=settings.default_llm_pro, api_key=settings.google_api_key),
-        tools=[search_tool],
-        instructions=RAG + f"""
-        
-        CONTEXTO DE SESIÓN:
-        - Usuario: {user}
-        - Session ID: {session_id}
-        
-        REGLAS DE CONTEXTO:
-        - Revisa el historial de conversación para entender el contexto completo.
-        - Sintetiza información considerando preguntas y respuestas anteriores.
-        - No repitas información ya proporcionada en esta conversación.
-        
-        Herramienta disponible: VertexSearchTool para consultar libros técnicos.
-        Usa esta herramienta para búsquedas en la base de conocimiento vectorial.
-        """,
+        model=build_model(settings.default_llm_pro),
+        # Métodos ligados: agno sólo registra funciones/Toolkits, no instancias arbitrarias
+        tools=[search_tool.search, search_tool.search_many],
+        instructions=RAG_AGENT_INSTRUCTIONS,
+        additional_context=session_context(user, session_id),
         show_tool_calls=True,
         markdown=True
     )
@@ -73,18 +53,9 @@ def create_code_standards_agent(user: str, session_id: str, storage: SqliteStora
     agent = Agent(
         name="Code Standards Agent",
         role="Senior Code Reviewer y Generator especializado en estándares enterprise",
-        model=Gemini(id=settings.default_llm_pro, api_key=settings.google_api_key),
-        instructions=CODE_STANDARDS_PROMPT + f"""
-        
-        CONTEXTO DE SESIÓN:
-        - Usuario: {user}  
-        - Session ID: {session_id}
-        
-        REGLAS DE CONTEXTO:
-        - Al generar código, considera el historial técnico de la conversación.
-        - Mantén consistencia con referencias a código anterior si existe.
-        - No repitas explicaciones ya dadas en respuestas previas.
-        """,
+        model=build_model(settings.default_llm_pro),
+        instructions=CODE_STANDARDS_AGENT_INSTRUCTIONS,
+        additional_context=session_context(user, session_id),
         show_tool_calls=True,
         markdown=True
     )
@@ -0,0 +1,322 @@
+"""
+Construcción de los modelos Gemini usados por el orquestador y los agentes.
+
+Con ``GEMINI_CONTEXT_CACHE_ENABLED`` el prefijo estático del system prompt (las
+instrucciones del agente, hasta ``SESSION_CONTEXT_TAG``) y las declaraciones de
+herramientas se suben una vez como ``CachedContent`` por modelo y versión del
+prompt; cada petición referencia ese handle y envía el contexto variable de la
+sesión como primer mensaje.
+
+Con ``MODEL_TIERING`` los componentes configurados con ``default_llm_pro`` usan
+``TieredGemini``, que elige Flash o Pro en cada llamada y escala a Pro cuando la
+respuesta de Flash no pasa el self-check (ver ``src.core.tiering``).
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from agno.models.google import Gemini
+
+from src.config import settings
+from src.core.rate_limit import acall_with_retries, acquire, call_with_retries
+from src.core.telemetry import model_call, record_model_usage
+from src.core.tiering import TIER_ESCALATED, TIER_FLASH, TIER_PRO, TierDecision, choose_tier, self_check
+from src.storage.cache import get_cache
+from src.storage.turns import estimate_tokens
+from src.tools.prompts import SESSION_CONTEXT_TAG
+
+logger = logging.getLogger(__name__)
+
+# Prefijos que no se pudieron cachear (p.ej. por debajo del mínimo de tokens del modelo)
+_uncacheable: Set[str] = set()
+_context_cache_lock = threading.Lock()
+_END = object()
+
+
+def _record_first_token(span, start: float) -> None:
+    if span is not None and "first_token_ms" not in span.attributes:
+        span.attributes["first_token_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+
+class SplitSystemMessage(str):
+    """System prompt completo que recuerda su prefijo estático y su cola variable."""
+
+    def __new__(cls, content: str, prefix: str, tail: str, contents: List[Any]):
+        message = super().__new__(cls, content)
+        message.prefix = prefix
+        message.tail = tail
+        message.contents = contents
+        return message
+
+
+def split_static_prefix(system_message: str):
+    """(prefijo estático, contexto variable) de un system prompt."""
+    index = system_message.find(SESSION_CONTEXT_TAG)
+    if index < 0:
+        return system_message, ""
+    return system_message[:index], system_message[index:]
+
+
+def _context_cache_key(model_id: str, prefix: str, tools_payload: str) -> str:
+    raw = "\x00".join([model_id, prefix, tools_payload])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_context_cache_name(client, model_id: str, prefix: str, tools: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    """
+    Handle ``cachedContents/...`` del prefijo, creándolo la primera vez.
+
+    Los handles se comparten entre procesos a través de la caché en disco y
+    caducan un poco antes que en Gemini. Devuelve None si el prefijo no se
+    puede cachear (demasiado corto o error al crearlo); se reintenta sólo en
+    otro proceso.
+    """
+    from agno.utils.gemini import format_function_definitions
+    from google.genai import types
+
+    tools_payload = json.dumps(tools or [], sort_keys=True, default=str)
+    key = _context_cache_key(model_id, prefix, tools_payload)
+    if key in _uncacheable:
+        return None
+    if estimate_tokens(prefix) + estimate_tokens(tools_payload) < settings.gemini_context_cache_min_tokens:
+        _uncacheable.add(key)
+        return None
+
+    handles = get_cache(
+        "gemini_context_caches",
+        ttl_seconds=max(60, settings.gemini_context_cache_ttl_seconds - 300),
+        max_memory_entries=64,
+        max_disk_entries=256,
+    )
+    with _context_cache_lock:
+        cached = handles.get(key)
+        if cached is not None:
+            return cached["name"]
+        try:
+            acquire("gemini", model_id)
+            created = client.caches.create(
+                model=model_id,
+                config=types.CreateCachedContentConfig(
+                    display_name=f"prompt-{key[:12]}",
+                    system_instruction=prefix,
+                    tools=[format_function_definitions(tools)] if tools else None,
+                    ttl=f"{settings.gemini_context_cache_ttl_seconds}s",
+                ),
+            )
+        except Exception as e:
+            logger.warning(f"Context cache not created for {model_id} ({key[:12]}): {e}")
+            _uncacheable.add(key)
+            return None
+        handles.set(key, {"name": created.name})
+        logger.info(f"Context cache {created.name} created for {model_id}")
+        return created.name
+
+
+@dataclass
+class RateLimitedGemini(Gemini):
+    """Gemini con cuota por API y modelo, reintentos ante 429 y medición de cada llamada."""
+
+    # Nivel registrado en el span de cada llamada (flash, pro o escalated)
+    tier: Optional[str] = None
+
+    def _format_messages(self, messages):
+        contents, system_message = super()._format_messages(messages)
+        if system_message and settings.gemini_context_cache_enabled:
+            prefix, tail = split_static_prefix(system_message)
+            system_message = SplitSystemMessage(system_message, prefix, tail, contents)
+        return contents, system_message
+
+    def get_request_params(self, system_message=None, response_format=None, tools=None):
+        if isinstance(system_message, SplitSystemMessage):
+            name = get_context_cache_name(self.get_client(), self.id, system_message.prefix, tools)
+            if name is not None:
+                from google.genai import types
+
+                # Con cached_content la petición no puede llevar system_instruction ni tools
+                params = super().get_request_params(None, response_format=response_format, tools=None)
+                config = params.get("config") or types.GenerateContentConfig()
+                config.cached_content = name
+                params["config"] = config
+                if system_message.tail:
+                    system_message.contents.insert(
+                        0, types.Content(role="user", parts=[types.Part.from_text(text=system_message.tail)])
+                    )
+                return params
+            system_message = str(system_message)
+        return super().get_request_params(system_message, response_format=response_format, tools=tools)
+
+    def invoke(self, *args, **kwargs):
+        invoke = super().invoke
+        with model_call(self.id, tier=self.tier) as span:
+            response = call_with_retries("gemini", lambda: invoke(*args, **kwargs), model=self.id, span=span)
+            record_model_usage(span, response)
+            return response
+
+    def invoke_stream(self, *args, **kwargs):
+        invoke_stream = super().invoke_stream
+        with model_call(self.id, tier=self.tier) as span:
+            start = time.perf_counter()
+
+            def open_stream():
+                # El stream sólo se reintenta si falla antes del primer chunk
+                iterator = iter(invoke_stream(*args, **kwargs))
+                return iterator, next(iterator, _END)
+
+            iterator, chunk = call_with_retries("gemini", open_stream, model=self.id, span=span)
+            while chunk is not _END:
+                _record_first_token(span, start)
+                record_model_usage(span, chunk)
+                yield chunk
+                chunk = next(iterator, _END)
+
+    async def ainvoke(self, *args, **kwargs):
+        ainvoke = super().ainvoke
+        with model_call(self.id, tier=self.tier) as span:
+            response = await acall_with_retries("gemini", lambda: ainvoke(*args, **kwargs), model=self.id, span=span)
+            record_model_usage(span, response)
+            return response
+
+    async def ainvoke_stream(self, *args, **kwargs):
+        ainvoke_stream = super().ainvoke_stream
+        with model_call(self.id, tier=self.tier) as span:
+            start = time.perf_counter()
+
+            async def open_stream():
+                iterator = ainvoke_stream(*args, **kwargs).__aiter__()
+                try:
+                    return iterator, await iterator.__anext__()
+                except StopAsyncIteration:
+                    return iterator, _END
+
+            iterator, chunk = await acall_with_retries("gemini", open_stream, model=self.id, span=span)
+            while chunk is not _END:
+                _record_first_token(span, start)
+                record_model_usage(span, chunk)
+                yield chunk
+                try:
+                    chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    chunk = _END
+
+
+def _last_user_text(messages) -> str:
+    for message in reversed(messages or []):
+        if message.role == "user":
+            return message.get_content_string()
+    return ""
+
+
+def _response_text(responses) -> Tuple[Optional[str], bool]:
+    """
+    (texto, truncada) de una respuesta de Gemini o de los chunks de un stream.
+
+    El texto es None si la respuesta pide herramientas: sólo se comprueban
+    respuestas finales.
+    """
+    text, truncated = [], False
+    for response in responses:
+        for candidate in (getattr(response, "candidates", None) or [])[:1]:
+            parts = candidate.content.parts if candidate.content and candidate.content.parts else []
+            if any(part.function_call for part in parts):
+                return None, False
+            text.extend(part.text for part in parts if part.text and not part.thought)
+            truncated = truncated or str(candidate.finish_reason or "").endswith("MAX_TOKENS")
+    return "".join(text), truncated
+
+
+@dataclass
+class TieredGemini(RateLimitedGemini):
+    """
+    Gemini que elige Flash o Pro en cada llamada según la tarea del último mensaje del usuario.
+
+    ``id`` es el modelo Pro. Las llamadas se delegan en modelos internos con la
+    misma configuración, creados en el primer uso; con escalado activo, una
+    respuesta final de Flash que no pasa ``self_check`` se repite con Pro. En
+    streaming esto obliga a recibir la respuesta de Flash completa antes de
+    emitirla, así que sólo se hace con escalado activo.
+    """
+
+    flash_id: Optional[str] = None
+    escalation: bool = True
+
+    def _tier_model(self, tier: str) -> RateLimitedGemini:
+        models = self.__dict__.setdefault("_tier_models", {})
+        if tier not in models:
+            config = {f.name: getattr(self, f.name) for f in fields(RateLimitedGemini) if f.init}
+            config.update(id=self.flash_id if tier == TIER_FLASH else self.id, tier=tier, client=None)
+            models[tier] = RateLimitedGemini(**config)
+        return models[tier]
+
+    def _decide(self, messages) -> TierDecision:
+        return choose_tier(_last_user_text(messages))
+
+    def _escalation_reason(self, decision: TierDecision, responses) -> Optional[str]:
+        if decision.tier != TIER_FLASH or not self.escalation:
+            return None
+        text, truncated = _response_text(responses)
+        if text is None:
+            return None
+        reason = self_check(text, decision, truncated)
+        if reason:
+            logger.info(f"Escalating to {self.id}: flash answer failed self-check ({reason})")
+        return reason
+
+    def invoke(self, messages, *args, **kwargs):
+        decision = self._decide(messages)
+        response = self._tier_model(decision.tier).invoke(messages, *args, **kwargs)
+        if self._escalation_reason(decision, [response]):
+            response = self._tier_model(TIER_ESCALATED).invoke(messages, *args, **kwargs)
+        return response
+
+    def invoke_stream(self, messages, *args, **kwargs):
+        decision = self._decide(messages)
+        model = self._tier_model(decision.tier)
+        if decision.tier != TIER_FLASH or not self.escalation:
+            yield from model.invoke_stream(messages, *args, **kwargs)
+            return
+        chunks = list(model.invoke_stream(messages, *args, **kwargs))
+        if self._escalation_reason(decision, chunks):
+            chunks = self._tier_model(TIER_ESCALATED).invoke_stream(messages, *args, **kwargs)
+        yield from chunks
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        decision = self._decide(messages)
+        response = await self._tier_model(decision.tier).ainvoke(messages, *args, **kwargs)
+        if self._escalation_reason(decision, [response]):
+            response = await self._tier_model(TIER_ESCALATED).ainvoke(messages, *args, **kwargs)
+        return response
+
+    async def ainvoke_stream(self, messages, *args, **kwargs):
+        decision = self._decide(messages)
+        model = self._tier_model(decision.tier)
+        if decision.tier != TIER_FLASH or not self.escalation:
+            async for chunk in model.ainvoke_stream(messages, *args, **kwargs):
+                yield chunk
+            return
+        chunks = [chunk async for chunk in model.ainvoke_stream(messages, *args, **kwargs)]
+        if self._escalation_reason(decision, chunks):
+            chunks = [chunk async for chunk in self._tier_model(TIER_ESCALATED).ainvoke_stream(messages, *args, **kwargs)]
+        for chunk in chunks:
+            yield chunk
+
+
+def build_model(model_id: str) -> Gemini:
+    """
+    Crea un modelo Gemini con la API key y el limitador de tasa configurados.
+
+    Con ``MODEL_TIERING``, el modelo Pro se sustituye por uno que elige nivel en
+    cada llamada.
+    """
+    if model_id == settings.default_llm_pro and settings.model_tiering:
+        return TieredGemini(
+            id=model_id,
+            api_key=settings.google_api_key,
+            flash_id=settings.default_llm_flash,
+            escalation=settings.model_tier_escalation,
+        )
+    tier = TIER_FLASH if model_id == settings.default_llm_flash else TIER_PRO
+    return RateLimitedGemini(id=model_id, api_key=settings.google_api_key, tier=tier)
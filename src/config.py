@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, List, Optional
 
 class AppSettings(BaseSettings):
     """Configuración centralizada de la aplicación."""
@@ -10,18 +11,140 @@ class AppSettings(BaseSettings):
         extra='ignore'
     )
     
-    # Google Cloud
-    google_project_id: str
-    google_api_key: str
-    data_store_id: str
+    # Google Cloud (se validan con require_gcp() sólo en los comandos que los usan)
+    google_project_id: Optional[str] = None
+    google_api_key: Optional[str] = None
+    data_store_id: Optional[str] = None
     
     # Database
     db_file_path: str = "tmp/agents.db"
     db_table_prefix: str = "team"
+    # "per_session": una tabla por sesión | "shared": una tabla indexada para todas
+    session_storage_mode: str = "per_session"
+    db_sessions_table: str = "team_sessions"
+    # Conexiones SQLite (WAL + busy timeout + mmap)
+    db_busy_timeout_ms: int = 5000
+    db_mmap_size: int = 268435456
+    # Retención: tamaño de lote por transacción y umbral de páginas libres para VACUUM
+    cleanup_batch_size: int = 500
+    vacuum_freelist_ratio: float = 0.2
+    
+    # Caché de resultados (por defecto junto a db_file_path, en cache.db)
+    cache_db_file_path: Optional[str] = None
+    search_cache_enabled: bool = True
+    search_cache_ttl_seconds: int = 86400
+    search_cache_memory_entries: int = 256
+    search_cache_disk_entries: int = 5000
+    # Búsquedas simultáneas de search_many contra Vertex AI Search
+    vertex_search_max_concurrency: int = 4
+    # Qué devuelve Vertex AI Search: "segments" (segmentos extractivos, edición Enterprise) |
+    # "chunks" (data store con chunking de documentos) | "documents" (contenido completo)
+    vertex_search_result_mode: str = "segments"
+    vertex_search_segments_per_document: int = 3
+    # Tokens de pasajes por llamada a search/search_many (se llenan por orden de relevancia)
+    rag_token_budget: int = 1500
+    # Caché del Web Agent: búsquedas/noticias por consulta y páginas por URL (ETag/Last-Modified)
+    web_cache_enabled: bool = True
+    web_cache_ttl_seconds: int = 21600
+    web_news_cache_ttl_seconds: int = 1800
+    web_cache_disk_entries: int = 5000
+    web_page_fresh_seconds: int = 3600  # si la respuesta no trae Cache-Control: max-age
+    web_page_cache_ttl_seconds: int = 604800
+    web_page_cache_max_bytes: int = 52428800
+    web_page_max_bytes: int = 2097152  # descarga máxima por página
+    web_page_max_chars: int = 8000  # texto devuelto al agente
+    # Memoización por sesión de herramientas de búsqueda (tabla session_tool_memo en db_file_path)
+    tool_memo_enabled: bool = True
+    tool_memo_ttl_seconds: int = 21600
+    tool_memo_tools: List[str] = ["search", "search_many", "duckduckgo_search", "duckduckgo_news", "fetch_page"]
+    
+    # Backend RAG: "vertex" | "local" (índice en disco) | "hybrid" (local primero, Vertex si no basta)
+    rag_backend: str = "vertex"
+    local_index_dir: Optional[str] = None  # por defecto local_index/ junto a db_file_path
+    local_index_nlist: int = 0  # listas IVF al construir (0 = búsqueda exacta)
+    local_index_nprobe: int = 8
+    local_index_min_score: float = 0.55  # en hybrid, por debajo se consulta Vertex
     
     # Models
     default_llm_pro: str = "gemini-2.5-pro"
     default_llm_flash: str = "gemini-2.5-flash"
+    embedding_model: str = "gemini-embedding-001"
+    embedding_dimensions: int = 768
+    # Caché de contexto de Gemini para el prefijo estático del system prompt (opt-in)
+    gemini_context_cache_enabled: bool = False
+    gemini_context_cache_ttl_seconds: int = 3600
+    gemini_context_cache_min_tokens: int = 1024  # Gemini rechaza cachés más pequeñas
+    # Niveles de modelo (opt-in): los componentes en Pro eligen Flash o Pro en cada llamada
+    model_tiering: bool = False
+    model_tier_escalation: bool = True  # repetir con Pro si la respuesta de Flash no pasa el self-check
+    model_tier_flash_max_words: int = 40  # tareas más largas van a Pro
+    model_tier_min_answer_chars: int = 20
+    # Precio (USD por millón de tokens: [entrada, salida]) para estimar el coste en `stats`
+    model_prices_per_million: Dict[str, List[float]] = {
+        "gemini-2.5-pro": [1.25, 10.0],
+        "gemini-2.5-flash": [0.30, 2.50],
+    }
+    
+    # Caché semántica de respuestas del equipo (opt-in)
+    answer_cache_enabled: bool = False
+    answer_cache_threshold: float = 0.92
+    answer_cache_ttl_seconds: int = 604800
+    answer_cache_per_user: bool = True
+    answer_cache_min_words: int = 4
+    
+    # Historial de sesión: resumen acumulado + últimos N turnos literales
+    history_token_budget: int = 6000
+    history_recent_turns: int = 3
+    history_summary_max_words: int = 300
+    
+    # Pre-router: "off" | "keywords" (reglas) | "flash" (reglas + Gemini Flash si no concluyen)
+    router_mode: str = "off"
+    router_confidence_threshold: float = 0.8
+    
+    # Orquestación: "coordinate" (agno, secuencial) | "parallel" (fan-out concurrente + síntesis)
+    team_execution_mode: str = "coordinate"
+    member_timeout_seconds: float = 60.0
+    member_timeouts: Dict[str, float] = {}  # p.ej. {"Web Agent": 20}
+    
+    # Telemetría: spans por turno en telemetry.db (junto a db_file_path) y, opcional, OTLP/JSON
+    telemetry_enabled: bool = True
+    telemetry_db_file_path: Optional[str] = None
+    telemetry_otlp_json_path: Optional[str] = None
+    
+    # Límites de tasa (peticiones/minuto; 0 = sin límite), adaptativos ante 429
+    gemini_requests_per_minute: int = 0
+    vertex_requests_per_minute: int = 0
+    model_requests_per_minute: Dict[str, int] = {}  # p.ej. {"gemini-2.5-pro": 5}
+    rate_limit_shared: bool = True  # buckets compartidos entre procesos vía SQLite
+    rate_limit_db_file_path: Optional[str] = None  # por defecto rate_limits.db junto a db_file_path
+    rate_limit_max_retries: int = 4  # reintentos ante 429 y errores 5xx transitorios
+    rate_limit_backoff_seconds: float = 1.0
+    rate_limit_max_backoff_seconds: float = 60.0
+    
+    # Servidor HTTP (serve): clave de API → usuario, enviada en la cabecera X-API-Key.
+    # Vacío = sin autenticación (el usuario viene en la petición; sólo para uso local)
+    server_api_keys: Dict[str, str] = {}  # p.ej. {"clave-larga-aleatoria": "ana"}
+    
+    def require_gcp(self) -> None:
+        """Falla con un mensaje claro si faltan las variables de Google Cloud."""
+        missing = [
+            name.upper()
+            for name in ("google_project_id", "google_api_key", "data_store_id")
+            if not getattr(self, name)
+        ]
+        if missing:
+            raise ValueError(f"Faltan variables de entorno de Google Cloud: {', '.join(missing)}")
+
+@lru_cache(maxsize=1)
+def get_settings() -> AppSettings:
+    """Crea la configuración en el primer uso (no al importar el módulo)."""
+    return AppSettings()
+
+class _LazySettings:
+    """Proxy que difiere la lectura de .env/variables hasta el primer atributo."""
+    
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
 
-# Instancia singleton
-settings = AppSettings()
\ No newline at end of file
+# Instancia singleton (perezosa)
+settings = _LazySettings()
\ No newline at end of file
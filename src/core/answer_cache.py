@@ -0,0 +1,251 @@
+"""
+Caché semántica de respuestas completas del equipo.
+
+Cada consulta se convierte en un embedding; si una consulta anterior (del
+mismo usuario o global, según configuración) supera el umbral de similitud
+coseno y no ha expirado, se devuelve su respuesta sin ejecutar ``team.run``.
+Los embeddings viven en SQLite (``cache.db``) y se cargan en una matriz NumPy
+normalizada por scope, de modo que cada búsqueda es un único producto matriz-vector.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import settings
+from src.storage.cache import default_cache_path
+from src.storage.connection import get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answer_cache (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    query TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answer_cache_scope_created ON answer_cache(scope, created_at);
+"""
+
+
+@dataclass
+class CachedAnswer:
+    """Respuesta recuperada de la caché semántica."""
+    query: str
+    answer: str
+    similarity: float
+    created_at: float
+
+
+class _ScopeIndex:
+    """
+    Matriz de embeddings normalizados de un scope, en memoria.
+    
+    Las filas viven en un buffer preasignado que crece al doble cuando se
+    llena, así que ``add`` no copia la matriz en cada inserción.
+    """
+
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, dimensions: int):
+        self.size = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._created_at = np.empty(0, dtype=np.float64)
+        self._matrix = np.empty((0, dimensions), dtype=np.float32)
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self.size]
+
+    @property
+    def created_at(self) -> np.ndarray:
+        return self._created_at[:self.size]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._matrix[:self.size]
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= self._matrix.shape[0]:
+            return
+        capacity = max(capacity, self.INITIAL_CAPACITY, 2 * self._matrix.shape[0])
+        for name in ("_ids", "_created_at", "_matrix"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def extend(self, ids: List[int], created_at: List[float], vectors: np.ndarray) -> None:
+        count = len(ids)
+        self._reserve(self.size + count)
+        self._ids[self.size:self.size + count] = ids
+        self._created_at[self.size:self.size + count] = created_at
+        self._matrix[self.size:self.size + count] = vectors
+        self.size += count
+
+    def add(self, row_id: int, created_at: float, vector: np.ndarray) -> None:
+        self.extend([row_id], [created_at], vector[np.newaxis, :])
+
+    def contains(self, row_id: int) -> bool:
+        return bool(np.any(self.ids == row_id))
+
+    def prune(self, cutoff: float) -> None:
+        """Descarta las filas creadas antes de ``cutoff`` (expiradas)."""
+        keep = self.created_at >= cutoff
+        if keep.all():
+            return
+        count = int(keep.sum())
+        self._ids[:count] = self.ids[keep]
+        self._created_at[:count] = self.created_at[keep]
+        self._matrix[:count] = self.matrix[keep]
+        self.size = count
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticAnswerCache:
+    """Caché de respuestas indexada por similitud de embeddings."""
+
+    def __init__(
+        self,
+        threshold: float,
+        ttl_seconds: int,
+        per_user: bool = True,
+        db_path: Optional[str] = None,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.per_user = per_user
+        self.db_path = db_path or default_cache_path()
+        self._indexes: Dict[str, _ScopeIndex] = {}
+        self._lock = threading.Lock()
+        self._embedder = None
+
+        get_connection(self.db_path).executescript(_SCHEMA)
+
+    def _scope(self, user: str) -> str:
+        return user if self.per_user else "__global__"
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """Embedding normalizado de un texto (None si el servicio falla)."""
+        if self._embedder is None:
+            from agno.embedder.google import GeminiEmbedder
+
+            self._embedder = GeminiEmbedder(
+                id=settings.embedding_model,
+                api_key=settings.google_api_key,
+                dimensions=settings.embedding_dimensions,
+            )
+        try:
+            vector = np.asarray(self._embedder.get_embedding(text), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Embedding failed, skipping answer cache: {e}")
+            return None
+        if vector.size == 0:
+            return None
+        return _normalize(vector)
+
+    def _load_scope(self, scope: str, dimensions: int) -> _ScopeIndex:
+        index = self._indexes.get(scope)
+        if index is not None:
+            return index
+
+        conn = get_connection(self.db_path)
+        cutoff = time.time() - self.ttl_seconds
+        with transaction(conn):
+            conn.execute("DELETE FROM answer_cache WHERE scope = ? AND created_at < ?", (scope, cutoff))
+        index = _ScopeIndex(dimensions)
+        rows = conn.execute(
+            "SELECT id, created_at, embedding FROM answer_cache WHERE scope = ? ORDER BY id",
+            (scope,),
+        ).fetchall()
+        if rows:
+            vectors = [np.frombuffer(blob, dtype=np.float32) for _, _, blob in rows]
+            valid = [(r, v) for r, v in zip(rows, vectors) if v.shape[0] == dimensions]
+            if valid:
+                index.extend(
+                    [r[0] for r, _ in valid],
+                    [r[1] for r, _ in valid],
+                    np.vstack([v for _, v in valid]),
+                )
+        self._indexes[scope] = index
+        return index
+
+    def lookup(self, query: str, user: str) -> Tuple[Optional[CachedAnswer], Optional[np.ndarray]]:
+        """
+        Busca una respuesta previa similar.
+
+        Devuelve (respuesta o None, embedding de la consulta) para que el
+        llamador pueda reutilizar el embedding al guardar la nueva respuesta.
+        """
+        vector = self.embed(query)
+        if vector is None:
+            return None, None
+
+        scope = self._scope(user)
+        with self._lock:
+            index = self._load_scope(scope, vector.shape[0])
+            # Las filas expiradas se descartan antes del argmax para no ocultar otras válidas
+            index.prune(time.time() - self.ttl_seconds)
+            if not index.size:
+                return None, vector
+
+            similarities = index.matrix @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            created_at = float(index.created_at[best])
+            row_id = int(index.ids[best])
+
+        if similarity < self.threshold:
+            return None, vector
+
+        row = get_connection(self.db_path).execute(
+            "SELECT query, answer FROM answer_cache WHERE id = ?", (row_id,)
+        ).fetchone()
+        if row is None:
+            return None, vector
+        logger.info(f"Answer cache hit (similarity={similarity:.3f}) for scope '{scope}'")
+        return CachedAnswer(query=row[0], answer=row[1], similarity=similarity, created_at=created_at), vector
+
+    def store(self, query: str, answer: str, user: str, vector: Optional[np.ndarray] = None) -> None:
+        """Guarda una respuesta nueva con el embedding de su consulta."""
+        if vector is None:
+            vector = self.embed(query)
+            if vector is None:
+                return
+
+        scope = self._scope(user)
+        now = time.time()
+        conn = get_connection(self.db_path)
+        with transaction(conn):
+            cursor = conn.execute(
+                "INSERT INTO answer_cache (scope, query, answer, embedding, created_at) VALUES (?, ?, ?, ?, ?)",
+                (scope, query, answer, vector.astype(np.float32).tobytes(), now),
+            )
+        with self._lock:
+            index = self._load_scope(scope, vector.shape[0])
+            if not index.contains(cursor.lastrowid):
+                index.add(cursor.lastrowid, now, vector)
+
+
+def is_cacheable_query(query: str) -> bool:
+    """Las consultas muy cortas suelen depender del contexto ("¿y en Spark?")."""
+    return len(query.split()) >= settings.answer_cache_min_words
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Crea la caché semántica con la configuración actual."""
+    return SemanticAnswerCache(
+        threshold=settings.answer_cache_threshold,
+        ttl_seconds=settings.answer_cache_ttl_seconds,
+        per_user=settings.answer_cache_per_user,
+    )
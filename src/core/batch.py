@@ -0,0 +1,214 @@
+"""
+Ejecución no interactiva de lotes de consultas.
+
+Lee consultas desde JSONL o CSV, las reparte entre un pool de workers y
+escribe cada resultado en un JSONL de salida en cuanto termina, con su
+latencia. Cada consulta usa una sesión nueva de ``build_team``, así que la
+respuesta no depende del orden en que el pool reparta el trabajo; las filas
+con la misma columna ``session`` (y usuario) se ejecutan en orden dentro de
+una misma sesión para conservar el historial. Los límites de Gemini y Vertex
+se respetan a través de los limitadores compartidos de ``src.core.rate_limit``.
+"""
+import csv
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.core.runner import run_turn
+from src.core.team_builder import build_team, generate_session_id
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchQuery:
+    """Consulta de entrada del lote."""
+    id: str
+    query: str
+    user: str
+    session: Optional[str] = None
+
+
+@dataclass
+class BatchResult:
+    """Resultado de una consulta del lote (una línea del JSONL de salida)."""
+    id: str
+    user: str
+    session_id: str
+    query: str
+    status: str
+    latency_ms: float
+    response: Optional[str] = None
+    error: Optional[str] = None
+    worker: Optional[str] = None
+    session: Optional[str] = None
+
+
+@dataclass
+class BatchSummary:
+    """Resumen agregado de una ejecución."""
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    wall_time_s: float = 0.0
+    latencies_ms: List[float] = field(default_factory=list)
+
+    @property
+    def throughput_per_min(self) -> float:
+        return self.total / self.wall_time_s * 60 if self.wall_time_s else 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def _jsonl_rows(path: str, lines) -> Iterator[Tuple[int, dict]]:
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            logger.warning(f"{path}:{line_number}: skipping invalid JSON line ({e})")
+            continue
+        if not isinstance(row, dict):
+            logger.warning(f"{path}:{line_number}: skipping line that is not a JSON object")
+            continue
+        yield line_number, row
+
+
+def _csv_rows(path: str, f) -> Iterator[Tuple[int, dict]]:
+    reader = csv.DictReader(f)
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except csv.Error as e:
+        raise ValueError(f"{path}:{reader.line_num}: invalid CSV ({e})") from e
+
+
+def load_queries(path: str, default_user: str) -> List[BatchQuery]:
+    """
+    Carga consultas de un JSONL (``{"query": ...}``) o CSV (columna ``query``).
+    
+    Campos opcionales: ``id``, ``user`` y ``session`` (agrupa consultas en una
+    misma sesión). Las líneas inválidas se omiten con un aviso que indica
+    archivo y línea.
+    """
+    queries: List[BatchQuery] = []
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = _csv_rows(path, f)
+        else:
+            rows = _jsonl_rows(path, f)
+
+        for index, (line_number, row) in enumerate(rows, start=1):
+            query = str(row.get("query") or "").strip()
+            if not query:
+                logger.warning(f"{path}:{line_number}: skipping row without 'query'")
+                continue
+            queries.append(BatchQuery(
+                id=str(row.get("id") or index),
+                query=query,
+                user=str(row.get("user") or default_user),
+                session=str(row["session"]) if row.get("session") else None,
+            ))
+    return queries
+
+
+def group_queries(queries: List[BatchQuery]) -> List[List[BatchQuery]]:
+    """
+    Agrupa las consultas en cadenas que comparten sesión.
+    
+    Cada consulta sin ``session`` es su propia cadena; las que comparten
+    ``(user, session)`` forman una cadena en el orden del archivo.
+    """
+    chains: List[List[BatchQuery]] = []
+    by_session: Dict[Tuple[str, str], List[BatchQuery]] = {}
+    for item in queries:
+        if item.session is None:
+            chains.append([item])
+            continue
+        key = (item.user, item.session)
+        if key not in by_session:
+            by_session[key] = []
+            chains.append(by_session[key])
+        by_session[key].append(item)
+    return chains
+
+
+def run_batch(
+    queries: List[BatchQuery],
+    output_path: str,
+    workers: int = 4,
+    on_result: Optional[Callable[[BatchResult], None]] = None,
+) -> BatchSummary:
+    """Ejecuta el lote con ``workers`` hilos y va escribiendo los resultados."""
+    summary = BatchSummary(total=len(queries))
+
+    def process(item: BatchQuery, team) -> BatchResult:
+        start = time.perf_counter()
+        session_id = getattr(team, "session_id", "") or ""
+        try:
+            if team is None:
+                raise RuntimeError("No se pudo crear el equipo de la sesión")
+            response = run_turn(team, item.query, item.user, session_id)
+            return BatchResult(
+                id=item.id,
+                user=item.user,
+                session_id=session_id,
+                query=item.query,
+                status="ok",
+                latency_ms=(time.perf_counter() - start) * 1000,
+                response=getattr(response, "content", str(response)),
+                worker=threading.current_thread().name,
+                session=item.session,
+            )
+        except Exception as e:
+            logger.error(f"Batch query {item.id} failed: {e}", exc_info=True)
+            return BatchResult(
+                id=item.id,
+                user=item.user,
+                session_id=session_id,
+                query=item.query,
+                status="error",
+                latency_ms=(time.perf_counter() - start) * 1000,
+                error=str(e),
+                worker=threading.current_thread().name,
+                session=item.session,
+            )
+
+    def process_chain(chain: List[BatchQuery]) -> List[BatchResult]:
+        # Un equipo (y una sesión nueva) por cadena: el historial sólo incluye sus consultas previas
+        user = chain[0].user
+        try:
+            team = build_team(user, generate_session_id(user))
+        except Exception as e:
+            logger.error(f"Could not build team for batch session {chain[0].session!r}: {e}", exc_info=True)
+            team = None
+        return [process(item, team) for item in chain]
+
+    start = time.perf_counter()
+    with open(output_path, "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as executor:
+        futures = [executor.submit(process_chain, chain) for chain in group_queries(queries)]
+        for future in as_completed(futures):
+            # Las escrituras ocurren sólo en este hilo, en orden de finalización
+            for result in future.result():
+                out.write(json.dumps(asdict(result), ensure_ascii=False) + "\n")
+                out.flush()
+                summary.latencies_ms.append(result.latency_ms)
+                if result.status == "ok":
+                    summary.succeeded += 1
+                else:
+                    summary.failed += 1
+                if on_result is not None:
+                    on_result(result)
+
+    summary.wall_time_s = time.perf_counter() - start
+    return summary
@@ -0,0 +1,133 @@
+"""
+Historial de sesión con presupuesto de tokens.
+
+En lugar de reenviar todo el historial en cada turno, el orquestador recibe
+(vía ``additional_context``) un resumen acumulado de los turnos antiguos y los
+últimos ``history_recent_turns`` turnos literales. Cuando el historial sin
+resumir supera ``history_token_budget``, los turnos más antiguos se pliegan en
+el resumen con el modelo Flash; así el tamaño del prompt se mantiene estable
+aunque la sesión crezca.
+"""
+import logging
+from typing import List, Optional
+
+from src.config import settings
+from src.storage.turns import (
+    SessionSummary,
+    Turn,
+    append_turn,
+    get_summary,
+    get_turns,
+    save_summary,
+)
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = """
+Eres un asistente que mantiene el resumen de una conversación técnica de Ingeniería de Datos.
+Recibirás el resumen previo (si existe) y nuevos turnos usuario/equipo.
+Devuelve un único resumen actualizado en español que conserve:
+- Objetivos y restricciones del usuario (stack, volúmenes, plataformas).
+- Decisiones tomadas y recomendaciones ya dadas.
+- Nombres de tablas, pipelines, archivos y fragmentos de código referenciados.
+- Preguntas abiertas.
+No inventes información ni añadas recomendaciones nuevas.
+"""
+
+
+def _format_turn(turn: Turn) -> str:
+    return f"### Turno {turn.turn}\n**Usuario:** {turn.query}\n\n**Equipo:** {turn.answer}"
+
+
+class HistoryManager:
+    """Contexto acotado (resumen + turnos recientes) de una sesión."""
+
+    def __init__(
+        self,
+        user: str,
+        session_id: str,
+        token_budget: Optional[int] = None,
+        recent_turns: Optional[int] = None,
+    ):
+        self.user = user
+        self.session_id = session_id
+        self.token_budget = token_budget if token_budget is not None else settings.history_token_budget
+        self.recent_turns = max(1, recent_turns if recent_turns is not None else settings.history_recent_turns)
+
+    def _state(self):
+        summary = get_summary(self.user, self.session_id)
+        turns = get_turns(self.user, self.session_id, summary.through_turn if summary else 0)
+        return summary, turns
+
+    def build_context(self) -> str:
+        """Texto para ``additional_context``: resumen y turnos recientes dentro del presupuesto."""
+        summary, turns = self._state()
+        if summary is None and not turns:
+            return ""
+
+        # Si el resumen no pudo actualizarse, recortar igualmente los turnos literales
+        available = self.token_budget - (summary.tokens if summary else 0)
+        kept: List[Turn] = []
+        for turn in reversed(turns):
+            if kept and (available - turn.tokens < 0 or len(kept) >= self.recent_turns):
+                break
+            kept.insert(0, turn)
+            available -= turn.tokens
+
+        parts = ["HISTORIAL DE LA SESIÓN"]
+        if summary is not None:
+            parts.append(f"## Resumen de la conversación (turnos 1-{summary.through_turn})\n{summary.summary}")
+        if kept:
+            parts.append("## Turnos recientes\n" + "\n\n".join(_format_turn(turn) for turn in kept))
+        return "\n\n".join(parts)
+
+    def record(self, query: str, answer: str, agent: Optional[str] = None,
+               duration_ms: Optional[float] = None, tier: Optional[str] = None) -> Turn:
+        """Guarda un turno y pliega los antiguos en el resumen si se superó el presupuesto."""
+        turn = append_turn(self.user, self.session_id, query, answer, agent, duration_ms, tier)
+        self.compact()
+        return turn
+
+    def compact(self) -> Optional[SessionSummary]:
+        """Resume los turnos fuera de la ventana reciente cuando el historial excede el presupuesto."""
+        summary, turns = self._state()
+        total = (summary.tokens if summary else 0) + sum(turn.tokens for turn in turns)
+        if total <= self.token_budget or len(turns) <= self.recent_turns:
+            return None
+
+        to_fold = turns[:-self.recent_turns]
+        try:
+            text = summarize_turns(summary.summary if summary else None, to_fold)
+        except Exception as e:
+            logger.warning(f"History summarization failed for session {self.session_id}: {e}")
+            return None
+        if not text:
+            return None
+
+        logger.info(
+            f"Folded turns {to_fold[0].turn}-{to_fold[-1].turn} of session {self.session_id} "
+            f"into rolling summary ({total} tokens over budget {self.token_budget})"
+        )
+        return save_summary(self.user, self.session_id, text, to_fold[-1].turn)
+
+
+def summarize_turns(previous: Optional[str], turns: List[Turn]) -> str:
+    """Resumen actualizado (modelo Flash) a partir del resumen previo y nuevos turnos."""
+    from agno.agent import Agent
+    from src.agents.models import build_model
+    from src.core.telemetry import span
+
+    summarizer = Agent(
+        name="History Summarizer",
+        model=build_model(settings.default_llm_flash),
+        instructions=SUMMARY_INSTRUCTIONS,
+        markdown=False,
+    )
+    prompt = (
+        f"RESUMEN PREVIO:\n{previous or '(ninguno)'}\n\n"
+        f"NUEVOS TURNOS:\n" + "\n\n".join(_format_turn(turn) for turn in turns) +
+        f"\n\nResumen actualizado (máximo {settings.history_summary_max_words} palabras):"
+    )
+    with span(f"agent:{summarizer.name}", "agent", owner=summarizer.name):
+        response = summarizer.run(prompt)
+    return (getattr(response, "content", None) or "").strip()
@@ -0,0 +1,161 @@
+"""
+Ejecución en paralelo de los agentes miembros independientes.
+
+En modo ``coordinate`` el orquestador delega en el Web Agent y en el RAG Agent
+uno detrás de otro, aunque ninguna búsqueda depende de la otra. ``ParallelTeam``
+lanza esas consultas a la vez, cada una con su propio timeout, y después pide
+al orquestador que sintetice los resultados en el formato habitual. El Code
+Standards Agent sigue dependiendo del orquestador porque necesita el contexto
+recuperado. Si las reglas del router (``classify_keywords``) asignan la
+consulta a un único miembro (p.ej. sólo código), no hay búsquedas que
+paralelizar y se usa ``team.run`` normal, sin duplicar llamadas a RAG y Web.
+
+Los resultados llegan al orquestador en su ``additional_context`` y no en el
+mensaje, así la memoria de la sesión guarda la consulta del usuario tal cual.
+Un miembro que excede su timeout sigue ejecutándose en su hilo: hasta que
+termina no se le vuelve a lanzar ni el orquestador puede delegar en él.
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from src.core.router import TEAM_ROUTE, classify_keywords
+from src.core.streaming import MemberStatus
+
+logger = logging.getLogger(__name__)
+
+# Sección del formato de respuesta que corresponde a cada miembro
+MEMBER_SECTIONS = {
+    "RAG Agent": "📚 Conocimiento Interno (RAG)",
+    "Web Agent": "🌐 Documentación Externa (Web)",
+}
+
+
+class ParallelTeam:
+    """Envuelve un ``Team`` de agno añadiendo un fan-out concurrente previo."""
+
+    def __init__(
+        self,
+        team,
+        fan_out_members: List,
+        default_timeout: float,
+        member_timeouts: Optional[Dict[str, float]] = None,
+    ):
+        self.team = team
+        self.fan_out_members = fan_out_members
+        self.default_timeout = default_timeout
+        self.member_timeouts = member_timeouts or {}
+        # Última ejecución de cada miembro del fan-out (puede seguir en curso tras un timeout)
+        self._member_runs: Dict[str, Future] = {}
+
+    def __getattr__(self, name):
+        # Todo lo demás (session_id, storage, members...) se delega al Team
+        return getattr(self.team, name)
+
+    def _timeout_for(self, member) -> float:
+        return self.member_timeouts.get(member.name, self.default_timeout)
+
+    def _busy(self, member) -> bool:
+        """El miembro sigue con una ejecución abandonada por timeout (el Agent no admite dos a la vez)."""
+        future = self._member_runs.get(member.name)
+        return future is not None and not future.done()
+
+    def needs_fan_out(self, query: str) -> bool:
+        """Sólo compensa consultar RAG y Web a la vez si la consulta no apunta a un único miembro."""
+        route = classify_keywords(query).route
+        if route != TEAM_ROUTE:
+            logger.info(f"Skipping fan-out: query targets '{route}' only")
+            return False
+        return True
+
+    def fan_out(self, query: str) -> Dict[str, str]:
+        """Consulta a los miembros independientes a la vez; los lentos se degradan."""
+        results: Dict[str, str] = {}
+        start = time.monotonic()
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, len(self.fan_out_members)),
+            thread_name_prefix="member",
+        )
+        try:
+            futures = []
+            for member in self.fan_out_members:
+                if self._busy(member):
+                    logger.warning(f"Member '{member.name}' is still running a previous query; skipping")
+                    results[member.name] = f"⏱️ {member.name} sigue ocupado con una consulta anterior."
+                    continue
+                # copy_context: las trazas del turno siguen el trabajo a los hilos del pool
+                future = executor.submit(contextvars.copy_context().run, member.run, query)
+                self._member_runs[member.name] = future
+                futures.append((member, future))
+
+            # Esperar primero a los que vencen antes; todos corren a la vez
+            pending = sorted(futures, key=lambda item: self._timeout_for(item[0]))
+            for member, future in pending:
+                timeout = self._timeout_for(member)
+                remaining = max(0.0, start + timeout - time.monotonic())
+                try:
+                    response = future.result(timeout=remaining)
+                    results[member.name] = getattr(response, "content", None) or str(response)
+                except FutureTimeoutError:
+                    logger.warning(f"Member '{member.name}' timed out after {timeout}s")
+                    results[member.name] = f"⏱️ Sin respuesta de {member.name} en {timeout:.0f}s."
+                except Exception as e:
+                    logger.error(f"Member '{member.name}' failed: {e}", exc_info=True)
+                    results[member.name] = f"⚠️ {member.name} no disponible: {e}"
+        finally:
+            # No bloquear la respuesta esperando a los miembros que excedieron su timeout
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        logger.info(f"Fan-out of {len(results)} members finished in {time.monotonic() - start:.2f}s")
+        return results
+
+    def _synthesis_context(self, results: Dict[str, str]) -> str:
+        sections = "\n\n".join(
+            f"### {MEMBER_SECTIONS.get(name, name)} — {name}\n{content}"
+            for name, content in results.items()
+        )
+        return (
+            f"RESULTADOS YA OBTENIDOS EN PARALELO PARA LA CONSULTA ACTUAL "
+            f"(no vuelvas a delegar estas búsquedas):\n\n"
+            f"{sections}\n\n"
+            f"Integra estos resultados en las secciones correspondientes del formato de respuesta. "
+            f"Si algún miembro no respondió, indícalo brevemente y continúa con la información disponible. "
+            f"Si la consulta requiere código, delega únicamente en el Code Standards Agent."
+        )
+
+    @contextmanager
+    def _synthesis(self, results: Dict[str, str]):
+        """Durante la síntesis: resultados en el contexto del orquestador y sin los miembros ocupados."""
+        team = self.team
+        previous_context, previous_members = team.additional_context, team.members
+        team.additional_context = "\n\n".join(
+            part for part in (previous_context, self._synthesis_context(results)) if part
+        )
+        team.members = [member for member in previous_members if not self._busy(member)]
+        try:
+            yield team
+        finally:
+            team.additional_context = previous_context
+            team.members = previous_members
+
+    def run(self, query: str, stream: bool = False, **kwargs):
+        """Fan-out concurrente + síntesis del orquestador (misma firma que ``Team.run``)."""
+        if not self.needs_fan_out(query):
+            return self.team.run(query, stream=stream, **kwargs)
+        if stream:
+            return self._run_stream(query, **kwargs)
+        results = self.fan_out(query)
+        with self._synthesis(results) as team:
+            return team.run(query, **kwargs)
+
+    def _run_stream(self, query: str, **kwargs):
+        names = ", ".join(member.name for member in self.fan_out_members)
+        yield MemberStatus(member=names)
+        results = self.fan_out(query)
+        yield MemberStatus(member=None, finished=True)
+        with self._synthesis(results) as team:
+            yield from team.run(query, stream=True, **kwargs)
@@ -0,0 +1,376 @@
+"""
+Limitadores de tasa adaptativos y reintentos para las llamadas a Gemini y Vertex AI Search.
+
+Hay un token bucket por API (``gemini``, ``vertex``) y, opcionalmente, uno por
+modelo (``gemini:gemini-2.5-pro``); cada llamada consume de ambos. Con
+``RATE_LIMIT_SHARED`` el estado de los buckets vive en SQLite
+(``rate_limits.db`` junto a la base de datos de agentes) y lo comparten todos
+los procesos: varios ``chat`` o workers de ``batch`` respetan juntos la cuota.
+
+La tasa se ajusta con AIMD: un 429 la reduce a la mitad (una vez por ventana,
+aunque fallen varias llamadas a la vez) y bloquea el bucket hasta
+el ``retry-after`` que indique el servidor; cada éxito la recupera poco a poco
+hasta el límite configurado. ``call_with_retries`` reintenta los 429 y errores
+transitorios con backoff exponencial con jitter, y anota en el span la espera
+en cola (``rate_limit_wait_ms``) y los reintentos.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from src.config import settings
+from src.storage.connection import get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# AIMD: factor de reducción ante un 429, recuperación por éxito y tasa mínima (fracciones del límite)
+DECREASE_FACTOR = 0.5
+INCREASE_FRACTION = 0.05
+MIN_RATE_FRACTION = 0.05
+# Tras un recorte no se vuelve a recortar durante este tiempo (o el retry-after, si es mayor):
+# los 429 de peticiones que ya estaban en vuelo no aportan información nueva
+DECREASE_WINDOW_SECONDS = 1.0
+
+THROTTLED_STATUS = 429
+TRANSIENT_STATUS = {500, 502, 503, 504}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    rate REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0,
+    decreased_at REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+_schema_ready = set()
+
+_RETRY_DELAY = re.compile(r"retry[_ ]?delay\W+(?:seconds\W+)?(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+@dataclass
+class BucketState:
+    """Estado de un bucket: tokens disponibles, tasa actual (por segundo) y bloqueo por 429."""
+    tokens: float
+    rate: float
+    updated_at: float
+    blocked_until: float = 0.0
+    decreased_at: float = 0.0
+
+
+class TokenBucket:
+    """
+    Token bucket adaptativo y thread-safe del proceso.
+
+    ``rate_per_minute`` es el máximo sostenido (0 = sin límite: sólo se
+    respetan los bloqueos tras un 429) y ``burst`` la ráfaga permitida.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None, name: str = ""):
+        self.name = name
+        self.max_rate = max(0.0, rate_per_minute) / 60
+        self.capacity = float(burst if burst is not None else max(1, int(rate_per_minute // 6)))
+        self._lock = threading.Lock()
+        self._state = self._initial_state(time.time())
+
+    def _initial_state(self, now: float) -> BucketState:
+        return BucketState(tokens=self.capacity, rate=self.max_rate, updated_at=now)
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[BucketState]:
+        with self._lock:
+            yield self._state
+
+    def _read_state(self) -> BucketState:
+        return self._state
+
+    def _capacity(self, state: BucketState) -> float:
+        if not self.max_rate:
+            return self.capacity
+        return max(1.0, self.capacity * state.rate / self.max_rate)
+
+    def _refill(self, state: BucketState, now: float) -> None:
+        # updated_at puede estar en el futuro (bloqueo): no hay tokens nuevos hasta entonces
+        if now > state.updated_at:
+            state.tokens = min(self._capacity(state), state.tokens + (now - state.updated_at) * state.rate)
+            state.updated_at = now
+
+    def reserve(self) -> float:
+        """Reserva un token y devuelve cuántos segundos hay que esperar para usarlo."""
+        now = time.time()
+        if not self.max_rate:
+            # Sin límite configurado no hay tokens que reservar: sólo el bloqueo tras un 429
+            return max(0.0, self._read_state().blocked_until - now)
+        with self._locked_state() as state:
+            self._refill(state, now)
+            state.tokens -= 1
+            wait = max(0.0, state.updated_at - now) + max(0.0, -state.tokens) / state.rate
+            return max(wait, state.blocked_until - now)
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        """Registra un 429: reduce la tasa y bloquea el bucket ``retry_after`` segundos."""
+        now = time.time()
+        with self._locked_state() as state:
+            if self.max_rate:
+                self._refill(state, now)
+            window = max(DECREASE_WINDOW_SECONDS, retry_after or 0.0)
+            if self.max_rate and now - state.decreased_at >= window:
+                state.rate = max(self.max_rate * MIN_RATE_FRACTION, state.rate * DECREASE_FACTOR)
+                state.tokens = min(state.tokens, 0.0)
+                state.decreased_at = now
+                logger.warning(f"Rate limited on {self.name}: rate lowered to {state.rate * 60:.1f}/min")
+            if retry_after:
+                state.blocked_until = max(state.blocked_until, now + retry_after)
+                state.updated_at = max(state.updated_at, state.blocked_until)
+
+    def succeeded(self) -> None:
+        """Registra un éxito: recupera la tasa gradualmente hasta el máximo configurado."""
+        if not self.max_rate or self._read_state().rate >= self.max_rate:
+            return
+        with self._locked_state() as state:
+            state.rate = min(self.max_rate, state.rate + self.max_rate * INCREASE_FRACTION)
+
+    def acquire(self) -> float:
+        """Bloquea hasta disponer de un token; devuelve el tiempo esperado."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """Versión asíncrona de ``acquire``."""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+def default_rate_limit_path() -> str:
+    """Base de datos de los buckets compartidos: junto a la base de datos de agentes."""
+    if settings.rate_limit_db_file_path:
+        return settings.rate_limit_db_file_path
+    return os.path.join(os.path.dirname(settings.db_file_path) or ".", "rate_limits.db")
+
+
+class SharedTokenBucket(TokenBucket):
+    """``TokenBucket`` cuyo estado vive en SQLite y comparten todos los procesos."""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None, name: str = "",
+                 path: Optional[str] = None):
+        self.path = path or default_rate_limit_path()
+        super().__init__(rate_per_minute, burst, name)
+
+    def _connection(self):
+        conn = get_connection(self.path)
+        if self.path not in _schema_ready:
+            conn.executescript(_SCHEMA)
+            _schema_ready.add(self.path)
+        return conn
+
+    def _load(self, conn, now: float) -> BucketState:
+        row = conn.execute(
+            "SELECT tokens, rate, updated_at, blocked_until, decreased_at FROM rate_limit_buckets WHERE name = ?",
+            (self.name,),
+        ).fetchone()
+        if row is None:
+            return self._initial_state(now)
+        state = BucketState(*row)
+        # Otro proceso puede tener un límite distinto (o ninguno: rate 0): se aplica el de este
+        if self.max_rate:
+            rate = state.rate if state.rate > 0 else self.max_rate
+            state.rate = min(max(rate, self.max_rate * MIN_RATE_FRACTION), self.max_rate)
+        return state
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[BucketState]:
+        conn = self._connection()
+        with transaction(conn):
+            state = self._load(conn, time.time())
+            yield state
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets "
+                "(name, tokens, rate, updated_at, blocked_until, decreased_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.name, state.tokens, state.rate, state.updated_at, state.blocked_until, state.decreased_at),
+            )
+
+    def _read_state(self) -> BucketState:
+        return self._load(self._connection(), time.time())
+
+
+_limiters: Dict[str, Optional[TokenBucket]] = {}
+_limiters_lock = threading.Lock()
+
+
+def _configured_rate(key: str) -> float:
+    api, _, model = key.partition(":")
+    if model:
+        return settings.model_requests_per_minute.get(model, 0)
+    return getattr(settings, f"{api}_requests_per_minute", 0) or 0
+
+
+def get_limiter(key: str) -> TokenBucket:
+    """Bucket del proceso para ``gemini``, ``vertex`` o ``gemini:<modelo>``."""
+    with _limiters_lock:
+        if key not in _limiters:
+            rate = _configured_rate(key)
+            # Sin límite configurado no se comparte estado: evita un BEGIN IMMEDIATE por llamada
+            bucket_class = SharedTokenBucket if settings.rate_limit_shared and rate else TokenBucket
+            _limiters[key] = bucket_class(rate, name=key)
+        return _limiters[key]
+
+
+def _limiters_for(api: str, model: Optional[str]) -> List[TokenBucket]:
+    keys = [api] if model is None else [api, f"{api}:{model}"]
+    return [get_limiter(key) for key in keys]
+
+
+def acquire(api: str, model: Optional[str] = None) -> float:
+    """Espera (si hace falta) a tener cuota para una llamada a ``api`` (y ``model``)."""
+    return sum(limiter.acquire() for limiter in _limiters_for(api, model))
+
+
+async def acquire_async(api: str, model: Optional[str] = None) -> float:
+    waited = 0.0
+    for limiter in _limiters_for(api, model):
+        waited += await limiter.acquire_async()
+    return waited
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """Código HTTP de un error de Gemini (agno o google-genai) o de google-api-core."""
+    while error is not None:
+        code = getattr(error, "code", None)
+        if isinstance(code, int):
+            return code
+        if error.__cause__ is None:
+            # agno sin error de la API debajo: status_code sólo es fiable si no envuelve otra excepción
+            status_code = getattr(error, "status_code", None)
+            return status_code if isinstance(status_code, int) else None
+        error = error.__cause__
+    return None
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Espera indicada por el servidor (cabecera Retry-After o RetryInfo), si la hay."""
+    while error is not None:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if headers is not None and headers.get("retry-after"):
+            try:
+                return float(headers.get("retry-after"))
+            except ValueError:
+                pass
+        for detail in getattr(error, "details", None) or []:
+            delay = getattr(detail, "retry_delay", None)
+            if delay is not None:
+                return delay.seconds + delay.nanos / 1e9
+        match = _RETRY_DELAY.search(str(error))
+        if match:
+            return float(match.group(1))
+        error = error.__cause__
+    return None
+
+
+def _backoff(attempt: int) -> float:
+    """Backoff exponencial con jitter completo."""
+    return random.uniform(0, min(settings.rate_limit_max_backoff_seconds,
+                                 settings.rate_limit_backoff_seconds * 2 ** attempt))
+
+
+def _retry_delay(error: Exception, attempt: int, limiters: List[TokenBucket],
+                 max_retries: Optional[int] = None) -> Optional[float]:
+    """Segundos hasta reintentar, o None si el error no es reintentable o no quedan intentos."""
+    status = error_status(error)
+    if max_retries is None:
+        max_retries = settings.rate_limit_max_retries
+    if attempt >= max_retries or (
+        status != THROTTLED_STATUS and status not in TRANSIENT_STATUS
+    ):
+        return None
+    if status == THROTTLED_STATUS:
+        retry_after = retry_after_seconds(error)
+        for limiter in limiters:
+            limiter.throttled(retry_after)
+    return _backoff(attempt)
+
+
+def _record(span, waited: float, attempt: int) -> None:
+    if span is None:
+        return
+    if waited:
+        span.attributes["rate_limit_wait_ms"] = round(
+            span.attributes.get("rate_limit_wait_ms", 0) + waited * 1000, 2
+        )
+    if attempt:
+        span.attributes["rate_limit_retries"] = attempt
+
+
+def call_with_retries(api: str, call: Callable[[], Any], model: Optional[str] = None, span=None,
+                      max_retries: Optional[int] = None) -> Any:
+    """
+    ``call()`` con cuota de ``api``/``model``, reintentando 429 y errores transitorios.
+
+    La espera en cola y en backoff se acumula en ``span`` (por defecto el span activo).
+    ``max_retries`` sustituye a ``settings.rate_limit_max_retries`` (0 = fallar rápido).
+    """
+    if span is None:
+        from src.core.telemetry import current_span
+
+        span = current_span()
+    limiters = _limiters_for(api, model)
+    attempt = 0
+    while True:
+        _record(span, sum(limiter.acquire() for limiter in limiters), attempt)
+        try:
+            result = call()
+        except Exception as e:
+            delay = _retry_delay(e, attempt, limiters, max_retries)
+            if delay is None:
+                raise
+            attempt += 1
+            logger.info(f"Retrying {model or api} in {delay:.1f}s (attempt {attempt}): {e}")
+            time.sleep(delay)
+            _record(span, delay, attempt)
+            continue
+        for limiter in limiters:
+            limiter.succeeded()
+        return result
+
+
+async def acall_with_retries(api: str, call: Callable[[], Awaitable[Any]], model: Optional[str] = None,
+                             span=None) -> Any:
+    """Versión asíncrona de ``call_with_retries`` (``call`` devuelve una corrutina nueva en cada intento)."""
+    if span is None:
+        from src.core.telemetry import current_span
+
+        span = current_span()
+    limiters = _limiters_for(api, model)
+    attempt = 0
+    while True:
+        waited = 0.0
+        for limiter in limiters:
+            waited += await limiter.acquire_async()
+        _record(span, waited, attempt)
+        try:
+            result = await call()
+        except Exception as e:
+            delay = _retry_delay(e, attempt, limiters)
+            if delay is None:
+                raise
+            attempt += 1
+            logger.info(f"Retrying {model or api} in {delay:.1f}s (attempt {attempt}): {e}")
+            await asyncio.sleep(delay)
+            _record(span, delay, attempt)
+            continue
+        for limiter in limiters:
+            limiter.succeeded()
+        return result
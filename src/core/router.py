@@ -0,0 +1,175 @@
+"""
+Pre-enrutado de consultas a un único agente.
+
+Muchas consultas sólo necesitan un miembro ("escribe un job de PySpark para X"
+→ Code Standards Agent). Antes de ``team.run`` se clasifica la consulta con
+reglas de palabras clave (sin coste) y, en modo ``flash``, con Gemini Flash
+cuando las reglas no son concluyentes. Si la confianza supera
+``settings.router_confidence_threshold`` la consulta va directa al agente; si
+no, se usa la coordinación completa del orquestador. Cada decisión se registra
+en la tabla ``routing_decisions`` para poder ajustar el umbral.
+"""
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from src.config import settings
+from src.storage.connection import get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+ROUTER_OFF = "off"
+ROUTER_KEYWORDS = "keywords"
+ROUTER_FLASH = "flash"
+
+TEAM_ROUTE = "team"
+
+# Patrones por miembro: cada coincidencia suma confianza (hacen falta dos para enrutar directo)
+KEYWORD_RULES: Dict[str, List[str]] = {
+    "Code Standards Agent": [
+        r"\b(escribe|escr[ií]beme|genera|gen[eé]rame|crea|cr[eé]ame|implementa|refactoriza|write|generate|implement|refactor)\b"
+        r".*\b(c[oó]digo|code|script|job|funci[oó]n|function|clase|class|dag|pipeline|query|consulta|test)s?\b",
+        r"\b(pyspark|spark|sql|python|dbt|airflow|scala|pandas|polars)\b.*\b(job|script|dag|udf|snippet|modelo|model)s?\b"
+        r"|\b(job|script|dag|udf|snippet|modelo|model)s?\b.*\b(pyspark|spark|sql|python|dbt|airflow|scala|pandas|polars)\b",
+        r"\b(revisa|review|corrige|fix|optimiza|optimize)\b.*\b(c[oó]digo|code|script|query|consulta)\b",
+        r"```",
+    ],
+    "Web Agent": [
+        r"\b([uú]ltima|[uú]ltimas|latest|nueva versi[oó]n|new version|release|changelog|novedades|roadmap)\b",
+        r"\b(busca en (la )?web|search the web|documentaci[oó]n oficial|official docs?)\b",
+        r"\b(versi[oó]n|version|release|lanzamiento)\b.*\b20[2-9]\d\b|\b20[2-9]\d\b.*\b(versi[oó]n|version|release|lanzamiento)\b",
+    ],
+    "RAG Agent": [
+        r"\b(seg[uú]n (el|los) libros?|en (el|los) libros?|knowledge base|base de conocimiento|documentaci[oó]n interna)\b",
+        r"\b(qu[eé] dice|resume|summari[sz]e)\b.*\b(libro|book|cap[ií]tulo|chapter)\b",
+    ],
+}
+
+# Señales de consultas compuestas que deben pasar por el orquestador
+MULTI_INTENT_PATTERN = r"\b(compara|comparar|compare|y adem[aá]s|and also|arquitectura|architecture|estrategia|strategy)\b"
+
+FLASH_ROUTER_INSTRUCTIONS = """
+Eres un clasificador de consultas para un equipo multi-agente de Ingeniería de Datos.
+Decide si la consulta la puede resolver UN solo agente o necesita al equipo completo.
+Responde SOLO con JSON: {"agent": "<nombre exacto del agente o team>", "confidence": <0.0-1.0>}
+Usa "team" si la consulta combina varias necesidades (p.ej. investigar y luego generar código).
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS routing_decisions (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT,
+    session_id TEXT,
+    query TEXT NOT NULL,
+    route TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    method TEXT NOT NULL,
+    routed INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# Una coincidencia queda por debajo del umbral por defecto (0.8); dos o más lo alcanzan
+KEYWORD_BASE_CONFIDENCE = 0.2
+KEYWORD_HIT_CONFIDENCE = 0.3
+
+_schema_ready = set()
+
+
+@dataclass
+class RouteDecision:
+    """Resultado del clasificador: miembro elegido (o ``team``) y confianza."""
+    route: str
+    confidence: float
+    method: str
+
+    @property
+    def member(self) -> Optional[str]:
+        """Miembro al que enviar la consulta si supera el umbral, o None para coordinar."""
+        if self.route == TEAM_ROUTE or self.confidence < settings.router_confidence_threshold:
+            return None
+        return self.route
+
+
+def classify_keywords(query: str) -> RouteDecision:
+    """Clasificación por reglas; confianza baja si hay varias intenciones."""
+    text = query.lower()
+    scores = {
+        member: sum(1 for pattern in patterns if re.search(pattern, text, re.DOTALL))
+        for member, patterns in KEYWORD_RULES.items()
+    }
+    matched = {member: score for member, score in scores.items() if score}
+
+    if len(matched) != 1 or re.search(MULTI_INTENT_PATTERN, text):
+        return RouteDecision(route=TEAM_ROUTE, confidence=0.0, method=ROUTER_KEYWORDS)
+
+    member, score = next(iter(matched.items()))
+    return RouteDecision(route=member, confidence=min(0.95, KEYWORD_BASE_CONFIDENCE + KEYWORD_HIT_CONFIDENCE * score), method=ROUTER_KEYWORDS)
+
+
+def classify_flash(query: str, members) -> RouteDecision:
+    """Clasificación con Gemini Flash a partir del nombre y rol de cada miembro."""
+    from agno.agent import Agent
+    from src.agents.models import build_model
+    from src.core.telemetry import span
+
+    catalog = "\n".join(f"- {member.name}: {member.role}" for member in members)
+    classifier = Agent(
+        name="Query Router",
+        model=build_model(settings.default_llm_flash),
+        instructions=FLASH_ROUTER_INSTRUCTIONS + f"\nAGENTES DISPONIBLES:\n{catalog}",
+        markdown=False,
+    )
+    with span(f"agent:{classifier.name}", "agent", owner=classifier.name):
+        content = getattr(classifier.run(query), "content", None) or ""
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    if match is None:
+        raise ValueError(f"Router returned no JSON: {content[:200]}")
+
+    data = json.loads(match.group(0))
+    names = {member.name for member in members}
+    route = data.get("agent") if data.get("agent") in names else TEAM_ROUTE
+    return RouteDecision(route=route, confidence=float(data.get("confidence", 0.0)), method=ROUTER_FLASH)
+
+
+def route_query(query: str, members, user: Optional[str] = None, session_id: Optional[str] = None) -> RouteDecision:
+    """Decide si la consulta va directa a un miembro y registra la decisión."""
+    decision = classify_keywords(query)
+    if settings.router_mode == ROUTER_FLASH and decision.member is None:
+        try:
+            decision = classify_flash(query, members)
+        except Exception as e:
+            logger.warning(f"Flash router failed, falling back to coordination: {e}")
+
+    if decision.member is not None and decision.member not in {member.name for member in members}:
+        decision = RouteDecision(route=TEAM_ROUTE, confidence=decision.confidence, method=decision.method)
+
+    log_decision(decision, query, user, session_id)
+    return decision
+
+
+def log_decision(decision: RouteDecision, query: str, user: Optional[str], session_id: Optional[str]) -> None:
+    logger.info(
+        f"Routing decision: route={decision.route} confidence={decision.confidence:.2f} "
+        f"method={decision.method} routed={decision.member is not None}"
+    )
+    try:
+        conn = get_connection()
+        path = os.path.abspath(settings.db_file_path)
+        if path not in _schema_ready:
+            conn.executescript(_SCHEMA)
+            _schema_ready.add(path)
+        with transaction(conn):
+            conn.execute(
+                "INSERT INTO routing_decisions "
+                "(user_id, session_id, query, route, confidence, method, routed, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user, session_id, query, decision.route, decision.confidence, decision.method,
+                 int(decision.member is not None), time.time()),
+            )
+    except Exception as e:
+        logger.warning(f"Could not record routing decision: {e}")
@@ -0,0 +1,128 @@
+"""
+Ejecución de un turno de conversación.
+
+Punto común para el chat, el comando ``batch`` y el servidor: antes de cada
+``team.run`` se inyecta el historial acotado de la sesión en el contexto del
+orquestador, y al terminar se registra el turno (lo que puede plegar los
+turnos antiguos en el resumen acumulado). Con el pre-router activo, las
+consultas que sólo necesitan un miembro se envían directamente a ese agente.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from src.config import settings
+from src.core.history import HistoryManager
+from src.core.router import ROUTER_OFF, route_query
+from src.core.streaming import StreamUpdate, iter_stream_updates
+from src.core.telemetry import current_trace, span, trace_stream, trace_turn
+from src.core.team_builder import unwrap_team
+from src.tools.prompts import session_context
+
+logger = logging.getLogger(__name__)
+
+# ``agent`` de los turnos respondidos por el equipo coordinado
+TEAM_AGENT = "team"
+
+
+def prepare_turn(team, user: str, session_id: str) -> HistoryManager:
+    """
+    Carga sesión, fecha e historial en ``additional_context`` del orquestador.
+
+    Los miembros reciben sólo el contexto de sesión (con la fecha del turno);
+    sus instrucciones son estáticas para que el prefijo del prompt sea cacheable.
+    """
+    history = HistoryManager(user, session_id)
+    inner = unwrap_team(team)
+    inner.additional_context = session_context(user, session_id, history.build_context())
+    for member in inner.members:
+        member.additional_context = session_context(user, session_id)
+    return history
+
+
+def select_member(team, query: str, user: str, session_id: str):
+    """Agente al que enviar la consulta directamente, o None para coordinar con el equipo."""
+    if settings.router_mode == ROUTER_OFF:
+        return None
+    members = unwrap_team(team).members
+    decision = route_query(query, members, user, session_id)
+    return next((member for member in members if member.name == decision.member), None)
+
+
+@contextmanager
+def _member_context(member, context: Optional[str]):
+    """Da al agente el contexto con historial de la sesión sólo durante la llamada directa."""
+    previous = member.additional_context
+    member.additional_context = context
+    try:
+        yield member
+    finally:
+        member.additional_context = previous
+
+
+def finish_turn(history: HistoryManager, query: str, answer: str,
+                agent: Optional[str] = None, started: Optional[float] = None) -> None:
+    """
+    Registra el turno; un fallo aquí no debe perder la respuesta ya generada.
+
+    El nivel de modelo del turno se toma de los spans de la traza activa.
+    """
+    if not answer:
+        return
+    duration_ms = round((time.perf_counter() - started) * 1000, 1) if started is not None else None
+    trace = current_trace()
+    tier = trace.model_tier() if trace is not None else None
+    try:
+        with span("storage:turns", "storage"):
+            history.record(query, answer, agent, duration_ms, tier)
+    except Exception as e:
+        logger.error(f"Error recording turn for session {history.session_id}: {e}", exc_info=True)
+
+
+def record_turn(user: str, session_id: str, query: str, answer: str, agent: Optional[str] = None) -> None:
+    """Registra un turno respondido sin pasar por el equipo (p.ej. caché semántica)."""
+    finish_turn(HistoryManager(user, session_id), query, answer, agent)
+
+
+def run_turn(team, query: str, user: str, session_id: str, **run_kwargs):
+    """``team.run`` con historial acotado; devuelve la respuesta de agno."""
+    with trace_turn(user, session_id) as trace:
+        started = time.perf_counter()
+        history = prepare_turn(team, user, session_id)
+        member = select_member(team, query, user, session_id)
+        agent = member.name if member else TEAM_AGENT
+        if trace is not None:
+            trace.root.attributes["routed_to"] = agent
+        if member is None:
+            response = team.run(query, **run_kwargs)
+        else:
+            with _member_context(member, unwrap_team(team).additional_context):
+                response = member.run(query, **run_kwargs)
+        finish_turn(history, query, getattr(response, "content", None) or "", agent, started)
+    return response
+
+
+def stream_turn(team, query: str, user: str, session_id: str, **run_kwargs) -> Iterator[StreamUpdate]:
+    """Versión streaming de ``run_turn`` (eventos de ``iter_stream_updates``)."""
+    return trace_stream(_stream_turn(team, query, user, session_id, **run_kwargs), user, session_id)
+
+
+def _stream_turn(team, query: str, user: str, session_id: str, **run_kwargs) -> Iterator[StreamUpdate]:
+    started = time.perf_counter()
+    history = prepare_turn(team, user, session_id)
+    member = select_member(team, query, user, session_id)
+    parts = []
+    if member is None:
+        for update in iter_stream_updates(team, query, **run_kwargs):
+            if update.content:
+                parts.append(update.content)
+            yield update
+    else:
+        yield StreamUpdate(active_member=member.name)
+        with _member_context(member, unwrap_team(team).additional_context):
+            for update in iter_stream_updates(member, query, agent_content=True, **run_kwargs):
+                if update.content:
+                    parts.append(update.content)
+                yield update
+    finish_turn(history, query, "".join(parts), member.name if member else TEAM_AGENT, started)
@@ -0,0 +1,78 @@
+"""
+Adaptador de los eventos de streaming de agno a actualizaciones para la UI.
+
+El CLI sólo necesita dos cosas de cada evento: el fragmento de texto que
+emite el orquestador y qué agente miembro está trabajando en ese momento.
+"""
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+# Herramientas con las que el Team delega en sus miembros (coordinate/route/collaborate)
+MEMBER_DELEGATION_TOOLS = {"transfer_task_to_member", "forward_task_to_member", "run_member_agents"}
+
+# Eventos cuyo contenido es texto del orquestador (agno >= 1.5 y formato anterior)
+CONTENT_EVENTS = {"TeamRunResponseContent", "RunResponse"}
+# Texto de un agente: sólo es respuesta cuando se ejecuta el agente directamente; dentro de
+# un Team son eventos de los miembros que agno reenvía (stream_member_events)
+AGENT_CONTENT_EVENTS = {"RunResponseContent"}
+TOOL_STARTED_EVENTS = {"TeamToolCallStarted", "ToolCallStarted"}
+TOOL_COMPLETED_EVENTS = {"TeamToolCallCompleted", "ToolCallCompleted"}
+
+
+@dataclass
+class StreamUpdate:
+    """Actualización incremental de una respuesta en streaming."""
+    content: str = ""
+    active_member: Optional[str] = None
+    member_finished: bool = False
+
+
+@dataclass
+class MemberStatus:
+    """Evento propio para anunciar miembros que se ejecutan fuera del Team."""
+    member: Optional[str]
+    finished: bool = False
+
+
+def _member_names(team) -> dict:
+    """Mapea el member_id que usa agno (nombre url-safe) al nombre legible."""
+    names = {}
+    for member in getattr(team, "members", None) or []:
+        name = getattr(member, "name", None)
+        if name:
+            names[name.lower().replace(" ", "-")] = name
+            names[name] = name
+    return names
+
+
+def iter_stream_updates(team, query: str, agent_content: bool = False, **run_kwargs) -> Iterator[StreamUpdate]:
+    """
+    Ejecuta ``team.run`` en modo streaming y traduce sus eventos.
+
+    Con ``agent_content`` (``team`` es un agente miembro ejecutado directamente)
+    también se emite el texto de ``AGENT_CONTENT_EVENTS``.
+    """
+    member_names = _member_names(team)
+    content_events = CONTENT_EVENTS | AGENT_CONTENT_EVENTS if agent_content else CONTENT_EVENTS
+    stream = team.run(query, stream=True, stream_intermediate_steps=True, **run_kwargs)
+
+    for event in stream:
+        if isinstance(event, MemberStatus):
+            yield StreamUpdate(active_member=event.member, member_finished=event.finished)
+            continue
+
+        event_name = str(getattr(event, "event", "") or "")
+        tool = getattr(event, "tool", None)
+
+        if event_name in TOOL_STARTED_EVENTS and tool is not None:
+            if getattr(tool, "tool_name", None) in MEMBER_DELEGATION_TOOLS:
+                args = getattr(tool, "tool_args", None) or {}
+                member_id = args.get("member_id") or args.get("agent_name") or "miembros del equipo"
+                yield StreamUpdate(active_member=member_names.get(member_id, member_id))
+        elif event_name in TOOL_COMPLETED_EVENTS and tool is not None:
+            if getattr(tool, "tool_name", None) in MEMBER_DELEGATION_TOOLS:
+                yield StreamUpdate(member_finished=True)
+        elif event_name in content_events or not event_name:
+            content = getattr(event, "content", None)
+            if isinstance(content, str) and content:
+                yield StreamUpdate(content=content)
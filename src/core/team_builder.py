@@ -1,9 +1,13 @@
 from agno.team.team import Team
-from agno.storage.sqlite import SqliteStorage
 from agno.agent import Agent
-from agno.models.google import Gemini
 from src.agents.definitions import get_all_agents
+from src.agents.models import build_model
+from src.core.parallel import ParallelTeam
+from src.core.telemetry import instrument_team
 from src.config import settings
+from src.storage.sessions import build_session_storage, is_shared_mode
+from src.storage.tool_memo import install_tool_memo
+from src.tools.prompts import ORCHESTRATOR_PROMPT, ORCHESTRATOR_SUCCESS_CRITERIA, session_context
 from datetime import datetime
 import uuid
 
@@ -16,12 +20,14 @@ def generate_session_id(user: str) -> str:
 def build_team(user: str, session_id: str) -> Team:
     """
     Crea un equipo coordinado de agentes con memoria contextual compartida.
+    
+    Con ``settings.team_execution_mode == "parallel"`` devuelve un ``ParallelTeam``
+    (misma interfaz ``run``) que consulta RAG y Web en paralelo antes de sintetizar.
     """
+    settings.require_gcp()
+    
     # Storage compartido para TODO el equipo (contexto unificado)
-    team_storage = SqliteStorage(
-        table_name=f"{settings.db_table_prefix}_{user}_{session_id}",
-        db_file=settings.db_file_path
-    )
+    team_storage = build_session_storage(user, session_id)
     
     # ✅ CORRECCIÓN: Pasar los parámetros requeridos
     web_agent, rag_agent, code_agent = get_all_agents(user, session_id, team_storage)
@@ -31,57 +37,59 @@ def build_team(user: str, session_id: str) -> Team:
     for agent in [web_agent, rag_agent, code_agent]:
         agent.storage = None  # Los agentes usarán el storage del team
     
-    return Team(
+    team = Team(
         members=[web_agent, rag_agent, code_agent],
-        model=Gemini(
-            id=settings.default_llm_pro,
-            api_key=settings.google_api_key,
-        ),
+        model=build_model(settings.default_llm_pro),
         storage=team_storage,  # Memoria compartida para TODO el equipo
         user_id=user,
         session_id=session_id,
         mode="coordinate",
-        success_criteria="""
-        Proveer una respuesta técnica clara, estructurada y accionable para ingenieros de datos senior.
-        Si se requiere código, DEBE cumplir estándares enterprise de nivel senior.
-        Mantener el contexto de la conversación a lo largo de múltiples interacciones.
-        SIEMPRE revisar el historial completo antes de responder.
-        """,
-        instructions=f"""
-        Eres el Orquestador de un equipo multi-agente de Ingeniería de Datos.
-        
-        CONTEXTO ACTUAL: Sesión {session_id} - Usuario: {user}
-        FECHA: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-        HISTORIAL DISPONIBLE: Tienes acceso al historial completo de esta conversación.
-        
-        REGLAS ESTRICTAS DE CONTEXTO:
-        1. ✅ SIEMPRE revisa el historial completo de la conversación antes de responder
-        2. ✅ Si el usuario hace referencia a algo anterior, busca en el contexto específico
-        3. ✅ Mantén continuidad en referencias a trabajos previos
-        4. ✅ No repitas información ya proporcionada
-        5. ✅ Responde en el contexto de la conversación en curso
-        
-        REGLA PARA CÓDIGO:
-        Si la consulta requiere generación de código, SIEMPRE involucra al Code Standards Agent.
-        El código resultante debe ser production-ready y seguir estándares senior.
-        
-        FORMATO DE RESPUESTA:
-        ## 📌 Resumen Ejecutivo Contextual
-        - Puntos clave considerando el contexto histórico
-        
-        ## 📚 Conocimiento Interno (RAG)
-        - Información del knowledge base (si aplica)
-        
-        ## 🌐 Documentación Externa (Web)  
-        - Información de búsqueda web (si aplica)
-        
-        ## 💡 Recomendaciones Contextualizadas
-        - Acciones considerando el historial completo
-        - Referencias a conversaciones anteriores si son relevantes
-        """,
-        add_datetime_to_instructions=True,
+        success_criteria=ORCHESTRATOR_SUCCESS_CRITERIA,
+        # Instrucciones estáticas (prefijo cacheable); sesión, fecha e historial van en additional_context
+        instructions=ORCHESTRATOR_PROMPT,
+        additional_context=session_context(user, session_id),
         show_tool_calls=True,
         markdown=True,
         enable_agentic_context=True,  # ¡CRÍTICO: Habilita contexto agéntico!
         show_members_responses=False,
-    )
\ No newline at end of file
+    )
+    
+    if settings.telemetry_enabled:
+        instrument_team(team)
+    if settings.tool_memo_enabled:
+        # Después de la telemetría: el span de la herramienta registra si hubo memo_hit
+        for member in team.members:
+            install_tool_memo(member)
+    
+    if settings.team_execution_mode == "parallel":
+        return ParallelTeam(
+            team,
+            fan_out_members=[rag_agent, web_agent],
+            default_timeout=settings.member_timeout_seconds,
+            member_timeouts=settings.member_timeouts,
+        )
+    return team
+
+def unwrap_team(team) -> Team:
+    """Devuelve el ``Team`` de agno (también cuando está envuelto en ``ParallelTeam``)."""
+    return team.team if isinstance(team, ParallelTeam) else team
+
+def attach_session(team, user: str, session_id: str) -> None:
+    """
+    Prepara un equipo ya construido para atender otro usuario/sesión.
+    
+    Permite reutilizar equipos (y sus clientes Gemini) entre peticiones: en modo
+    ``shared`` el storage es el mismo y basta con llamar a
+    ``team.run(..., user_id=user, session_id=session_id)``, que hace que agno
+    reinicie el estado y cargue esa sesión; en modo ``per_session`` además se
+    adjunta el storage de la tabla de la sesión. Los miembros reciben también
+    el usuario/sesión (agno sólo les propaga ``team_session_id``) y se
+    actualiza el contexto de sesión (``additional_context``) de todos.
+    """
+    inner = unwrap_team(team)
+    if not is_shared_mode():
+        inner.storage = build_session_storage(user, session_id)
+    for agent in [inner, *inner.members]:
+        agent.user_id = user
+        agent.session_id = session_id
+        agent.additional_context = session_context(user, session_id)
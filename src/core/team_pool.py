@@ -0,0 +1,68 @@
+"""
+Pool de equipos precalentados para el modo servidor.
+
+Construir un equipo (modelos Gemini, clientes de búsqueda, storage) cuesta
+más que muchas consultas cortas, así que el servidor crea ``size`` equipos al
+arrancar y los presta a cada petición. Un equipo sólo atiende una petición a
+la vez; antes de prestarlo se adjunta al usuario/sesión de la petición con
+``attach_session``.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
+from starlette.concurrency import run_in_threadpool
+
+from src.core.team_builder import attach_session, build_team, generate_session_id
+
+logger = logging.getLogger(__name__)
+
+POOL_USER = "pool"
+
+
+class TeamPool:
+    """Cola asíncrona de equipos listos para usar."""
+
+    def __init__(self, size: int = 4):
+        self.size = max(1, size)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._teams: List[object] = []
+
+    async def start(self) -> None:
+        """Construye los equipos del pool (en hilos, sin bloquear el event loop)."""
+        teams = await asyncio.gather(*[
+            run_in_threadpool(build_team, POOL_USER, generate_session_id(POOL_USER))
+            for _ in range(self.size)
+        ])
+        for team in teams:
+            self._teams.append(team)
+            self._queue.put_nowait(team)
+        logger.info(f"Team pool ready with {self.size} teams")
+
+    @property
+    def available(self) -> int:
+        return self._queue.qsize()
+
+    async def acquire(self, user: str, session_id: str):
+        """Toma un equipo libre (espera si todos están ocupados) y lo adjunta a la sesión."""
+        team = await self._queue.get()
+        try:
+            await run_in_threadpool(attach_session, team, user, session_id)
+        except BaseException:
+            self._queue.put_nowait(team)
+            raise
+        return team
+
+    def release(self, team) -> None:
+        """Devuelve un equipo al pool."""
+        self._queue.put_nowait(team)
+
+    @asynccontextmanager
+    async def lease(self, user: str, session_id: str) -> AsyncIterator[object]:
+        """``async with pool.lease(user, session_id) as team: ...``"""
+        team = await self.acquire(user, session_id)
+        try:
+            yield team
+        finally:
+            self.release(team)
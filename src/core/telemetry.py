@@ -0,0 +1,560 @@
+"""
+Trazas de latencia y tokens por turno.
+
+Cada turno genera una traza con spans anidados para el orquestador, los
+agentes miembros, sus herramientas, las llamadas a Gemini y los accesos a
+SQLite. Los spans se propagan con ``contextvars`` y se exportan al terminar el
+turno a una tabla SQLite (``telemetry_spans`` en ``telemetry.db``) y,
+opcionalmente, a un archivo JSON Lines en formato OTLP/JSON que puede leer un
+OpenTelemetry Collector. El comando ``stats`` calcula p50/p95 por componente.
+
+Convención de nombres de span: ``turn``, ``team:<nombre>``, ``agent:<nombre>``,
+``tool:<función>``, ``model:<agente>`` y ``storage:<operación>``.
+"""
+import contextvars
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from src.config import settings
+from src.core.tiering import TIER_ESCALATED, turn_tier
+from src.storage.connection import get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+ORCHESTRATOR = "Orquestador"
+SERVICE_NAME = "agno-data-engineering-team"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS telemetry_spans (
+    span_id TEXT PRIMARY KEY,
+    trace_id TEXT NOT NULL,
+    parent_id TEXT,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    user_id TEXT,
+    session_id TEXT,
+    start_time REAL NOT NULL,
+    duration_ms REAL NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attributes TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_telemetry_spans_start ON telemetry_spans(start_time);
+CREATE INDEX IF NOT EXISTS idx_telemetry_spans_trace ON telemetry_spans(trace_id);
+"""
+
+_schema_ready = set()
+
+
+@dataclass
+class Span:
+    """Intervalo medido dentro de una traza."""
+    name: str
+    kind: str
+    trace_id: str
+    parent_id: Optional[str]
+    owner: str
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    start_time: float = field(default_factory=time.time)
+    start_perf: float = field(default_factory=time.perf_counter)
+    duration_ms: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def end(self) -> None:
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self.start_perf) * 1000
+
+    def fail(self, error: BaseException) -> None:
+        self.status = "error"
+        self.attributes["error"] = f"{type(error).__name__}: {error}"
+
+
+class Trace:
+    """Spans de un turno; se exporta completa al terminar."""
+
+    def __init__(self, name: str, user: Optional[str], session_id: Optional[str], **attributes):
+        self.trace_id = uuid.uuid4().hex
+        self.user = user
+        self.session_id = session_id
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = self.start_span(name, "turn", parent=None, owner=ORCHESTRATOR, **attributes)
+
+    def start_span(self, name: str, kind: str, parent: Optional[Span], owner: str, **attributes) -> Span:
+        span = Span(
+            name=name,
+            kind=kind,
+            trace_id=self.trace_id,
+            parent_id=parent.span_id if parent else None,
+            owner=owner,
+            attributes=dict(attributes),
+        )
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def summarize(self) -> Dict[str, Any]:
+        """Totales del turno: tokens, llamadas a herramientas y tiempo en SQLite."""
+        return {
+            "input_tokens": sum(s.attributes.get("input_tokens", 0) for s in self.spans if s.kind == "model"),
+            "output_tokens": sum(s.attributes.get("output_tokens", 0) for s in self.spans if s.kind == "model"),
+            "tool_calls": sum(1 for s in self.spans if s.kind == "tool"),
+            "model_calls": sum(1 for s in self.spans if s.kind == "model"),
+            "storage_ms": round(sum(s.duration_ms or 0 for s in self.spans if s.kind == "storage"), 2),
+            "escalations": sum(1 for s in self.spans if s.attributes.get("tier") == TIER_ESCALATED),
+            "tier": self.model_tier() or "",
+        }
+
+    def model_tier(self) -> Optional[str]:
+        """Nivel de modelo más alto usado en el turno (flash, pro o escalated)."""
+        return turn_tier(s.attributes.get("tier") for s in self.spans if s.kind == "model")
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+
+@contextmanager
+def _activate(trace: Optional[Trace], span: Optional[Span]) -> Iterator[None]:
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(span)
+    try:
+        yield
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+def current_trace() -> Optional[Trace]:
+    """Traza activa en este contexto (None fuera de un turno o sin telemetría)."""
+    return _current_trace.get()
+
+
+def current_span() -> Optional[Span]:
+    """Span activo en este contexto (None fuera de una traza)."""
+    return _current_span.get()
+
+
+def _child(name: str, kind: str, owner: Optional[str] = None, **attributes) -> Optional[Span]:
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    return trace.start_span(name, kind, parent, owner or (parent.owner if parent else ORCHESTRATOR), **attributes)
+
+
+@contextmanager
+def span(name: str, kind: str, owner: Optional[str] = None, **attributes) -> Iterator[Optional[Span]]:
+    """Span hijo del actual (None fuera de una traza: la medición no cuesta nada)."""
+    child = _child(name, kind, owner, **attributes)
+    if child is None:
+        yield None
+        return
+    try:
+        with _activate(_current_trace.get(), child):
+            yield child
+    except Exception as e:
+        child.fail(e)
+        raise
+    finally:
+        child.end()
+
+
+def traced_iter(iterator: Iterator, child: Span, trace: Optional[Trace] = None) -> Iterator:
+    """
+    Itera activando el span sólo durante cada ``next()``.
+
+    Así los spans hijos creados al consumir un stream quedan bien anidados
+    aunque cada paso se ejecute en un hilo distinto (p.ej. el servidor SSE).
+    """
+    trace = trace or _current_trace.get()
+    try:
+        while True:
+            with _activate(trace, child):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    except Exception as e:
+        child.fail(e)
+        raise
+    finally:
+        child.end()
+
+
+def traced_call(name: str, kind: str, call: Callable[[], Any], owner: Optional[str] = None, **attributes):
+    """Ejecuta ``call()`` dentro de un span; si devuelve un generador, lo mide al consumirlo."""
+    child = _child(name, kind, owner, **attributes)
+    if child is None:
+        return call()
+    trace = _current_trace.get()
+    try:
+        with _activate(trace, child):
+            result = call()
+    except Exception as e:
+        child.fail(e)
+        child.end()
+        raise
+    if inspect.isgenerator(result):
+        return traced_iter(result, child, trace)
+    child.end()
+    return result
+
+
+def start_trace(name: str, user: Optional[str], session_id: Optional[str], **attributes) -> Optional[Trace]:
+    """Inicia la traza de un turno (None si la telemetría está desactivada)."""
+    if not settings.telemetry_enabled:
+        return None
+    return Trace(name, user, session_id, **attributes)
+
+
+def finish_trace(trace: Optional[Trace], error: Optional[BaseException] = None) -> None:
+    """Cierra el span raíz, añade los totales del turno y exporta."""
+    if trace is None:
+        return
+    if error is not None:
+        trace.root.fail(error)
+    trace.root.end()
+    trace.root.attributes.update(trace.summarize())
+    for pending in trace.spans:
+        pending.end()
+    try:
+        export_trace(trace)
+    except Exception as e:
+        logger.warning(f"Could not export trace {trace.trace_id}: {e}")
+
+
+@contextmanager
+def trace_turn(user: str, session_id: str, **attributes) -> Iterator[Optional[Trace]]:
+    """Traza de un turno no streaming."""
+    trace = start_trace("turn", user, session_id, **attributes)
+    if trace is None:
+        yield None
+        return
+    error = None
+    try:
+        with _activate(trace, trace.root):
+            yield trace
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        finish_trace(trace, error)
+
+
+def trace_stream(iterator: Iterator, user: str, session_id: str, **attributes) -> Iterator:
+    """Traza de un turno streaming (el turno termina al agotarse el stream)."""
+    trace = start_trace("turn", user, session_id, **attributes)
+    if trace is None:
+        yield from iterator
+        return
+    error = None
+    try:
+        yield from traced_iter(iterator, trace.root, trace)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        finish_trace(trace, error)
+
+
+# --- Instrumentación de agno -------------------------------------------------
+
+def tool_span_hook(function_name: str, function_call: Callable, arguments: Dict[str, Any]):
+    """``tool_hooks`` de agno: un span por llamada a herramienta."""
+    return traced_call(f"tool:{function_name}", "tool", lambda: function_call(**arguments))
+
+
+def instrument_agent(agent) -> None:
+    """Mide ``agent.run`` y las herramientas del agente."""
+    original_run = agent.run
+
+    def run(*args, **kwargs):
+        return traced_call(f"agent:{agent.name}", "agent", lambda: original_run(*args, **kwargs), owner=agent.name)
+
+    agent.run = run
+    agent.tool_hooks = list(agent.tool_hooks or []) + [tool_span_hook]
+
+
+def instrument_team(team) -> None:
+    """Mide el orquestador, sus miembros y las lecturas/escrituras del storage de sesión."""
+    original_run = team.run
+    original_read = team.read_from_storage
+    original_write = team.write_to_storage
+    name = team.name or ORCHESTRATOR
+
+    def run(*args, **kwargs):
+        return traced_call(f"team:{name}", "team", lambda: original_run(*args, **kwargs))
+
+    def read_from_storage(*args, **kwargs):
+        return traced_call("storage:session_read", "storage", lambda: original_read(*args, **kwargs))
+
+    def write_to_storage(*args, **kwargs):
+        return traced_call("storage:session_write", "storage", lambda: original_write(*args, **kwargs))
+
+    team.run = run
+    team.read_from_storage = read_from_storage
+    team.write_to_storage = write_to_storage
+    for member in team.members:
+        instrument_agent(member)
+
+
+def record_model_usage(model_span: Optional[Span], response) -> None:
+    """Añade al span los tokens de una respuesta (o chunk final) de Gemini."""
+    usage = getattr(response, "usage_metadata", None)
+    if model_span is None or usage is None:
+        return
+    output_tokens = (getattr(usage, "candidates_token_count", 0) or 0) + (getattr(usage, "thoughts_token_count", 0) or 0)
+    # En streaming cada chunk trae el acumulado: quedarse con el último valor
+    model_span.attributes["input_tokens"] = getattr(usage, "prompt_token_count", 0) or 0
+    model_span.attributes["output_tokens"] = output_tokens
+    model_span.attributes["cached_tokens"] = getattr(usage, "cached_content_token_count", 0) or 0
+
+
+@contextmanager
+def model_call(model_id: str, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Span de una llamada a Gemini, atribuida al agente que la origina.
+
+    No se activa como span actual: puede abarcar un stream consumido por partes.
+    """
+    parent = _current_span.get()
+    owner = parent.owner if parent else ORCHESTRATOR
+    child = _child(f"model:{owner}", "model", owner, model=model_id, **attributes)
+    try:
+        yield child
+    except Exception as e:
+        if child is not None:
+            child.fail(e)
+        raise
+    finally:
+        if child is not None:
+            child.end()
+
+
+# --- Exportación -------------------------------------------------------------
+
+def default_telemetry_path() -> str:
+    """Base de datos de trazas: junto a la base de datos de agentes."""
+    if settings.telemetry_db_file_path:
+        return settings.telemetry_db_file_path
+    return os.path.join(os.path.dirname(settings.db_file_path) or ".", "telemetry.db")
+
+
+def _telemetry_connection():
+    path = default_telemetry_path()
+    conn = get_connection(path)
+    if path not in _schema_ready:
+        conn.executescript(_SCHEMA)
+        _schema_ready.add(path)
+    return conn
+
+
+def _otlp_value(value) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(trace: Trace, item: Span) -> Dict[str, Any]:
+    start_ns = int(item.start_time * 1e9)
+    attributes = {"component.kind": item.kind, "agent.owner": item.owner, **item.attributes}
+    if item.parent_id is None:
+        attributes.update({"user.id": trace.user, "session.id": trace.session_id})
+    otlp = {
+        "traceId": trace.trace_id,
+        "spanId": item.span_id,
+        "name": item.name,
+        "kind": 1,
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(start_ns + int((item.duration_ms or 0) * 1e6)),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None
+        ],
+        "status": {"code": 2 if item.status == "error" else 1},
+    }
+    if item.parent_id:
+        otlp["parentSpanId"] = item.parent_id
+    return otlp
+
+
+def export_trace(trace: Trace) -> None:
+    """Escribe la traza en SQLite y, si está configurado, en el archivo OTLP/JSON."""
+    conn = _telemetry_connection()
+    with transaction(conn):
+        conn.executemany(
+            "INSERT OR REPLACE INTO telemetry_spans (span_id, trace_id, parent_id, name, kind, user_id, "
+            "session_id, start_time, duration_ms, input_tokens, output_tokens, status, attributes) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    item.span_id, trace.trace_id, item.parent_id, item.name, item.kind, trace.user,
+                    trace.session_id, item.start_time, item.duration_ms or 0.0,
+                    item.attributes.get("input_tokens", 0), item.attributes.get("output_tokens", 0),
+                    item.status, json.dumps(item.attributes, ensure_ascii=False, default=str),
+                )
+                for item in trace.spans
+            ],
+        )
+
+    if settings.telemetry_otlp_json_path:
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [_otlp_span(trace, item) for item in trace.spans],
+                }],
+            }]
+        }
+        path = settings.telemetry_otlp_json_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+
+
+# --- Estadísticas ------------------------------------------------------------
+
+@dataclass
+class ComponentStats:
+    """Latencia y tokens agregados de un componente (nombre de span)."""
+    name: str
+    kind: str
+    count: int
+    p50_ms: float
+    p95_ms: float
+    total_ms: float
+    input_tokens: int
+    output_tokens: int
+    errors: int
+    cached_tokens: int = 0
+    first_token_p50_ms: Optional[float] = None
+    queue_wait_ms: float = 0.0
+    retries: int = 0
+    memo_hits: int = 0
+
+
+def _percentile(ordered: List[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def _window(query: str, since_hours: float, user: Optional[str]):
+    params: List[Any] = [time.time() - since_hours * 3600]
+    if user:
+        query += " AND user_id = ?"
+        params.append(user)
+    return query, params
+
+
+def component_stats(since_hours: float = 24, user: Optional[str] = None) -> List[ComponentStats]:
+    """p50/p95 por componente en la ventana indicada, ordenados por tiempo total."""
+    query, params = _window(
+        "SELECT name, kind, duration_ms, input_tokens, output_tokens, status, "
+        "json_extract(attributes, '$.cached_tokens'), json_extract(attributes, '$.first_token_ms'), "
+        "json_extract(attributes, '$.rate_limit_wait_ms'), json_extract(attributes, '$.rate_limit_retries'), "
+        "json_extract(attributes, '$.memo_hit') "
+        "FROM telemetry_spans WHERE start_time >= ?",
+        since_hours, user,
+    )
+
+    grouped: Dict[str, List[tuple]] = {}
+    for row in _telemetry_connection().execute(query, params):
+        grouped.setdefault(row[0], []).append(row)
+
+    stats = []
+    for name, rows in grouped.items():
+        durations = sorted(row[2] for row in rows)
+        first_tokens = sorted(row[7] for row in rows if row[7] is not None)
+        stats.append(ComponentStats(
+            name=name,
+            kind=rows[0][1],
+            count=len(rows),
+            p50_ms=_percentile(durations, 50),
+            p95_ms=_percentile(durations, 95),
+            total_ms=sum(durations),
+            input_tokens=sum(row[3] for row in rows),
+            output_tokens=sum(row[4] for row in rows),
+            errors=sum(1 for row in rows if row[5] == "error"),
+            cached_tokens=sum(row[6] or 0 for row in rows),
+            first_token_p50_ms=_percentile(first_tokens, 50) if first_tokens else None,
+            queue_wait_ms=sum(row[8] or 0 for row in rows),
+            retries=sum(row[9] or 0 for row in rows),
+            memo_hits=sum(1 for row in rows if row[10]),
+        ))
+    return sorted(stats, key=lambda item: item.total_ms, reverse=True)
+
+
+@dataclass
+class TierStats:
+    """Llamadas al modelo agregadas por nivel (flash, pro, escalated) y modelo."""
+    tier: str
+    model: str
+    count: int
+    p50_ms: float
+    input_tokens: int
+    output_tokens: int
+    cost_usd: Optional[float]
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+    """Coste en USD según ``model_prices_per_million`` (None si el modelo no tiene precio)."""
+    prices = settings.model_prices_per_million.get(model)
+    if not prices:
+        return None
+    return (input_tokens * prices[0] + output_tokens * prices[1]) / 1_000_000
+
+
+def tier_stats(since_hours: float = 24, user: Optional[str] = None) -> List[TierStats]:
+    """Llamadas, p50, tokens y coste estimado por nivel y modelo en la ventana indicada."""
+    query, params = _window(
+        "SELECT COALESCE(json_extract(attributes, '$.tier'), '-'), COALESCE(json_extract(attributes, '$.model'), '-'), "
+        "duration_ms, input_tokens, output_tokens FROM telemetry_spans WHERE kind = 'model' AND start_time >= ?",
+        since_hours, user,
+    )
+    grouped: Dict[tuple, List[tuple]] = {}
+    for row in _telemetry_connection().execute(query, params):
+        grouped.setdefault(row[:2], []).append(row)
+
+    stats = []
+    for (tier, model), rows in grouped.items():
+        input_tokens = sum(row[3] for row in rows)
+        output_tokens = sum(row[4] for row in rows)
+        stats.append(TierStats(
+            tier=tier,
+            model=model,
+            count=len(rows),
+            p50_ms=_percentile(sorted(row[2] for row in rows), 50),
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cost_usd=estimate_cost(model, input_tokens, output_tokens),
+        ))
+    return sorted(stats, key=lambda item: (item.tier, item.model))
+
+
+def turn_tier_counts(since_hours: float = 24, user: Optional[str] = None) -> Dict[str, int]:
+    """Turnos por nivel de modelo (el de ``Trace.model_tier``) en la ventana indicada."""
+    query, params = _window(
+        "SELECT json_extract(attributes, '$.tier') FROM telemetry_spans WHERE kind = 'turn' AND start_time >= ?",
+        since_hours, user,
+    )
+    counts: Dict[str, int] = {}
+    for (tier,) in _telemetry_connection().execute(query, params):
+        counts[tier or "-"] = counts.get(tier or "-", 0) + 1
+    return counts
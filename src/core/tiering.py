@@ -0,0 +1,104 @@
+"""
+Selección de modelo (Flash o Pro) para cada llamada del orquestador y los agentes.
+
+Con ``MODEL_TIERING`` activo, los componentes configurados con
+``default_llm_pro`` eligen en cada ejecución entre Flash y Pro según la tarea
+que reciben (la consulta del usuario para el orquestador, la tarea delegada
+para un miembro):
+
+- Generación o revisión de código → Pro.
+- Consultas complejas (comparaciones, arquitectura, estrategia, varias preguntas)
+  o largas → Pro.
+- Respuestas que se piden largas (detalladas, paso a paso, guía completa) → Pro.
+- El resto → Flash.
+
+Si Flash responde y la respuesta final no pasa una comprobación rápida (vacía,
+truncada, bloque de código sin cerrar, código pedido pero ausente, negativa),
+se repite la llamada con Pro (``escalated``). El nivel usado queda en el span
+de cada llamada (atributo ``tier``) y en el turno (el más alto de sus llamadas).
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+from src.config import settings
+from src.core.router import KEYWORD_RULES
+
+TIER_FLASH = "flash"
+TIER_PRO = "pro"
+TIER_ESCALATED = "escalated"
+# Orden para el nivel de un turno: el más caro usado por cualquiera de sus llamadas
+TIER_ORDER = (TIER_FLASH, TIER_PRO, TIER_ESCALATED)
+
+CODE_PATTERNS = [re.compile(rule, re.IGNORECASE | re.DOTALL) for rule in KEYWORD_RULES["Code Standards Agent"]]
+COMPLEX_PATTERN = re.compile(
+    r"\b(compara\w*|compare|trade-?offs?|arquitectura|architecture|dise[ñn]a\w*|design|estrategia|strategy|"
+    r"migra\w*|escalabilidad|scalability|ventajas y desventajas|pros y contras|pros and cons|optimiza\w*|"
+    r"eval[uú]a\w*|evaluate)\b",
+    re.IGNORECASE,
+)
+LONG_OUTPUT_PATTERN = re.compile(
+    r"\b(detallad[oa]s?|en detalle|in detail|paso a paso|step by step|exhaustiv[oa]|completa?|complete|"
+    r"informe|report|gu[ií]a|guide|tutorial|documenta\w*)\b",
+    re.IGNORECASE,
+)
+# Mensaje con el que agno delega una tarea a un miembro del equipo
+TASK_PATTERN = re.compile(r"<task>\s*(.*?)\s*</task>(?:.*?<expected_output>\s*(.*?)\s*</expected_output>)?", re.DOTALL)
+REFUSAL_PATTERN = re.compile(
+    r"\b(no puedo ayudar|no puedo responder|no es posible responder|I can(no|')t help|I am unable to)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class TierDecision:
+    """Nivel elegido para una tarea y las señales que lo justifican."""
+    tier: str
+    reasons: List[str] = field(default_factory=list)
+    wants_code: bool = False
+
+
+def task_text(message: str) -> str:
+    """La tarea de un mensaje: la consulta, o la tarea y el resultado esperado si la delega el orquestador."""
+    match = TASK_PATTERN.search(message)
+    if not match:
+        return message
+    return "\n".join(part for part in match.groups() if part)
+
+
+def choose_tier(task: str) -> TierDecision:
+    """Flash salvo que la tarea implique código, complejidad o una respuesta larga."""
+    task = task_text(task)
+    reasons = []
+    wants_code = any(pattern.search(task) for pattern in CODE_PATTERNS)
+    if wants_code:
+        reasons.append("code")
+    if COMPLEX_PATTERN.search(task) or task.count("?") > 1:
+        reasons.append("complex")
+    if len(task.split()) > settings.model_tier_flash_max_words:
+        reasons.append("long_query")
+    if LONG_OUTPUT_PATTERN.search(task):
+        reasons.append("long_output")
+    return TierDecision(tier=TIER_PRO if reasons else TIER_FLASH, reasons=reasons, wants_code=wants_code)
+
+
+def self_check(answer: str, decision: TierDecision, truncated: bool = False) -> Optional[str]:
+    """Motivo por el que una respuesta de Flash debe repetirse con Pro, o None si es aceptable."""
+    text = answer.strip()
+    if len(text) < settings.model_tier_min_answer_chars:
+        return "empty"
+    if truncated:
+        return "truncated"
+    if text.count("```") % 2:
+        return "unclosed_code"
+    if decision.wants_code and "```" not in text:
+        return "missing_code"
+    if REFUSAL_PATTERN.search(text[:500]):
+        return "refusal"
+    return None
+
+
+def turn_tier(tiers: Iterable[Optional[str]]) -> Optional[str]:
+    """Nivel de un turno a partir de los niveles de sus llamadas al modelo."""
+    used = [TIER_ORDER.index(tier) for tier in tiers if tier in TIER_ORDER]
+    return TIER_ORDER[max(used)] if used else None
@@ -0,0 +1,174 @@
+"""
+API HTTP del equipo multi-agente (comando ``serve``).
+
+Proceso de larga duración: los equipos se construyen una sola vez al arrancar
+(``TeamPool``) y cada petición toma uno prestado, de modo que las consultas no
+pagan el coste de importar agno ni de crear los clientes de Gemini/Vertex.
+Las llamadas a ``team.run`` son síncronas y se ejecutan en el threadpool para
+no bloquear el event loop; con ``stream=true`` la respuesta se emite como
+Server-Sent Events.
+
+Autenticación: con ``settings.server_api_keys`` configurado, cada petición
+debe enviar ``X-API-Key`` y el usuario se deriva de la clave (el campo
+``user`` de la petición, si viene, debe coincidir). Sin claves el usuario se
+toma de la petición tal cual, así que cualquier cliente puede leer o borrar
+las sesiones de otro: ``serve`` escucha por defecto sólo en ``127.0.0.1``.
+"""
+import hmac
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from src.config import settings
+from src.core.runner import run_turn, stream_turn
+from src.core.team_builder import generate_session_id
+from src.core.team_pool import TeamPool
+
+logger = logging.getLogger(__name__)
+
+
+class SessionRequest(BaseModel):
+    user: Optional[str] = None
+
+
+class QueryRequest(BaseModel):
+    user: Optional[str] = None
+    query: str
+    session_id: Optional[str] = None
+    stream: bool = False
+
+
+def api_key_user(x_api_key: Optional[str] = Header(None)) -> Optional[str]:
+    """Usuario asociado a la cabecera ``X-API-Key`` (None si no hay claves configuradas)."""
+    keys = settings.server_api_keys
+    if not keys:
+        return None
+    if x_api_key:
+        for key, user in keys.items():
+            if hmac.compare_digest(key.encode(), x_api_key.encode()):
+                return user
+    raise HTTPException(status_code=401, detail="Clave de API ausente o no válida")
+
+
+def resolve_user(claimed: Optional[str], authenticated: Optional[str]) -> str:
+    """Usuario efectivo de la petición: el de la clave de API si la hay."""
+    if authenticated is not None:
+        if claimed and claimed != authenticated:
+            raise HTTPException(status_code=403, detail="El usuario no corresponde a la clave de API")
+        return authenticated
+    if not claimed:
+        raise HTTPException(status_code=422, detail="Falta el usuario")
+    return claimed
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def create_app(pool_size: int = 4) -> FastAPI:
+    """Crea la aplicación FastAPI con su pool de equipos."""
+    pool = TeamPool(pool_size)
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        await pool.start()
+        yield
+
+    app = FastAPI(
+        title="Equipo Multi-Agente de Ingeniería de Datos",
+        lifespan=lifespan,
+    )
+    app.state.pool = pool
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "pool_size": pool.size, "available": pool.available}
+
+    @app.post("/sessions")
+    async def create_session(request: SessionRequest, authenticated: Optional[str] = Depends(api_key_user)):
+        user = resolve_user(request.user, authenticated)
+        return {"user": user, "session_id": generate_session_id(user)}
+
+    @app.get("/sessions")
+    async def list_sessions(user: Optional[str] = None, authenticated: Optional[str] = Depends(api_key_user)):
+        from src.storage.db_utils import get_user_sessions
+
+        user = resolve_user(user, authenticated)
+        sessions = await run_in_threadpool(get_user_sessions, user)
+        return {"user": user, "sessions": sessions}
+
+    @app.delete("/sessions/{session_id}")
+    async def clear_session(
+        session_id: str,
+        user: Optional[str] = None,
+        authenticated: Optional[str] = Depends(api_key_user),
+    ):
+        from src.storage.db_utils import clear_session_history
+
+        user = resolve_user(user, authenticated)
+        if not await run_in_threadpool(clear_session_history, user, session_id):
+            raise HTTPException(status_code=500, detail=f"Error clearing session {session_id}")
+        return {"user": user, "session_id": session_id, "cleared": True}
+
+    @app.post("/query")
+    async def query(request: QueryRequest, authenticated: Optional[str] = Depends(api_key_user)):
+        request.user = resolve_user(request.user, authenticated)
+        if not request.query.strip():
+            raise HTTPException(status_code=422, detail="La consulta no puede estar vacía")
+
+        session_id = request.session_id or generate_session_id(request.user)
+        run_kwargs = {"session_id": session_id, "user_id": request.user}
+
+        if request.stream:
+            return StreamingResponse(
+                _stream_query(pool, request, session_id, run_kwargs),
+                media_type="text/event-stream",
+            )
+
+        start = time.perf_counter()
+        async with pool.lease(request.user, session_id) as team:
+            try:
+                response = await run_in_threadpool(
+                    run_turn, team, request.query, request.user, session_id, **run_kwargs
+                )
+            except Exception as e:
+                logger.error(f"Error processing query for session {session_id}: {e}", exc_info=True)
+                raise HTTPException(status_code=500, detail=str(e))
+
+        return {
+            "user": request.user,
+            "session_id": session_id,
+            "content": getattr(response, "content", str(response)),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    return app
+
+
+async def _stream_query(pool: TeamPool, request: QueryRequest, session_id: str, run_kwargs: dict):
+    """Genera los eventos SSE de una consulta; el equipo se devuelve al terminar o si el cliente corta."""
+    start = time.perf_counter()
+    async with pool.lease(request.user, session_id) as team:
+        yield _sse("session", {"user": request.user, "session_id": session_id})
+        try:
+            updates = stream_turn(team, request.query, request.user, session_id, **run_kwargs)
+            async for update in iterate_in_threadpool(updates):
+                if update.active_member:
+                    yield _sse("member", {"member": update.active_member})
+                elif update.member_finished:
+                    yield _sse("member_finished", {})
+                if update.content:
+                    yield _sse("content", {"content": update.content})
+        except Exception as e:
+            logger.error(f"Error streaming query for session {session_id}: {e}", exc_info=True)
+            yield _sse("error", {"detail": str(e)})
+            return
+
+    yield _sse("done", {"latency_ms": round((time.perf_counter() - start) * 1000, 1)})
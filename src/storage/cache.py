@@ -0,0 +1,266 @@
+"""
+Caché de resultados en dos niveles: LRU en memoria + SQLite en disco.
+
+El nivel en memoria evita cualquier I/O para consultas repetidas dentro del
+mismo proceso; el nivel en disco comparte resultados entre ejecuciones del CLI
+y entre usuarios que usan la misma base de datos.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from src.storage.connection import get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántas escrituras se purgan expirados y se aplica el límite de tamaño en disco
+EVICTION_INTERVAL = 32
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cache_entries_access ON cache_entries(namespace, last_access);
+CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries(namespace, expires_at);
+"""
+
+
+def default_cache_path() -> str:
+    """Ruta del archivo de caché: junto a la base de datos de agentes."""
+    from src.config import settings
+
+    if settings.cache_db_file_path:
+        return settings.cache_db_file_path
+    return os.path.join(os.path.dirname(settings.db_file_path) or ".", "cache.db")
+
+
+def normalize_query(query: str) -> str:
+    """Normaliza una consulta para que variaciones triviales compartan entrada."""
+    return " ".join(query.lower().split())
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Genera una clave estable a partir de las partes que identifican un resultado."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TieredCache:
+    """Caché con TTL: LRU en memoria delante de una tabla SQLite en disco."""
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl_seconds: int,
+        max_memory_entries: int,
+        max_disk_entries: int,
+        db_path: Optional[str] = None,
+        max_disk_bytes: int = 0,
+    ):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes  # 0 = sin límite por tamaño
+        self.db_path = db_path or default_cache_path()
+
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self._schema_ready = False
+        self._disk_enabled = max_disk_entries > 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Conexión compartida al nivel en disco (esquema creado una sola vez)."""
+        if not self._disk_enabled:
+            return None
+        try:
+            conn = get_connection(self.db_path)
+            if not self._schema_ready:
+                conn.executescript(_CACHE_SCHEMA)
+                self._schema_ready = True
+            return conn
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache disabled for '{self.namespace}': {e}")
+            self._disk_enabled = False
+            return None
+
+    def get(self, key: str) -> Optional[Any]:
+        """Devuelve el valor cacheado o None si no existe o expiró."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            value, expires_at = self._disk_get(key, now)
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            self._memory_put(key, value, expires_at)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Guarda un valor serializable en JSON en ambos niveles."""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._memory_put(key, value, expires_at)
+            self.writes += 1
+            self._disk_set(key, value, now, expires_at)
+
+    def clear(self) -> None:
+        """Vacía ambos niveles para este namespace."""
+        with self._lock:
+            self._memory.clear()
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                with transaction(conn):
+                    conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+            except sqlite3.Error as e:
+                logger.warning(f"Error clearing disk cache '{self.namespace}': {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos/fallos para diagnóstico."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "namespace": self.namespace,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "memory_entries": len(self._memory),
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    def _memory_put(self, key: str, value: Any, expires_at: float) -> None:
+        if self.max_memory_entries <= 0:
+            return
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Tuple[Optional[Any], float]:
+        conn = self._connection()
+        if conn is None:
+            return None, 0.0
+        try:
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None, 0.0
+            if row[1] <= now:
+                with transaction(conn):
+                    conn.execute(
+                        "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                        (self.namespace, key),
+                    )
+                return None, 0.0
+            with transaction(conn):
+                conn.execute(
+                    "UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, key),
+                )
+            return json.loads(row[0]), row[1]
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Error reading disk cache '{self.namespace}': {e}")
+            return None, 0.0
+
+    def _disk_set(self, key: str, value: Any, now: float, expires_at: float) -> None:
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            with transaction(conn):
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries "
+                    "(namespace, key, value, created_at, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value, ensure_ascii=False), now, expires_at, now),
+                )
+            self._writes_since_eviction += 1
+            if self._writes_since_eviction >= EVICTION_INTERVAL:
+                self._evict(conn, now)
+        except (sqlite3.Error, TypeError) as e:
+            logger.warning(f"Error writing disk cache '{self.namespace}': {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Purga expirados y recorta las entradas menos usadas por encima del límite."""
+        self._writes_since_eviction = 0
+        with transaction(conn):
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+                (self.namespace, now),
+            )
+            count = conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+            excess = count - self.max_disk_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                    "SELECT key FROM cache_entries WHERE namespace = ? "
+                    "ORDER BY last_access ASC LIMIT ?)",
+                    (self.namespace, self.namespace, excess),
+                )
+            if self.max_disk_bytes > 0:
+                # Se conservan las entradas más recientes cuyo tamaño acumulado cabe en el límite
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                    "SELECT key FROM (SELECT key, SUM(LENGTH(value)) OVER ("
+                    "ORDER BY last_access DESC ROWS UNBOUNDED PRECEDING) AS total "
+                    "FROM cache_entries WHERE namespace = ?) WHERE total > ?)",
+                    (self.namespace, self.namespace, self.max_disk_bytes),
+                )
+
+
+_caches: Dict[str, TieredCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(
+    namespace: str,
+    ttl_seconds: int,
+    max_memory_entries: int,
+    max_disk_entries: int,
+    max_disk_bytes: int = 0,
+) -> TieredCache:
+    """Devuelve la caché compartida del proceso para un namespace."""
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = TieredCache(
+                namespace, ttl_seconds, max_memory_entries, max_disk_entries, max_disk_bytes=max_disk_bytes
+            )
+            _caches[namespace] = cache
+        return cache
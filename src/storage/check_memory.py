@@ -1,39 +1,43 @@
 """
 Script para verificar y diagnosticar la memoria contextual.
 """
-import sqlite3
 from src.config import settings
+from src.storage.connection import get_connection
+from src.storage.sessions import is_shared_mode, session_table_name, table_exists
 
 def check_session_memory(user: str, session_id: str):
     """Verifica el estado de la memoria para una sesión."""
-    table_name = f"{settings.db_table_prefix}_{user}_{session_id}"
+    table_name = session_table_name(user, session_id)
     
     try:
-        conn = sqlite3.connect(settings.db_file_path)
+        conn = get_connection()
         cursor = conn.cursor()
         
-        # Verificar si la tabla existe
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
-        table_exists = cursor.fetchone() is not None
+        # Verificar si la tabla existe (búsqueda puntual, sin LIKE)
+        table_exists_ = table_exists(conn, table_name)
         
-        if table_exists:
+        if table_exists_:
             # Contar mensajes en la sesión
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            if is_shared_mode():
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM "{table_name}" WHERE user_id = ? AND session_id = ?',
+                    (user, session_id)
+                )
+            else:
+                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
             message_count = cursor.fetchone()[0]
             
             # Verificar estructura de la tabla
             cursor.execute(f"PRAGMA table_info({table_name})")
             columns = cursor.fetchall()
             
-            print(f"✅ Sesión encontrada: {table_name}")
+            print(f"✅ Sesión encontrada: {table_name} ({session_id})")
             print(f"📊 Mensajes almacenados: {message_count}")
             print(f"🏗️ Estructura de la tabla:")
             for col in columns:
                 print(f"   - {col[1]} ({col[2]})")
         else:
             print(f"❌ Tabla no encontrada: {table_name}")
-            
-        conn.close()
         
     except Exception as e:
         print(f"❌ Error verificando memoria: {e}")
@@ -0,0 +1,123 @@
+"""
+Gestión centralizada de conexiones SQLite.
+
+Todas las utilidades de almacenamiento (y el ``SqliteStorage`` de agno) abren
+la base de datos a través de este módulo, de forma que comparten la misma
+configuración: WAL para que lectores y escritor no se bloqueen entre sí,
+``synchronous=NORMAL`` para evitar un fsync por commit, I/O mapeada en memoria
+y un ``busy_timeout`` que espera al lock en lugar de fallar con
+``database is locked``.
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_all_connections: List[sqlite3.Connection] = []
+_registry_lock = threading.Lock()
+
+
+def _resolve_path(db_path: Optional[str]) -> str:
+    if db_path is None:
+        from src.config import settings
+
+        db_path = settings.db_file_path
+    return os.path.abspath(db_path)
+
+
+def apply_pragmas(conn) -> None:
+    """Aplica los pragmas de rendimiento y concurrencia a una conexión DB-API."""
+    from src.config import settings
+
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(settings.db_busy_timeout_ms)}")
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.execute(f"PRAGMA mmap_size = {int(settings.db_mmap_size)}")
+    cursor.execute("PRAGMA temp_store = MEMORY")
+    cursor.close()
+
+
+def get_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Devuelve la conexión del hilo actual para ``db_path`` (por defecto la DB de agentes).
+
+    Las conexiones se reutilizan dentro del proceso (una por hilo y archivo) y
+    trabajan en modo autocommit; usa ``transaction()`` para agrupar escrituras.
+    No deben cerrarse desde los helpers.
+    """
+    path = _resolve_path(db_path)
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        from src.config import settings
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(
+            path,
+            timeout=settings.db_busy_timeout_ms / 1000,
+            isolation_level=None,
+        )
+        apply_pragmas(conn)
+        connections[path] = conn
+        with _registry_lock:
+            _all_connections.append(conn)
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection, immediate: bool = True) -> Iterator[sqlite3.Connection]:
+    """Transacción explícita; IMMEDIATE toma el lock de escritura al inicio."""
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+
+def _on_engine_connect(dbapi_conn, _connection_record) -> None:
+    apply_pragmas(dbapi_conn)
+
+
+def configure_engine(engine) -> None:
+    """
+    Aplica los mismos pragmas a un engine de SQLAlchemy ya creado.
+
+    Se usa con el engine que crea ``SqliteStorage`` a partir de ``db_file``
+    (agno 1.x ignora un ``db_engine`` externo y abre una DB en memoria).
+    """
+    from sqlalchemy import event
+
+    if not event.contains(engine, "connect", _on_engine_connect):
+        event.listen(engine, "connect", _on_engine_connect)
+        # Descartar conexiones abiertas antes de registrar el listener
+        engine.dispose()
+
+
+def close_connections() -> None:
+    """Cierra todas las conexiones abiertas por el proceso."""
+    with _registry_lock:
+        connections = list(_all_connections)
+        _all_connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            # Conexión creada en otro hilo; se libera al terminar el proceso
+            pass
+    _local.connections = {}
+
+
+atexit.register(close_connections)
@@ -1,7 +1,10 @@
 import sqlite3
+import time
 from rich.console import Console
 import logging
 
+from src.storage.connection import get_connection, transaction
+
 # Configurar logging
 logger = logging.getLogger(__name__)
 
@@ -9,45 +12,219 @@ logger = logging.getLogger(__name__)
 def clear_session_history(user: str, session_id: str):
     """Limpia el historial de una sesión específica."""
     from src.config import settings
-    
+    from src.storage.sessions import is_shared_mode, per_session_table_name
+    from src.storage.tool_memo import delete_session_memo
+    from src.storage.turns import delete_session_turns
+
     try:
-        conn = sqlite3.connect(settings.db_file_path)
+        conn = get_connection()
         cursor = conn.cursor()
-        
-        table_name = f"{settings.db_table_prefix}_{user}_{session_id}"
-        cursor.execute(f"DELETE FROM {table_name} WHERE 1=1")
-        
-        conn.commit()
-        conn.close()
+
+        if is_shared_mode():
+            cursor.execute(
+                f'DELETE FROM "{settings.db_sessions_table}" WHERE user_id = ? AND session_id = ?',
+                (user, session_id)
+            )
+        else:
+            table_name = per_session_table_name(user, session_id)
+            cursor.execute(f"DELETE FROM {table_name} WHERE 1=1")
+
+        delete_session_turns(user, session_id)
+        delete_session_memo(user, session_id)
         return True
-        
+
     except Exception as e:
         logger.error(f"Error clearing session history: {e}")
         return False
 
-def list_user_sessions(user: str, console: Console):
-    """Lista las sesiones existentes para un usuario."""
+def get_user_sessions(user: str):
+    """Devuelve los session_id existentes para un usuario."""
     from src.config import settings
-    
+    from src.storage.sessions import is_shared_mode, list_per_session_tables, table_exists
+
+    conn = get_connection()
+    if is_shared_mode():
+        # Búsqueda por índice (user_id, session_id, updated_at)
+        if not table_exists(conn, settings.db_sessions_table):
+            return []
+        rows = conn.execute(
+            f'SELECT session_id FROM "{settings.db_sessions_table}" '
+            f'WHERE user_id = ? ORDER BY session_id',
+            (user,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    prefix = f"{settings.db_table_prefix}_{user}_"
+    return [name.replace(prefix, "", 1) for name in list_per_session_tables(conn, user)]
+
+def list_user_sessions(user: str, console: Console, detailed: bool = False):
+    """
+    Lista las sesiones de un usuario, la de actividad más reciente primero.
+
+    Turnos, tokens y fechas salen de ``session_metadata`` (una consulta por
+    clave primaria); las sesiones de agno sin turnos registrados se listan al
+    final sin esos datos. ``detailed`` añade primera actividad, tokens y el
+    último agente que respondió.
+    """
+    from datetime import datetime
+    from rich.table import Table
+    from src.storage.turns import list_session_metadata
+
+    def when(timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
     try:
-        conn = sqlite3.connect(settings.db_file_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE ?", 
-            (f"{settings.db_table_prefix}_{user}_%",)
-        )
-        sessions = cursor.fetchall()
-        
-        if sessions:
-            console.print(f"[green]Sesiones encontradas para usuario '{user}':[/green]")
-            for session in sessions:
-                session_name = session[0].replace(f"{settings.db_table_prefix}_{user}_", "")
-                console.print(f"  • {session_name}")
-        else:
+        start = time.perf_counter()
+        metadata = list_session_metadata(user)
+        known = {item.session_id for item in metadata}
+        others = [session_id for session_id in get_user_sessions(user) if session_id not in known]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if not metadata and not others:
             console.print(f"[yellow]No se encontraron sesiones para usuario '{user}'[/yellow]")
-            
-        conn.close()
-        
+            return
+
+        table = Table(title=f"Sesiones de '{user}'", border_style="blue")
+        table.add_column("Sesión", style="cyan", no_wrap=True)
+        table.add_column("Turnos", justify="right")
+        if detailed:
+            table.add_column("Primera actividad", style="dim", no_wrap=True)
+        table.add_column("Última actividad", style="green", no_wrap=True)
+        if detailed:
+            table.add_column("Tokens", justify="right", style="magenta")
+            table.add_column("Último agente", style="yellow")
+
+        for item in metadata:
+            row = [item.session_id, str(item.turns)]
+            if detailed:
+                row.append(when(item.first_activity))
+            row.append(when(item.last_activity))
+            if detailed:
+                row += [f"{item.tokens:,}", item.last_agent or "-"]
+            table.add_row(*row)
+        for session_id in others:
+            table.add_row(session_id, "0", *["-"] * (len(table.columns) - 2))
+
+        console.print(table)
+        console.print(f"[dim]{len(metadata) + len(others)} sesiones • {elapsed_ms:.1f} ms[/dim]")
+
+    except Exception as e:
+        console.print(f"[red]Error al listar sesiones: {e}[/red]")
+
+def _page_stats(conn: sqlite3.Connection):
+    """Devuelve (page_size, page_count, freelist_count) de la base de datos."""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_size, page_count, freelist_count
+
+def _reclaim_free_pages(conn: sqlite3.Connection, freelist_ratio: float):
+    """
+    Devuelve al sistema de archivos las páginas liberadas.
+
+    Con auto_vacuum=INCREMENTAL basta un incremental_vacuum (barato). Si la base
+    aún no está en ese modo y la fracción de páginas libres supera el umbral,
+    se hace un único VACUUM que además la convierte a modo incremental, de modo
+    que las siguientes limpiezas ya no necesitan reescribir todo el archivo.
+    """
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    _, page_count, freelist_count = _page_stats(conn)
+
+    if auto_vacuum == 2:
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+    elif page_count and freelist_count / page_count >= freelist_ratio:
+        logger.info(f"Running VACUUM: {freelist_count}/{page_count} free pages")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+def _format_bytes(num_bytes: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.0f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GB"
+
+def cleanup_old_sessions(user: str, older_than_days: int, console: Console) -> int:
+    """
+    Elimina las sesiones de un usuario sin actividad en los últimos N días.
+
+    El borrado se hace en lotes acotados (``settings.cleanup_batch_size``), cada
+    uno en su propia transacción, para no retener el lock de escritura mientras
+    agno guarda otras sesiones. Al final se recuperan las páginas libres y se
+    informa de filas eliminadas y bytes recuperados. Devuelve el número de
+    sesiones eliminadas.
+    """
+    from src.config import settings
+    from src.storage.sessions import (
+        ensure_session_indexes,
+        is_shared_mode,
+        list_per_session_tables,
+        table_exists,
+    )
+    from src.storage.tool_memo import delete_stale_memo
+    from src.storage.turns import delete_inactive_turns
+
+    cutoff = int(time.time()) - older_than_days * 86400
+    batch_size = max(1, settings.cleanup_batch_size)
+    deleted_sessions = 0
+    deleted_rows = 0
+
+    try:
+        conn = get_connection()
+        page_size, pages_before, _ = _page_stats(conn)
+
+        if is_shared_mode():
+            table = settings.db_sessions_table
+            if table_exists(conn, table):
+                ensure_session_indexes(conn)
+                while True:
+                    with transaction(conn):
+                        cursor = conn.execute(
+                            f'DELETE FROM "{table}" WHERE rowid IN ('
+                            f'SELECT rowid FROM "{table}" '
+                            f'WHERE user_id = ? AND COALESCE(updated_at, created_at) < ? LIMIT ?)',
+                            (user, cutoff, batch_size)
+                        )
+                    deleted_sessions += cursor.rowcount
+                    deleted_rows += cursor.rowcount
+                    if cursor.rowcount < batch_size:
+                        break
+        else:
+            expired = []
+            for table in list_per_session_tables(conn, user):
+                last_activity, row_count = conn.execute(
+                    f'SELECT MAX(COALESCE(updated_at, created_at)), COUNT(*) FROM "{table}"'
+                ).fetchone()
+                if last_activity is None or last_activity < cutoff:
+                    expired.append((table, row_count))
+
+            for start in range(0, len(expired), batch_size):
+                with transaction(conn):
+                    for table, row_count in expired[start:start + batch_size]:
+                        conn.execute(f'DROP TABLE "{table}"')
+                        deleted_rows += row_count
+            deleted_sessions = len(expired)
+
+        deleted_rows += delete_inactive_turns(user, cutoff)
+        deleted_rows += delete_stale_memo(user, cutoff)
+
+        if deleted_sessions > 0:
+            _reclaim_free_pages(conn, settings.vacuum_freelist_ratio)
+
+        _, pages_after, _ = _page_stats(conn)
+        reclaimed_bytes = max(pages_before - pages_after, 0) * page_size
+
+        console.print(
+            f"[dim]🧾 Filas eliminadas: {deleted_rows} • "
+            f"Espacio recuperado: {_format_bytes(reclaimed_bytes)}[/dim]"
+        )
+        logger.info(
+            f"Cleanup for '{user}': {deleted_sessions} sessions, {deleted_rows} rows, "
+            f"{reclaimed_bytes} bytes reclaimed"
+        )
+        return deleted_sessions
+
     except Exception as e:
-        console.print(f"[red]Error al listar sesiones: {e}[/red]")
\ No newline at end of file
+        logger.error(f"Error cleaning up sessions: {e}")
+        console.print(f"[red]Error al limpiar sesiones: {e}[/red]")
+        return deleted_sessions
@@ -0,0 +1,184 @@
+"""
+Exportación e importación del registro de turnos en Parquet.
+
+Una fila por turno de ``session_turns`` (usuario, sesión, número de turno,
+fecha, agente que respondió, duración, nivel de modelo, tokens estimados,
+consulta y respuesta)
+en un archivo columnar comprimido con zstd, listo para pandas/polars/DuckDB.
+
+Ambas direcciones trabajan por lotes de ``batch_size`` filas: la exportación
+lee con ``fetchmany`` y escribe un row group por lote, y la importación lee
+row groups con ``iter_batches`` e inserta cada lote en una sola transacción,
+así que la memoria no depende del tamaño del historial. Requiere pyarrow
+(``pip install pyarrow``).
+"""
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from src.storage.connection import transaction
+from src.storage.turns import get_turns_connection
+
+DEFAULT_BATCH_SIZE = 10000
+
+# Columnas exportadas, en el orden de la consulta y del archivo
+COLUMNS = (
+    "user_id", "session_id", "turn", "created_at", "agent", "duration_ms", "tier", "tokens", "query", "answer",
+)
+# Columnas que pueden faltar en archivos de versiones anteriores
+_OPTIONAL_COLUMNS = ("agent", "duration_ms", "tier")
+
+
+@dataclass
+class TransferResult:
+    """Resultado de ``export_turns`` / ``import_turns``."""
+    rows: int
+    skipped: int
+    elapsed_s: float
+    path: str
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Para exportar/importar sesiones instala pyarrow: pip install pyarrow") from e
+    return pa, pq
+
+
+def _schema(pa):
+    return pa.schema([
+        ("user_id", pa.string()),
+        ("session_id", pa.string()),
+        ("turn", pa.int32()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("agent", pa.dictionary(pa.int32(), pa.string())),
+        ("duration_ms", pa.float64()),
+        ("tier", pa.dictionary(pa.int32(), pa.string())),
+        ("tokens", pa.int32()),
+        ("query", pa.string()),
+        ("answer", pa.string()),
+    ])
+
+
+def _to_record_batch(pa, schema, rows):
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.name == "created_at":
+            micros = pa.array([int(value * 1_000_000) for value in values], pa.int64())
+            arrays.append(micros.cast(field.type))
+        elif pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, pa.string()).dictionary_encode().cast(field.type))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_turns(
+    path: str,
+    user: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_batch: Optional[Callable[[int], None]] = None,
+) -> TransferResult:
+    """
+    Escribe los turnos (filtrados por usuario y rango ``[since, until)``) en ``path``.
+
+    El archivo se escribe junto al destino y se renombra al terminar, así que
+    una exportación interrumpida no deja un Parquet a medias.
+    """
+    pa, pq = _pyarrow()
+    schema = _schema(pa)
+    query = f"SELECT {', '.join(COLUMNS)} FROM session_turns WHERE 1 = 1"
+    params = []
+    if user:
+        query += " AND user_id = ?"
+        params.append(user)
+    if since is not None:
+        query += " AND created_at >= ?"
+        params.append(since)
+    if until is not None:
+        query += " AND created_at < ?"
+        params.append(until)
+    query += " ORDER BY id"
+
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    total = 0
+    cursor = get_turns_connection().execute(query, params)
+    try:
+        with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                writer.write_batch(_to_record_batch(pa, schema, rows))
+                total += len(rows)
+                if on_batch:
+                    on_batch(total)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        cursor.close()
+    return TransferResult(rows=total, skipped=0, elapsed_s=time.perf_counter() - start, path=path)
+
+
+def import_turns(
+    path: str,
+    overwrite: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_batch: Optional[Callable[[int], None]] = None,
+) -> TransferResult:
+    """
+    Restaura turnos desde un Parquet de ``export_turns``, un lote por transacción.
+
+    Los turnos que ya existen (mismo usuario, sesión y número) se omiten, o se
+    actualizan con ``overwrite``. El índice de texto completo se mantiene con
+    los triggers de ``session_turns``.
+    """
+    pa, pq = _pyarrow()
+    parquet = pq.ParquetFile(path)
+    available = set(parquet.schema_arrow.names)
+    missing = [name for name in COLUMNS if name not in available and name not in _OPTIONAL_COLUMNS]
+    if missing:
+        raise ValueError(f"{path} no es una exportación de sesiones (faltan columnas: {', '.join(missing)})")
+    columns = [name for name in COLUMNS if name in available]
+
+    conflict = (
+        "DO UPDATE SET query = excluded.query, answer = excluded.answer, tokens = excluded.tokens, "
+        "created_at = excluded.created_at, agent = excluded.agent, duration_ms = excluded.duration_ms, "
+        "tier = excluded.tier"
+        if overwrite else "DO NOTHING"
+    )
+    statement = (
+        f"INSERT INTO session_turns ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+        f"ON CONFLICT (user_id, session_id, turn) {conflict}"
+    )
+
+    start = time.perf_counter()
+    conn = get_turns_connection()
+    total = written = 0
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+        values = {}
+        for name in columns:
+            column = batch.column(batch.schema.get_field_index(name))
+            if name == "created_at":
+                values[name] = [micros / 1_000_000 for micros in column.cast(pa.int64()).to_pylist()]
+            else:
+                values[name] = column.to_pylist()
+        rows = list(zip(*(values.get(name, [None] * batch.num_rows) for name in COLUMNS)))
+        with transaction(conn):
+            # rowcount no incluye las filas que escriben los triggers del índice FTS
+            written += conn.executemany(statement, rows).rowcount
+        total += len(rows)
+        if on_batch:
+            on_batch(total)
+    return TransferResult(rows=written, skipped=total - written, elapsed_s=time.perf_counter() - start, path=path)
@@ -0,0 +1,209 @@
+"""
+Esquema de almacenamiento de sesiones.
+
+Soporta dos modos (``settings.session_storage_mode``):
+- ``per_session``: una tabla de agno por usuario y sesión (modo histórico).
+- ``shared``: una sola tabla para todas las sesiones, indexada por
+  ``(user_id, session_id, updated_at)`` para que listar, limpiar y depurar
+  sesiones sean búsquedas por índice y no recorridos de ``sqlite_master``.
+"""
+import logging
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from src.config import settings
+from src.storage.connection import configure_engine, get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+PER_SESSION_MODE = "per_session"
+SHARED_MODE = "shared"
+
+# Columnas mínimas de una tabla de sesiones de agno (modo team)
+SESSION_COLUMNS = {"session_id", "user_id", "memory", "created_at", "updated_at"}
+
+_create_lock = threading.Lock()
+
+
+@dataclass
+class MigrationResult:
+    """Resultado de ``migrate_per_session_tables``."""
+    tables: int = 0
+    rows: int = 0
+    skipped_tables: List[str] = field(default_factory=list)
+    conflicts: List[str] = field(default_factory=list)
+
+
+def is_shared_mode() -> bool:
+    """Indica si las sesiones se guardan en la tabla compartida."""
+    return settings.session_storage_mode == SHARED_MODE
+
+
+def per_session_table_name(user: str, session_id: str) -> str:
+    """Nombre de la tabla de una sesión en el modo ``per_session``."""
+    return f"{settings.db_table_prefix}_{user}_{session_id}"
+
+
+def session_table_name(user: str, session_id: str) -> str:
+    """Tabla donde vive la sesión según el modo configurado."""
+    if is_shared_mode():
+        return settings.db_sessions_table
+    return per_session_table_name(user, session_id)
+
+
+def build_session_storage(user: str, session_id: str):
+    """``SqliteStorage`` de agno para la sesión, con los pragmas compartidos."""
+    from agno.storage.sqlite import SqliteStorage
+
+    storage = SqliteStorage(
+        table_name=session_table_name(user, session_id),
+        db_file=settings.db_file_path,
+        mode="team",
+    )
+    configure_engine(storage.db_engine)  # WAL + busy_timeout compartidos con los helpers
+    if is_shared_mode():
+        # Tabla única: se crea (si falta) junto con el índice (user_id, session_id, updated_at)
+        create_shared_table(storage)
+    return storage
+
+
+def table_exists(conn: sqlite3.Connection, table_name: str) -> bool:
+    """Comprueba si existe una tabla (búsqueda puntual en el catálogo)."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,)
+    ).fetchone()
+    return row is not None
+
+
+def ensure_session_indexes(conn: sqlite3.Connection) -> None:
+    """Crea los índices de la tabla compartida si la tabla ya existe."""
+    table = settings.db_sessions_table
+    if not table_exists(conn, table):
+        return
+    conn.execute(
+        f'CREATE INDEX IF NOT EXISTS "idx_{table}_user_session_updated" '
+        f'ON "{table}" (user_id, session_id, updated_at)'
+    )
+    # Retención: localizar sesiones expiradas de un usuario sin recorrer todas sus filas
+    conn.execute(
+        f'CREATE INDEX IF NOT EXISTS "idx_{table}_user_updated" '
+        f'ON "{table}" (user_id, updated_at)'
+    )
+
+
+def create_shared_table(storage=None) -> None:
+    """Crea la tabla compartida con el esquema de agno y sus índices."""
+    if storage is None:
+        from agno.storage.sqlite import SqliteStorage
+
+        storage = SqliteStorage(
+            table_name=settings.db_sessions_table,
+            db_file=settings.db_file_path,
+            mode="team",
+        )
+        configure_engine(storage.db_engine)
+    # Equipos construidos en paralelo (batch, serve) no deben competir por crear la tabla
+    with _create_lock:
+        if not table_exists(get_connection(), settings.db_sessions_table):
+            storage.create()
+        ensure_session_indexes(get_connection())
+
+
+def _table_owned_by(conn: sqlite3.Connection, table_name: str, user: str) -> bool:
+    """
+    Indica si una tabla por sesión es de ``user``.
+
+    El prefijo ``{prefix}_{user}_`` no basta (``bob`` también casa con
+    ``bob_smith``): la tabla es suya si todas sus filas tienen su ``user_id`` o,
+    si está vacía, si el resto del nombre es un session_id generado para él.
+    """
+    if conn.execute(f'SELECT 1 FROM "{table_name}" WHERE user_id IS NOT ? LIMIT 1', (user,)).fetchone():
+        return False
+    if conn.execute(f'SELECT 1 FROM "{table_name}" LIMIT 1').fetchone():
+        return True
+    session_id = table_name[len(f"{settings.db_table_prefix}_{user}_"):]
+    return re.fullmatch(rf"{re.escape(user)}_\d{{8}}_\d{{6}}_[0-9a-f]{{8}}", session_id) is not None
+
+
+def list_per_session_tables(conn: sqlite3.Connection, user: Optional[str] = None) -> List[str]:
+    """Lista las tablas del modo ``per_session`` (opcionalmente de un usuario)."""
+    prefix = f"{settings.db_table_prefix}_{user}_" if user else f"{settings.db_table_prefix}_"
+    escaped = prefix.replace("\\", "\\\\").replace("_", "\\_").replace("%", "\\%")
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE ? ESCAPE '\\'",
+        (f"{escaped}%",),
+    ).fetchall()
+    tables = [name for (name,) in rows if name != settings.db_sessions_table]
+    if user:
+        tables = [name for name in tables if _table_owned_by(conn, name, user)]
+    return tables
+
+
+def _table_columns(conn: sqlite3.Connection, table_name: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+
+
+def migrate_per_session_tables(drop_old: bool = True) -> MigrationResult:
+    """
+    Copia todas las tablas por sesión a la tabla compartida.
+
+    Sólo se migran tablas con el esquema de sesiones de agno. Una fila cuyo
+    ``session_id`` ya existe en la tabla compartida con otro ``user_id`` no se
+    sobrescribe: se informa como conflicto y su tabla se conserva. Cada tabla
+    se migra en su propia transacción y sólo se elimina tras comprobar que
+    todas sus filas están en la tabla compartida, así que el proceso puede
+    interrumpirse y reanudarse.
+    """
+    conn = get_connection()
+    if not table_exists(conn, settings.db_sessions_table):
+        create_shared_table()
+    else:
+        ensure_session_indexes(conn)
+
+    target = settings.db_sessions_table
+    target_columns = _table_columns(conn, target)
+    result = MigrationResult()
+
+    for table in list_per_session_tables(conn):
+        columns = _table_columns(conn, table)
+        if not SESSION_COLUMNS.issubset(columns) or not set(columns).issubset(target_columns):
+            logger.warning(f"Skipping table without agno's session schema: {table}")
+            result.skipped_tables.append(table)
+            continue
+
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        source_list = ", ".join(f's."{c}"' for c in columns)
+        with transaction(conn):
+            conflicts = [session_id for (session_id,) in conn.execute(
+                f'SELECT s.session_id FROM "{table}" s JOIN "{target}" t '
+                f'ON t.session_id = s.session_id AND t.user_id IS NOT s.user_id'
+            )]
+            cursor = conn.execute(
+                f'INSERT OR REPLACE INTO "{target}" ({column_list}) '
+                f'SELECT {source_list} FROM "{table}" s WHERE NOT EXISTS ('
+                f'SELECT 1 FROM "{target}" t WHERE t.session_id = s.session_id AND t.user_id IS NOT s.user_id)'
+            )
+            result.rows += max(cursor.rowcount, 0)
+
+            total = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            copied = conn.execute(
+                f'SELECT COUNT(*) FROM "{table}" s JOIN "{target}" t '
+                f'ON t.session_id = s.session_id AND t.user_id IS s.user_id'
+            ).fetchone()[0]
+            if conflicts:
+                logger.warning(
+                    f"Keeping {table}: session_id already used by another user ({', '.join(conflicts)})"
+                )
+                result.conflicts.extend(f"{table}: {session_id}" for session_id in conflicts)
+            elif copied != total:
+                logger.warning(f"Keeping {table}: only {copied} of {total} rows found in {target}")
+                result.skipped_tables.append(table)
+            elif drop_old:
+                conn.execute(f'DROP TABLE "{table}"')
+        if not conflicts and copied == total:
+            result.tables += 1
+
+    return result
@@ -0,0 +1,180 @@
+"""
+Memoización de resultados de herramientas por sesión.
+
+Dentro de una sesión, el orquestador delega en varios miembros y los turnos
+de seguimiento suelen repetir la misma búsqueda (Vertex AI Search o
+DuckDuckGo). ``tool_memo_hook`` guarda el resultado de cada llamada a una
+herramienta de ``settings.tool_memo_tools`` en ``session_tool_memo``, en la
+misma base de datos que las sesiones, con clave (usuario, sesión, herramienta,
+argumentos normalizados); cualquier miembro que repita la llamada en la misma
+sesión recibe el resultado guardado sin ejecutar la herramienta.
+
+Las entradas caducan a las ``tool_memo_ttl_seconds`` y se borran con el resto
+del contexto de la sesión (``clear``, ``--clear-history`` y ``cleanup``). Las
+herramientas devuelven ``TransientResult`` para errores, búsquedas sin
+resultados o respuestas que dependen del turno, que no se memorizan. Si el
+toolkit de la herramienta define ``replay_memo(function_name, result, agent)``,
+los aciertos pasan por él (p.ej. para deduplicar URL dentro del turno).
+"""
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from src.config import settings
+from src.storage.cache import make_cache_key, normalize_query
+from src.storage.connection import get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_tool_memo (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    tool TEXT NOT NULL,
+    args_key TEXT NOT NULL,
+    args TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, session_id, tool, args_key)
+) WITHOUT ROWID;
+"""
+
+# Argumentos que agno inyecta y no forman parte de la llamada
+_INJECTED_ARGS = ("agent", "team")
+
+_schema_ready = set()
+
+
+class TransientResult(str):
+    """Resultado de una herramienta que se devuelve al modelo pero no se memoriza."""
+
+
+def get_memo_connection():
+    """Conexión a la DB de sesiones con la tabla de memoización creada."""
+    conn = get_connection()
+    path = os.path.abspath(settings.db_file_path)
+    if path not in _schema_ready:
+        conn.executescript(_SCHEMA)
+        _schema_ready.add(path)
+    return conn
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        # Las URL distinguen mayúsculas en la ruta
+        return value.strip() if value.startswith(("http://", "https://")) else normalize_query(value)
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    return value
+
+
+def normalize_args(arguments: Dict[str, Any]) -> str:
+    """Argumentos de la llamada como JSON estable (consultas en minúsculas y sin espacios extra)."""
+    relevant = {key: _normalize(value) for key, value in arguments.items() if key not in _INJECTED_ARGS}
+    return json.dumps(relevant, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def get_memo(user: str, session_id: str, tool: str, args: str) -> Optional[str]:
+    """Resultado guardado de la llamada, o None si no existe o caducó."""
+    conn = get_memo_connection()
+    key = make_cache_key(args)
+    row = conn.execute(
+        "SELECT result FROM session_tool_memo "
+        "WHERE user_id = ? AND session_id = ? AND tool = ? AND args_key = ? AND created_at >= ?",
+        (user, session_id, tool, key, time.time() - settings.tool_memo_ttl_seconds),
+    ).fetchone()
+    if row is None:
+        return None
+    with transaction(conn):
+        conn.execute(
+            "UPDATE session_tool_memo SET hits = hits + 1 "
+            "WHERE user_id = ? AND session_id = ? AND tool = ? AND args_key = ?",
+            (user, session_id, tool, key),
+        )
+    return row[0]
+
+
+def set_memo(user: str, session_id: str, tool: str, args: str, result: str) -> None:
+    """Guarda (o reemplaza) el resultado de una llamada."""
+    conn = get_memo_connection()
+    with transaction(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO session_tool_memo "
+            "(user_id, session_id, tool, args_key, args, result, created_at, hits) VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            (user, session_id, tool, make_cache_key(args), args, result, time.time()),
+        )
+
+
+def delete_session_memo(user: str, session_id: str) -> int:
+    """Borra los resultados memorizados de una sesión; devuelve las filas borradas."""
+    conn = get_memo_connection()
+    with transaction(conn):
+        cursor = conn.execute(
+            "DELETE FROM session_tool_memo WHERE user_id = ? AND session_id = ?", (user, session_id)
+        )
+    return cursor.rowcount
+
+
+def delete_stale_memo(user: str, cutoff: float) -> int:
+    """Borra los resultados del usuario guardados antes de ``cutoff`` o ya caducados."""
+    conn = get_memo_connection()
+    cutoff = max(cutoff, time.time() - settings.tool_memo_ttl_seconds)
+    with transaction(conn):
+        cursor = conn.execute(
+            "DELETE FROM session_tool_memo WHERE user_id = ? AND created_at < ?", (user, cutoff)
+        )
+    return cursor.rowcount
+
+
+def _memo_replay(agent, function_name: str) -> Optional[Callable]:
+    """``replay_memo`` del toolkit del agente que define la herramienta, si lo tiene."""
+    for tool in getattr(agent, "tools", None) or []:
+        if function_name in (getattr(tool, "functions", None) or {}) and hasattr(tool, "replay_memo"):
+            return tool.replay_memo
+    return None
+
+
+def tool_memo_hook(agent, function_name: str, function_call: Callable, arguments: Dict[str, Any]):
+    """
+    ``tool_hooks`` de agno: reutiliza el resultado de una llamada idéntica en la misma sesión.
+
+    Sólo se guardan resultados de texto; un fallo de la memoización nunca
+    impide ejecutar la herramienta.
+    """
+    from src.core.telemetry import current_span
+
+    user = getattr(agent, "user_id", None)
+    session_id = getattr(agent, "session_id", None)
+    if function_name not in settings.tool_memo_tools or not user or not session_id:
+        return function_call(**arguments)
+
+    args = normalize_args(arguments)
+    try:
+        cached = get_memo(user, session_id, function_name, args)
+    except Exception as e:
+        logger.warning(f"Tool memo lookup failed for {function_name}: {e}")
+        cached = None
+    span = current_span()
+    if span is not None:
+        span.attributes["memo_hit"] = cached is not None
+    if cached is not None:
+        replay = _memo_replay(agent, function_name)
+        return replay(function_name, cached, agent) if replay is not None else cached
+
+    result = function_call(**arguments)
+    if isinstance(result, str) and result and not isinstance(result, TransientResult):
+        try:
+            set_memo(user, session_id, function_name, args, result)
+        except Exception as e:
+            logger.warning(f"Tool memo write failed for {function_name}: {e}")
+    return result
+
+
+def install_tool_memo(agent) -> None:
+    """Añade ``tool_memo_hook`` como hook más interno de las herramientas del agente."""
+    agent.tool_hooks = list(agent.tool_hooks or []) + [tool_memo_hook]
@@ -0,0 +1,366 @@
+"""
+Registro de turnos y resumen acumulado por sesión.
+
+Cada consulta/respuesta se guarda en ``session_turns`` con su tamaño estimado
+en tokens; ``session_summaries`` guarda el resumen de los turnos antiguos y el
+último turno que cubre. Ambas tablas viven en la misma base de datos que las
+sesiones de agno y son independientes del modo de almacenamiento. Cada turno
+guarda también quién respondió (``agent``: un miembro, ``team`` o ``cache``),
+cuánto tardó y el nivel de modelo más alto usado (``tier``: flash, pro o escalated).
+
+``session_turns_fts`` es un índice FTS5 de contenido externo sobre las
+consultas y respuestas; los triggers lo mantienen al insertar o borrar turnos,
+así que buscar en el historial no recorre las tablas de sesión.
+
+``session_metadata`` resume cada sesión (turnos, tokens, primera y última
+actividad, último agente) y también se mantiene con triggers en cada turno
+guardado, importado o borrado; ``list-sessions`` la lee con una sola consulta
+por clave primaria en lugar de contar filas en cada tabla de sesión.
+"""
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from src.config import settings
+from src.storage.connection import get_connection, transaction
+from src.storage.sessions import table_exists
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_turns (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    turn INTEGER NOT NULL,
+    query TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    agent TEXT,
+    duration_ms REAL,
+    tier TEXT,
+    UNIQUE (user_id, session_id, turn)
+);
+CREATE INDEX IF NOT EXISTS idx_session_turns_created ON session_turns(created_at);
+CREATE TABLE IF NOT EXISTS session_summaries (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    through_turn INTEGER NOT NULL,
+    tokens INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, session_id)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS session_turns_fts USING fts5(
+    query, answer,
+    content='session_turns', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS session_turns_fts_insert AFTER INSERT ON session_turns BEGIN
+    INSERT INTO session_turns_fts(rowid, query, answer) VALUES (new.id, new.query, new.answer);
+END;
+CREATE TRIGGER IF NOT EXISTS session_turns_fts_delete AFTER DELETE ON session_turns BEGIN
+    INSERT INTO session_turns_fts(session_turns_fts, rowid, query, answer)
+    VALUES ('delete', old.id, old.query, old.answer);
+END;
+CREATE TRIGGER IF NOT EXISTS session_turns_fts_update AFTER UPDATE ON session_turns BEGIN
+    INSERT INTO session_turns_fts(session_turns_fts, rowid, query, answer)
+    VALUES ('delete', old.id, old.query, old.answer);
+    INSERT INTO session_turns_fts(rowid, query, answer) VALUES (new.id, new.query, new.answer);
+END;
+CREATE TABLE IF NOT EXISTS session_metadata (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    turns INTEGER NOT NULL,
+    tokens INTEGER NOT NULL,
+    first_activity REAL NOT NULL,
+    last_activity REAL NOT NULL,
+    last_agent TEXT,
+    PRIMARY KEY (user_id, session_id)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS session_metadata_insert AFTER INSERT ON session_turns BEGIN
+    INSERT INTO session_metadata (user_id, session_id, turns, tokens, first_activity, last_activity, last_agent)
+    VALUES (new.user_id, new.session_id, 1, new.tokens, new.created_at, new.created_at, new.agent)
+    ON CONFLICT (user_id, session_id) DO UPDATE SET
+        turns = turns + 1,
+        tokens = tokens + excluded.tokens,
+        first_activity = MIN(first_activity, excluded.first_activity),
+        last_agent = CASE WHEN excluded.last_activity >= last_activity THEN excluded.last_agent ELSE last_agent END,
+        last_activity = MAX(last_activity, excluded.last_activity);
+END;
+CREATE TRIGGER IF NOT EXISTS session_metadata_delete AFTER DELETE ON session_turns BEGIN
+    UPDATE session_metadata SET turns = turns - 1, tokens = tokens - old.tokens
+    WHERE user_id = old.user_id AND session_id = old.session_id;
+    DELETE FROM session_metadata WHERE user_id = old.user_id AND session_id = old.session_id AND turns <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS session_metadata_update AFTER UPDATE OF tokens, created_at ON session_turns BEGIN
+    UPDATE session_metadata SET
+        tokens = tokens - old.tokens + new.tokens,
+        first_activity = MIN(first_activity, new.created_at),
+        last_activity = MAX(last_activity, new.created_at)
+    WHERE user_id = new.user_id AND session_id = new.session_id;
+END;
+"""
+
+# Sesiones con turnos anteriores a session_metadata
+_METADATA_BACKFILL = """
+INSERT OR REPLACE INTO session_metadata
+    (user_id, session_id, turns, tokens, first_activity, last_activity, last_agent)
+SELECT user_id, session_id, COUNT(*), SUM(tokens), MIN(created_at), MAX(created_at),
+    (SELECT agent FROM session_turns AS latest
+     WHERE latest.user_id = t.user_id AND latest.session_id = t.session_id ORDER BY turn DESC LIMIT 1)
+FROM session_turns AS t GROUP BY user_id, session_id
+"""
+
+# Marcadores de los términos encontrados en los fragmentos de search_turns
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+# Columnas añadidas después de la primera versión de session_turns
+_ADDED_COLUMNS = {"agent": "TEXT", "duration_ms": "REAL", "tier": "TEXT"}
+
+_schema_ready = set()
+
+
+@dataclass
+class Turn:
+    """Un intercambio consulta/respuesta de una sesión."""
+    turn: int
+    query: str
+    answer: str
+    tokens: int
+    created_at: float
+
+
+@dataclass
+class SessionMetadata:
+    """Resumen de una sesión mantenido en ``session_metadata``."""
+    session_id: str
+    turns: int
+    tokens: int
+    first_activity: float
+    last_activity: float
+    last_agent: Optional[str] = None
+
+
+@dataclass
+class SessionSummary:
+    """Resumen acumulado de los turnos ``1..through_turn``."""
+    summary: str
+    through_turn: int
+    tokens: int
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata (~4 caracteres por token) suficiente para presupuestar."""
+    return len(text) // 4 + 1 if text else 0
+
+
+def get_turns_connection():
+    """Conexión a la DB de sesiones con las tablas de turnos creadas."""
+    conn = get_connection()
+    path = os.path.abspath(settings.db_file_path)
+    if path not in _schema_ready:
+        had_index = table_exists(conn, "session_turns_fts")
+        had_metadata = table_exists(conn, "session_metadata")
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(session_turns)")}
+        for name, kind in _ADDED_COLUMNS.items():
+            if name not in columns:
+                conn.execute(f"ALTER TABLE session_turns ADD COLUMN {name} {kind}")
+        if not had_index:
+            # Bases de datos anteriores al índice: indexar los turnos ya guardados
+            conn.execute("INSERT INTO session_turns_fts(session_turns_fts) VALUES ('rebuild')")
+        if not had_metadata:
+            conn.execute(_METADATA_BACKFILL)
+        _schema_ready.add(path)
+    return conn
+
+
+def append_turn(user: str, session_id: str, query: str, answer: str,
+                agent: Optional[str] = None, duration_ms: Optional[float] = None,
+                tier: Optional[str] = None) -> Turn:
+    """Añade un turno al final de la sesión y lo devuelve."""
+    conn = get_turns_connection()
+    tokens = estimate_tokens(query) + estimate_tokens(answer)
+    now = time.time()
+    with transaction(conn):
+        (last_turn,) = conn.execute(
+            "SELECT COALESCE(MAX(turn), 0) FROM session_turns WHERE user_id = ? AND session_id = ?",
+            (user, session_id),
+        ).fetchone()
+        conn.execute(
+            "INSERT INTO session_turns "
+            "(user_id, session_id, turn, query, answer, tokens, created_at, agent, duration_ms, tier) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user, session_id, last_turn + 1, query, answer, tokens, now, agent, duration_ms, tier),
+        )
+    return Turn(turn=last_turn + 1, query=query, answer=answer, tokens=tokens, created_at=now)
+
+
+def get_turns(user: str, session_id: str, after_turn: int = 0) -> List[Turn]:
+    """Turnos de la sesión posteriores a ``after_turn``, en orden."""
+    rows = get_turns_connection().execute(
+        "SELECT turn, query, answer, tokens, created_at FROM session_turns "
+        "WHERE user_id = ? AND session_id = ? AND turn > ? ORDER BY turn",
+        (user, session_id, after_turn),
+    ).fetchall()
+    return [Turn(*row) for row in rows]
+
+
+def get_summary(user: str, session_id: str) -> Optional[SessionSummary]:
+    row = get_turns_connection().execute(
+        "SELECT summary, through_turn, tokens FROM session_summaries WHERE user_id = ? AND session_id = ?",
+        (user, session_id),
+    ).fetchone()
+    return SessionSummary(*row) if row else None
+
+
+def save_summary(user: str, session_id: str, summary: str, through_turn: int) -> SessionSummary:
+    """Reemplaza el resumen acumulado de la sesión."""
+    conn = get_turns_connection()
+    tokens = estimate_tokens(summary)
+    with transaction(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO session_summaries "
+            "(user_id, session_id, summary, through_turn, tokens, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (user, session_id, summary, through_turn, tokens, time.time()),
+        )
+    return SessionSummary(summary=summary, through_turn=through_turn, tokens=tokens)
+
+
+def list_session_metadata(user: str) -> List[SessionMetadata]:
+    """Sesiones del usuario con turnos registrados, la más reciente primero."""
+    rows = get_turns_connection().execute(
+        "SELECT session_id, turns, tokens, first_activity, last_activity, last_agent "
+        "FROM session_metadata WHERE user_id = ? ORDER BY last_activity DESC",
+        (user,),
+    ).fetchall()
+    return [SessionMetadata(*row) for row in rows]
+
+
+def delete_session_turns(user: str, session_id: str) -> int:
+    """Borra los turnos y el resumen de una sesión; devuelve los turnos borrados."""
+    conn = get_turns_connection()
+    with transaction(conn):
+        cursor = conn.execute(
+            "DELETE FROM session_turns WHERE user_id = ? AND session_id = ?", (user, session_id)
+        )
+        conn.execute(
+            "DELETE FROM session_summaries WHERE user_id = ? AND session_id = ?", (user, session_id)
+        )
+    return cursor.rowcount
+
+
+def delete_inactive_turns(user: str, cutoff: float) -> int:
+    """Borra los turnos y resúmenes de las sesiones del usuario sin actividad desde ``cutoff``."""
+    conn = get_turns_connection()
+    with transaction(conn):
+        cursor = conn.execute(
+            "DELETE FROM session_turns WHERE user_id = ? AND session_id IN ("
+            "SELECT session_id FROM session_turns WHERE user_id = ? "
+            "GROUP BY session_id HAVING MAX(created_at) < ?)",
+            (user, user, cutoff),
+        )
+        conn.execute(
+            "DELETE FROM session_summaries WHERE user_id = ? AND session_id NOT IN ("
+            "SELECT DISTINCT session_id FROM session_turns WHERE user_id = ?)",
+            (user, user),
+        )
+    return cursor.rowcount
+
+
+@dataclass
+class TurnMatch:
+    """Turno encontrado por ``search_turns``, con fragmentos resaltados."""
+    user_id: str
+    session_id: str
+    turn: int
+    created_at: float
+    query_snippet: str
+    answer_snippet: str
+    rank: float
+    session_matches: int = 1
+    _row_id: int = field(default=0, repr=False)
+
+
+def to_match_expression(text: str, match_any: bool = False) -> str:
+    """Convierte texto libre en una expresión FTS5 segura (términos entre comillas)."""
+    terms = [f'"{term}"' for term in re.findall(r"\w+", text)]
+    return (" OR " if match_any else " ").join(terms)
+
+
+def search_turns(
+    text: str,
+    user: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: int = 10,
+    match_any: bool = False,
+    group_sessions: bool = True,
+) -> List[TurnMatch]:
+    """
+    Busca en las consultas y respuestas guardadas, ordenando por relevancia (BM25).
+
+    Las coincidencias en la consulta del usuario pesan el doble que en la
+    respuesta. Con ``group_sessions`` se devuelve el mejor turno de cada sesión
+    junto con cuántos turnos de esa sesión coinciden.
+    """
+    expression = to_match_expression(text, match_any)
+    if not expression:
+        return []
+
+    filters, params = [], [expression]
+    if user:
+        filters.append("t.user_id = ?")
+        params.append(user)
+    if since is not None:
+        filters.append("t.created_at >= ?")
+        params.append(since)
+    if until is not None:
+        filters.append("t.created_at < ?")
+        params.append(until)
+    where = "".join(f" AND {condition}" for condition in filters)
+    # Agrupando se piden más filas para poder llenar ``limit`` sesiones distintas
+    params.append(limit * 20 if group_sessions else limit)
+
+    conn = get_turns_connection()
+    ranked = [
+        TurnMatch(row[1], row[2], row[3], row[4], "", "", row[5], _row_id=row[0])
+        for row in conn.execute(
+            "SELECT f.rowid, t.user_id, t.session_id, t.turn, t.created_at, "
+            "bm25(session_turns_fts, 2.0, 1.0) AS score "
+            "FROM session_turns_fts f JOIN session_turns t ON t.id = f.rowid "
+            f"WHERE session_turns_fts MATCH ?{where} ORDER BY score LIMIT ?",
+            params,
+        )
+    ]
+    if group_sessions:
+        best = {}
+        for match in ranked:
+            key = (match.user_id, match.session_id)
+            if key in best:
+                best[key].session_matches += 1
+            else:
+                best[key] = match
+        ranked = list(best.values())
+    matches = ranked[:limit]
+    if not matches:
+        return []
+
+    # Los fragmentos (lo más caro) se generan sólo para los resultados finales
+    placeholders = ",".join("?" for _ in matches)
+    snippets = {
+        row_id: (query_snippet, answer_snippet)
+        for row_id, query_snippet, answer_snippet in conn.execute(
+            "SELECT rowid, "
+            f"snippet(session_turns_fts, 0, '{MATCH_START}', '{MATCH_END}', '…', 16), "
+            f"snippet(session_turns_fts, 1, '{MATCH_START}', '{MATCH_END}', '…', 24) "
+            f"FROM session_turns_fts WHERE session_turns_fts MATCH ? AND rowid IN ({placeholders})",
+            [expression, *(match._row_id for match in matches)],
+        )
+    }
+    for match in matches:
+        match.query_snippet, match.answer_snippet = snippets.get(match._row_id, ("", ""))
+    return matches
@@ -0,0 +1,487 @@
+"""
+Índice vectorial local (en disco) del corpus de libros.
+
+Alternativa a Vertex AI Search para cuando el servicio no está disponible o
+para ahorrarse la latencia de red. El índice es un directorio con:
+
+- ``vectors.f16``: matriz de embeddings normalizados (float16), que se abre con
+  ``np.memmap`` para no cargarla entera en memoria.
+- ``ivf.npz`` (opcional): centroides de k-means y offsets de cada lista. Las
+  filas de ``vectors.f16`` se guardan ordenadas por lista, así que sondear una
+  lista es leer un bloque contiguo del memmap.
+- ``chunks.db``: texto y origen de cada fila (SQLite).
+- ``meta.json``: número de filas, dimensiones, modelo de embeddings y listas IVF.
+
+La búsqueda es similitud coseno vectorizada (producto matriz-vector por bloques).
+
+Dependencia: los vectores están en disco, pero cada consulta se convierte en
+embedding con la API de Gemini (``embed_query``, cacheado por consulta
+normalizada), así que el índice local sigue necesitando red y cuota de Gemini.
+Sin ellas, en ``rag_backend=hybrid`` la búsqueda falla rápido (sin reintentos)
+y ``VertexSearchTool`` consulta Vertex; en ``local`` el error se propaga.
+
+Uso:
+    python main.py build-local-index --source ./libros
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.config import settings
+from src.core.rate_limit import call_with_retries
+from src.storage.cache import get_cache, make_cache_key, normalize_query
+from src.storage.connection import get_connection, transaction
+from src.storage.tool_memo import TransientResult
+from src.tools.rag_chunks import SearchChunk, clean_text, format_chunks, pack_chunks
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f16"
+IVF_FILE = "ivf.npz"
+CHUNKS_FILE = "chunks.db"
+META_FILE = "meta.json"
+
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".pdf")
+
+NOT_BUILT = "⚠️ El índice local no está construido (usa build-local-index)."
+LOCAL_NO_RESULTS = "⚠️ No encontré resultados en el índice local."
+
+# Filas por bloque al recorrer el memmap (acota la memoria de cada producto)
+BLOCK_ROWS = 8192
+
+_CHUNKS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    row INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+"""
+
+
+def default_index_dir() -> str:
+    """Directorio del índice: junto a la base de datos de agentes."""
+    if settings.local_index_dir:
+        return settings.local_index_dir
+    return os.path.join(os.path.dirname(settings.db_file_path) or ".", "local_index")
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# ---------------------------------------------------------------------------
+# Corpus y embeddings
+# ---------------------------------------------------------------------------
+
+def read_document(path: str) -> str:
+    """Texto de un documento del corpus (.txt, .md o .pdf)."""
+    if path.lower().endswith(".pdf"):
+        try:
+            from pypdf import PdfReader
+        except ImportError as e:
+            raise ImportError("Para indexar PDFs instala pypdf: pip install pypdf") from e
+        return "\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+def iter_corpus_files(source: str) -> List[str]:
+    """Archivos indexables bajo ``source`` (un archivo o un directorio)."""
+    if os.path.isfile(source):
+        return [source]
+    paths = []
+    for root, _, files in os.walk(source):
+        paths.extend(
+            os.path.join(root, name) for name in files if name.lower().endswith(SUPPORTED_EXTENSIONS)
+        )
+    return sorted(paths)
+
+
+def chunk_text(text: str, chunk_words: int, overlap_words: int) -> List[str]:
+    """Divide un texto en fragmentos de ``chunk_words`` palabras con solapamiento."""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap_words)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+def iter_chunks(source: str, chunk_words: int = 300, overlap_words: int = 50) -> Iterator[Tuple[str, str]]:
+    """(origen, fragmento) de todos los documentos del corpus."""
+    for path in iter_corpus_files(source):
+        try:
+            text = read_document(path)
+        except ImportError:
+            raise
+        except Exception as e:
+            logger.warning(f"Skipping unreadable document {path}: {e}")
+            continue
+        for chunk in chunk_text(text, chunk_words, overlap_words):
+            yield os.path.relpath(path, source) if os.path.isdir(source) else os.path.basename(path), chunk
+
+
+class GeminiTextEmbedder:
+    """Embeddings de Gemini por lotes (``embed_content`` acepta varias entradas)."""
+
+    def __init__(self, model: Optional[str] = None, dimensions: Optional[int] = None):
+        self.model = model or settings.embedding_model
+        self.dimensions = dimensions or settings.embedding_dimensions
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai
+
+            self._client = genai.Client(api_key=settings.google_api_key)
+        return self._client
+
+    def embed(self, texts: Sequence[str], task_type: str = "RETRIEVAL_DOCUMENT",
+              max_retries: Optional[int] = None) -> np.ndarray:
+        """Matriz (len(texts), dimensiones) de embeddings normalizados."""
+        response = call_with_retries("gemini", lambda: self.client.models.embed_content(
+            model=self.model,
+            contents=list(texts),
+            config={"output_dimensionality": self.dimensions, "task_type": task_type},
+        ), model=self.model, max_retries=max_retries)
+        matrix = np.asarray([e.values for e in response.embeddings], dtype=np.float32)
+        return _normalize_rows(matrix)
+
+    def embed_query(self, query: str, max_retries: Optional[int] = None) -> np.ndarray:
+        """Embedding normalizado de una consulta, cacheado por consulta normalizada."""
+        cache = get_cache(
+            "query_embeddings",
+            ttl_seconds=settings.search_cache_ttl_seconds,
+            max_memory_entries=settings.search_cache_memory_entries,
+            max_disk_entries=settings.search_cache_disk_entries,
+        )
+        key = make_cache_key(self.model, self.dimensions, normalize_query(query))
+        cached = cache.get(key)
+        if cached is not None:
+            return np.asarray(cached, dtype=np.float32)
+        vector = self.embed([query], task_type="RETRIEVAL_QUERY", max_retries=max_retries)[0]
+        cache.set(key, vector.tolist())
+        return vector
+
+
+# ---------------------------------------------------------------------------
+# Construcción del índice
+# ---------------------------------------------------------------------------
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, sample_size: int = 50000,
+              seed: int = 0) -> np.ndarray:
+    """Centroides de k-means esférico (coseno) sobre una muestra de las filas."""
+    rng = np.random.default_rng(seed)
+    count = vectors.shape[0]
+    sample_rows = np.sort(rng.choice(count, size=min(count, sample_size), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for list_id in range(nlist):
+            members = sample[assignments == list_id]
+            if len(members):
+                centroids[list_id] = members.sum(axis=0)
+        centroids = _normalize_rows(centroids)
+    return centroids
+
+
+def _assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+        assignments[start:start + BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def write_index(
+    directory: str,
+    chunks: Iterable[Tuple[str, str]],
+    embed_batch,
+    dimensions: int,
+    model: str = "",
+    nlist: int = 0,
+    batch_size: int = 64,
+    on_batch=None,
+) -> int:
+    """
+    Construye el índice en ``directory`` y devuelve el número de fragmentos.
+
+    ``embed_batch(textos)`` devuelve la matriz normalizada de cada lote; los
+    vectores se escriben al disco lote a lote, así que el corpus no tiene que
+    caber en memoria. Con ``nlist > 0`` se entrena un IVF y se reordenan las filas.
+    """
+    os.makedirs(directory, exist_ok=True)
+    raw_path = os.path.join(directory, VECTORS_FILE + ".tmp")
+    chunks_path = os.path.join(directory, CHUNKS_FILE + ".tmp")
+    for path in (raw_path, chunks_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    # Conexión propia (no la compartida del hilo): el archivo se renombra al terminar
+    texts_conn = sqlite3.connect(chunks_path, isolation_level=None)
+    texts_conn.executescript(_CHUNKS_SCHEMA)
+    count = 0
+    with open(raw_path, "wb") as raw:
+        for batch in _batched(chunks, batch_size):
+            matrix = embed_batch([text for _, text in batch])
+            if matrix.shape != (len(batch), dimensions):
+                raise ValueError(f"Embeddings con forma {matrix.shape}, se esperaba ({len(batch)}, {dimensions})")
+            raw.write(matrix.astype(np.float16).tobytes())
+            with transaction(texts_conn):
+                texts_conn.executemany(
+                    "INSERT INTO chunks (row, source, text) VALUES (?, ?, ?)",
+                    [(count + i, source, text) for i, (source, text) in enumerate(batch)],
+                )
+            count += len(batch)
+            if on_batch is not None:
+                on_batch(count)
+
+    if count == 0:
+        texts_conn.close()
+        for path in (raw_path, chunks_path):
+            os.remove(path)
+        return 0
+
+    vectors = np.memmap(raw_path, dtype=np.float16, mode="r", shape=(count, dimensions))
+    nlist = min(nlist, count)
+    ivf_path = os.path.join(directory, IVF_FILE)
+    if nlist > 1:
+        centroids = train_ivf(vectors, nlist)
+        assignments = _assign_lists(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=nlist))])
+        sorted_path = raw_path + ".ivf"
+        with open(sorted_path, "wb") as out:
+            for start in range(0, count, BLOCK_ROWS):
+                out.write(np.asarray(vectors[order[start:start + BLOCK_ROWS]]).tobytes())
+        del vectors
+        os.replace(sorted_path, raw_path)
+        # La fila i del índice reordenado es el fragmento order[i] original
+        with transaction(texts_conn):
+            texts_conn.execute("UPDATE chunks SET row = -row - 1")
+            texts_conn.executemany(
+                "UPDATE chunks SET row = ? WHERE row = ?",
+                [(new_row, -int(old_row) - 1) for new_row, old_row in enumerate(order)],
+            )
+        np.savez(ivf_path + ".tmp.npz", centroids=centroids.astype(np.float32), offsets=offsets.astype(np.int64))
+        os.replace(ivf_path + ".tmp.npz", ivf_path)
+    else:
+        del vectors
+        if os.path.exists(ivf_path):
+            os.remove(ivf_path)
+
+    texts_conn.close()
+    os.replace(raw_path, os.path.join(directory, VECTORS_FILE))
+    os.replace(chunks_path, os.path.join(directory, CHUNKS_FILE))
+    with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "count": count,
+            "dimensions": dimensions,
+            "model": model,
+            "nlist": nlist if nlist > 1 else 0,
+            "created_at": time.time(),
+        }, f, indent=2)
+    return count
+
+
+def build_local_index(
+    source: str,
+    directory: Optional[str] = None,
+    nlist: Optional[int] = None,
+    chunk_words: int = 300,
+    overlap_words: int = 50,
+    batch_size: int = 64,
+    on_batch=None,
+) -> int:
+    """Fragmenta el corpus, obtiene sus embeddings con Gemini y escribe el índice."""
+    embedder = GeminiTextEmbedder()
+    return write_index(
+        directory or default_index_dir(),
+        iter_chunks(source, chunk_words, overlap_words),
+        embedder.embed,
+        dimensions=embedder.dimensions,
+        model=embedder.model,
+        nlist=settings.local_index_nlist if nlist is None else nlist,
+        batch_size=batch_size,
+        on_batch=on_batch,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Consulta
+# ---------------------------------------------------------------------------
+
+@dataclass
+class LocalHit:
+    """Fragmento recuperado del índice local."""
+    row: int
+    score: float
+    source: str
+    text: str
+
+
+class LocalVectorIndex:
+    """Índice abierto en modo lectura (memmap); seguro para usar desde varios hilos."""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.directory = directory
+        self.count = int(self.meta["count"])
+        self.dimensions = int(self.meta["dimensions"])
+        self.vectors = np.memmap(
+            os.path.join(directory, VECTORS_FILE), dtype=np.float16, mode="r",
+            shape=(self.count, self.dimensions),
+        )
+        self.centroids: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        if self.meta.get("nlist"):
+            with np.load(os.path.join(directory, IVF_FILE)) as ivf:
+                self.centroids = ivf["centroids"]
+                self.offsets = ivf["offsets"]
+        self.chunks_path = os.path.join(directory, CHUNKS_FILE)
+
+    @property
+    def nlist(self) -> int:
+        return 0 if self.centroids is None else self.centroids.shape[0]
+
+    def _scan(self, vector: np.ndarray, start: int, end: int) -> np.ndarray:
+        scores = np.empty(end - start, dtype=np.float32)
+        for block in range(start, end, BLOCK_ROWS):
+            stop = min(block + BLOCK_ROWS, end)
+            scores[block - start:stop - start] = np.asarray(self.vectors[block:stop], dtype=np.float32) @ vector
+        return scores
+
+    def top_k(self, vector: np.ndarray, k: int, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(fila, similitud) de los ``k`` vecinos más cercanos; ``nprobe=0`` fuerza búsqueda exacta."""
+        vector = np.asarray(vector, dtype=np.float32)
+        if nprobe is None:
+            nprobe = settings.local_index_nprobe
+        if self.centroids is None or nprobe <= 0 or nprobe >= self.nlist:
+            rows = np.arange(self.count)
+            scores = self._scan(vector, 0, self.count)
+        else:
+            lists = np.argsort(self.centroids @ vector)[::-1][:nprobe]
+            spans = [(int(self.offsets[l]), int(self.offsets[l + 1])) for l in lists]
+            spans = [(start, end) for start, end in spans if end > start]
+            if not spans:
+                return []
+            rows = np.concatenate([np.arange(start, end) for start, end in spans])
+            scores = np.concatenate([self._scan(vector, start, end) for start, end in spans])
+
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def fetch(self, hits: Sequence[Tuple[int, float]]) -> List[LocalHit]:
+        """Texto y origen de las filas encontradas, en el mismo orden."""
+        if not hits:
+            return []
+        placeholders = ",".join("?" for _ in hits)
+        rows = get_connection(self.chunks_path).execute(
+            f"SELECT row, source, text FROM chunks WHERE row IN ({placeholders})",
+            [row for row, _ in hits],
+        ).fetchall()
+        by_row = {row: (source, text) for row, source, text in rows}
+        return [
+            LocalHit(row=row, score=score, source=by_row[row][0], text=by_row[row][1])
+            for row, score in hits
+            if row in by_row
+        ]
+
+    def search(self, vector: np.ndarray, k: int = 3, nprobe: Optional[int] = None) -> List[LocalHit]:
+        return self.fetch(self.top_k(vector, k, nprobe))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_local_index(directory: Optional[str] = None) -> Optional[LocalVectorIndex]:
+    """
+    Índice del proceso (se abre una vez); None si aún no se ha construido.
+
+    Tras reconstruir el índice hay que reiniciar los procesos que lo usan.
+    """
+    directory = directory or default_index_dir()
+    with _indexes_lock:
+        if directory not in _indexes:
+            if not os.path.exists(os.path.join(directory, META_FILE)):
+                return None
+            _indexes[directory] = LocalVectorIndex(directory)
+        return _indexes[directory]
+
+
+class LocalSearchTool:
+    """
+    Búsqueda en el índice local con la misma interfaz que ``VertexSearchTool``.
+
+    ``embed_retries`` limita los reintentos del embedding de la consulta; con
+    0, un fallo de Gemini se propaga enseguida para poder usar otro backend.
+    """
+
+    def __init__(self, directory: Optional[str] = None, embedder: Optional[GeminiTextEmbedder] = None,
+                 embed_retries: Optional[int] = None):
+        self.directory = directory or default_index_dir()
+        self.embedder = embedder or GeminiTextEmbedder()
+        self.embed_retries = embed_retries
+
+    @property
+    def index(self) -> Optional[LocalVectorIndex]:
+        return get_local_index(self.directory)
+
+    def search_hits(self, query: str, page_size: int = 3) -> List[LocalHit]:
+        index = self.index
+        if index is None:
+            return []
+        return index.search(self.embedder.embed_query(query, max_retries=self.embed_retries), page_size)
+
+    def search_chunks(self, query: str, page_size: int = 5, min_score: float = 0.0) -> List[SearchChunk]:
+        """Pasajes con similitud >= ``min_score``, como los de ``VertexSearchTool``."""
+        return [
+            SearchChunk(
+                document_id=f"{hit.source}#{hit.row}",
+                text=clean_text(hit.text),
+                score=hit.score,
+                title=os.path.basename(hit.source),
+            )
+            for hit in self.search_hits(query, page_size)
+            if hit.score >= min_score
+        ]
+
+    def search(self, query: str, page_size: int = 5) -> str:
+        if self.index is None:
+            return TransientResult(NOT_BUILT)
+        chunks = pack_chunks(self.search_chunks(query, page_size), settings.rag_token_budget)
+        if not chunks:
+            return TransientResult(LOCAL_NO_RESULTS)
+        return format_chunks(chunks)
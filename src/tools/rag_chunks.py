@@ -0,0 +1,112 @@
+"""
+Pasajes estructurados para las herramientas RAG y su empaquetado por tokens.
+
+Vertex AI Search y el índice local devuelven ``SearchChunk`` (documento,
+título, puntuación y texto completo del pasaje). En lugar de truncar cada
+pasaje a un número fijo de caracteres, ``pack_chunks`` añade los de mayor
+puntuación hasta llenar un presupuesto de tokens; si el último no cabe
+entero se recorta en un final de frase, así el modelo no recibe frases a
+medias ni necesita repetir la búsqueda con más resultados.
+"""
+import json
+import re
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional
+
+from src.storage.turns import estimate_tokens
+
+# Por debajo de este resto de presupuesto no se recorta un pasaje: se prueba con el siguiente
+MIN_PARTIAL_TOKENS = 40
+_SENTENCE_END = re.compile(r"[.!?…](?=\s|$)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class SearchChunk:
+    """Un pasaje recuperado de la base de conocimiento."""
+    document_id: str
+    text: str
+    score: Optional[float] = None
+    title: str = ""
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SearchChunk":
+        return cls(**data)
+
+
+def clean_text(text: str) -> str:
+    """Colapsa espacios y saltos de línea (los pasajes de PDF vienen con muchos)."""
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def rank_chunks(chunks: Iterable[SearchChunk]) -> List[SearchChunk]:
+    """Pasajes por puntuación descendente; los que no tienen conservan su orden (el de relevancia) al final."""
+    return sorted(chunks, key=lambda chunk: -(chunk.score if chunk.score is not None else float("-inf")))
+
+
+def _trim_to_sentence(text: str, max_tokens: int) -> str:
+    """Prefijo de ``text`` de como mucho ``max_tokens`` que termina en un final de frase."""
+    head = text[: max_tokens * 4]
+    ends = [match.end() for match in _SENTENCE_END.finditer(head)]
+    return head[: ends[-1]] if ends else ""
+
+
+def pack_chunks(chunks: Iterable[SearchChunk], token_budget: int, by_score: bool = True) -> List[SearchChunk]:
+    """
+    Pasajes que caben en ``token_budget``, sin duplicados.
+
+    Con ``by_score`` se ordenan por puntuación (los que no tienen conservan el
+    orden de llegada, que ya es el de relevancia); si no, se respeta el orden
+    recibido (p.ej. intercalado por consulta).
+    """
+    ordered = rank_chunks(chunks) if by_score else list(chunks)
+
+    packed, seen, remaining = [], set(), token_budget
+    for chunk in ordered:
+        key = clean_text(chunk.text).lower()
+        if not key or key in seen:
+            continue
+        cost = estimate_tokens(chunk.text)
+        if cost > remaining:
+            if remaining < MIN_PARTIAL_TOKENS:
+                continue
+            text = _trim_to_sentence(chunk.text, remaining)
+            if not text:
+                continue
+            chunk = SearchChunk(chunk.document_id, text, chunk.score, chunk.title)
+            cost = estimate_tokens(text)
+        seen.add(key)
+        packed.append(chunk)
+        remaining -= cost
+        if remaining < MIN_PARTIAL_TOKENS:
+            break
+    return packed
+
+
+def interleave(groups: Iterable[List[SearchChunk]]) -> List[SearchChunk]:
+    """Primer pasaje de cada grupo, luego el segundo, etc. (reparto justo entre consultas)."""
+    groups = [list(group) for group in groups]
+    merged = []
+    for rank in range(max((len(group) for group in groups), default=0)):
+        merged.extend(group[rank] for group in groups if rank < len(group))
+    return merged
+
+
+def format_chunks(chunks: List[SearchChunk]) -> str:
+    """Pasajes como lista JSON (``id``, ``title``, ``score``, ``text``) para el modelo."""
+    return json.dumps(
+        [
+            {
+                "id": chunk.document_id,
+                "title": chunk.title,
+                "score": round(chunk.score, 3) if chunk.score is not None else None,
+                "text": chunk.text,
+            }
+            for chunk in chunks
+        ],
+        ensure_ascii=False,
+        indent=1,
+    )
@@ -2,44 +2,403 @@
 Módulo para consultar un Data Store de Vertex AI Search (Discovery Engine)
 que contiene embeddings de libros de ingeniería de datos.
 
+Las búsquedas piden a Discovery Engine segmentos extractivos o chunks (según
+``vertex_search_result_mode``) en lugar del documento completo y devuelven
+pasajes estructurados (``SearchChunk``) que las herramientas empaquetan hasta
+``rag_token_budget`` tokens, los más relevantes primero.
+
 Autor: Jonatan Polanco
 Fecha: Septiembre 2025
 """
 
+import asyncio
+import logging
 import os
-from google.cloud import discoveryengine_v1 as discovery
+import re
+import threading
+from typing import Dict, List, Optional
+
+from src.core.rate_limit import acall_with_retries, call_with_retries
+from src.storage.cache import TieredCache, get_cache, make_cache_key, normalize_query
+from src.storage.tool_memo import TransientResult
+from src.tools.rag_chunks import SearchChunk, clean_text, format_chunks, interleave, pack_chunks, rank_chunks
 
 project_id= os.environ.get("GOOGLE_PROJECT_ID")
 data_store_id= os.environ.get("DATA_STORE_ID")
 
+logger = logging.getLogger(__name__)
+
+# Backends de RAG (settings.rag_backend)
+VERTEX_BACKEND = "vertex"
+LOCAL_BACKEND = "local"
+HYBRID_BACKEND = "hybrid"
+
+# Qué pide cada búsqueda a Discovery Engine (settings.vertex_search_result_mode)
+SEGMENTS_MODE = "segments"
+CHUNKS_MODE = "chunks"
+DOCUMENTS_MODE = "documents"
+
+NO_RESULTS = "⚠️ No encontré resultados en el Data Store."
+_HTML_TAG = re.compile(r"</?\w+[^>]*>")
+
+# Cliente gRPC compartido por todas las instancias; se crea en la primera búsqueda
+_search_client = None
+_search_client_lock = threading.Lock()
+
+# Event loop propio (en un hilo daemon) para el cliente asíncrono: los canales
+# gRPC asyncio quedan ligados al loop en el que se crean
+_search_loop: Optional[asyncio.AbstractEventLoop] = None
+_async_search_client = None
+
+
+def get_search_client():
+    """Devuelve el ``SearchServiceClient`` del proceso, creándolo en el primer uso."""
+    global _search_client
+    with _search_client_lock:
+        if _search_client is None:
+            from google.cloud import discoveryengine_v1 as discovery
+
+            _search_client = discovery.SearchServiceClient()
+        return _search_client
+
+
+def _get_search_loop() -> asyncio.AbstractEventLoop:
+    global _search_loop
+    with _search_client_lock:
+        if _search_loop is None:
+            _search_loop = asyncio.new_event_loop()
+            threading.Thread(target=_search_loop.run_forever, name="vertex-search-loop", daemon=True).start()
+        return _search_loop
+
+
+def run_search_coroutine(coroutine):
+    """Ejecuta una corrutina de búsqueda en el loop del proceso y espera su resultado."""
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_search_loop()).result()
+
+
+def get_async_search_client():
+    """``SearchServiceAsyncClient`` del proceso (se usa sólo desde el loop de búsquedas)."""
+    global _async_search_client
+    if _async_search_client is None:
+        from google.cloud import discoveryengine_v1 as discovery
+
+        _async_search_client = discovery.SearchServiceAsyncClient()
+    return _async_search_client
+
+
+def get_search_cache() -> Optional[TieredCache]:
+    """Caché compartida de resultados de Vertex AI Search (None si está deshabilitada)."""
+    from src.config import settings
+
+    if not settings.search_cache_enabled:
+        return None
+    return get_cache(
+        "vertex_search",
+        ttl_seconds=settings.search_cache_ttl_seconds,
+        max_memory_entries=settings.search_cache_memory_entries,
+        max_disk_entries=settings.search_cache_disk_entries,
+    )
+
+
+def _result_score(result) -> Optional[float]:
+    """Puntuación de relevancia del documento (``relevance_score_spec``), si la hay."""
+    scores = getattr(result, "model_scores", None)
+    relevance = scores.get("relevance_score") if scores else None
+    values = list(relevance.values) if relevance is not None else []
+    return float(values[0]) if values else None
+
+
+def _chunk_from_result(result) -> Optional[SearchChunk]:
+    """Pasaje de un resultado en modo ``chunks`` (None si el resultado es un documento)."""
+    chunk = getattr(result, "chunk", None)
+    if chunk is None or not chunk.content:
+        return None
+    score = chunk.relevance_score if "relevance_score" in chunk else _result_score(result)
+    metadata = chunk.document_metadata
+    return SearchChunk(
+        document_id=chunk.id or result.id,
+        text=clean_text(chunk.content),
+        score=score,
+        title=metadata.title or metadata.uri,
+    )
+
+
+def _chunks_from_results(results) -> List[SearchChunk]:
+    """
+    Convierte una página de resultados en pasajes.
+
+    Por documento se usan, en este orden, sus segmentos extractivos, el campo
+    ``content`` o los snippets.
+    """
+    chunks = []
+    for result in results:
+        chunk = _chunk_from_result(result)
+        if chunk is not None:
+            chunks.append(chunk)
+            continue
+        document = result.document
+        # derived_struct_data es un MapComposite (sus listas y objetos anidados también admiten get)
+        data = document.derived_struct_data or {}
+        document_id = result.id or document.id
+        title = data.get("title") or data.get("link") or document_id
+        score = _result_score(result)
+        segments = [segment for segment in data.get("extractive_segments") or [] if segment.get("content")]
+        if segments:
+            for segment in segments:
+                segment_score = segment.get("relevanceScore")
+                chunks.append(SearchChunk(
+                    document_id=document_id,
+                    text=clean_text(segment.get("content")),
+                    score=float(segment_score) if segment_score is not None else score,
+                    title=title,
+                ))
+            continue
+        snippets = [
+            _HTML_TAG.sub("", snippet.get("snippet") or "")
+            for snippet in data.get("snippets") or []
+            if snippet.get("snippet_status", "SUCCESS") == "SUCCESS"
+        ]
+        text = clean_text(data.get("content") or " ".join(snippets))
+        if text:
+            chunks.append(SearchChunk(document_id=document_id, text=text, score=score, title=title))
+    return chunks
+
 
 class VertexSearchTool:
-    """Wrapper para hacer consultas al Data Store de Vertex AI Search."""
+    """
+    Wrapper para hacer consultas al Data Store de Vertex AI Search.
 
-    def __init__(self, project_id: str, data_store_id: str, location: str = "global"):
-        self.client = discovery.SearchServiceClient()
+    Con ``backend="local"`` o ``"hybrid"`` (por defecto ``settings.rag_backend``)
+    consulta primero el índice vectorial local; en ``hybrid`` sólo se llama a
+    Vertex si el índice no existe, ningún pasaje supera ``local_index_min_score``
+    o falla el embedding de la consulta (Gemini sin cuota o sin red).
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        data_store_id: str,
+        location: str = "global",
+        cache: Optional[TieredCache] = None,
+        backend: Optional[str] = None,
+        result_mode: Optional[str] = None,
+    ):
+        from src.config import settings
+
+        self._client = None
+        self.result_mode = result_mode or settings.vertex_search_result_mode
         self.serving_config = (
             f"projects/{project_id}/locations/{location}/collections/default_collection/"
             f"dataStores/{data_store_id}/servingConfigs/default_search"
         )
+        self.cache = cache if cache is not None else get_search_cache()
+        self.backend = backend or settings.rag_backend
+        self.local = None
+        if self.backend in (LOCAL_BACKEND, HYBRID_BACKEND):
+            from src.tools.local_index import LocalSearchTool
+
+            # En hybrid un fallo de Gemini (cuota, red) no se reintenta: se pasa a Vertex
+            self.local = LocalSearchTool(embed_retries=0 if self.backend == HYBRID_BACKEND else None)
 
-    def search(self, query: str, page_size: int = 3) -> str:
-        """Ejecuta búsqueda semántica en el Data Store y devuelve texto concatenado."""
-        request = discovery.SearchRequest(
+    def _local_chunks(self, query: str, page_size: int) -> Optional[List[SearchChunk]]:
+        """Pasajes del índice local, o None si hay que consultar Vertex."""
+        if self.local is None:
+            return None
+        from src.config import settings
+
+        min_score = settings.local_index_min_score if self.backend == HYBRID_BACKEND else 0.0
+        try:
+            chunks = self.local.search_chunks(query, page_size, min_score=min_score)
+        except Exception as e:
+            if self.backend == LOCAL_BACKEND:
+                raise
+            logger.warning(f"Local index search failed, falling back to Vertex: {e}")
+            return None
+        if chunks or self.backend == LOCAL_BACKEND:
+            return chunks
+        return None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_search_client()
+        return self._client
+
+    def _cache_key(self, query: str, page_size: int) -> str:
+        return make_cache_key("chunks", normalize_query(query), page_size, self.result_mode, self.serving_config)
+
+    def _cached(self, cache_key: str) -> Optional[List[SearchChunk]]:
+        cached = self.cache.get(cache_key) if self.cache is not None else None
+        return [SearchChunk.from_dict(item) for item in cached] if cached is not None else None
+
+    def _store(self, cache_key: str, chunks: List[SearchChunk]) -> None:
+        if chunks and self.cache is not None:
+            self.cache.set(cache_key, [chunk.to_dict() for chunk in chunks])
+
+    def _request(self, query: str, page_size: int):
+        from src.config import settings
+        from google.cloud import discoveryengine_v1 as discovery
+
+        spec = discovery.SearchRequest.ContentSearchSpec
+        if self.result_mode == CHUNKS_MODE:
+            content_spec = spec(
+                search_result_mode=spec.SearchResultMode.CHUNKS,
+                chunk_spec=spec.ChunkSpec(num_previous_chunks=0, num_next_chunks=0),
+            )
+        elif self.result_mode == SEGMENTS_MODE:
+            content_spec = spec(extractive_content_spec=spec.ExtractiveContentSpec(
+                max_extractive_segment_count=settings.vertex_search_segments_per_document,
+                return_extractive_segment_score=True,
+            ))
+        else:
+            content_spec = None
+        return discovery.SearchRequest(
             serving_config=self.serving_config,
             query=query,
             page_size=page_size,
+            content_search_spec=content_spec,
+            relevance_score_spec=discovery.SearchRequest.RelevanceScoreSpec(return_relevance_score=True),
         )
-        response = self.client.search(request=request)
 
-        results = []
-        for result in response:
-            # derived_struct_data es un MapComposite, lo pasamos a dict
-            struct_data = dict(result.document.derived_struct_data)
-            text = struct_data.get("content") or str(struct_data)
-            results.append(f"- {text[:500]}...")  # truncamos para no pasarnos de tokens
+    def search_chunks(self, query: str, page_size: int = 5) -> List[SearchChunk]:
+        """Pasajes de los ``page_size`` documentos más relevantes (con caché)."""
+        chunks = self._local_chunks(query, page_size)
+        if chunks is not None:
+            return chunks
+
+        cache_key = self._cache_key(query, page_size)
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return cached
+
+        request = self._request(query, page_size)
+        response = call_with_retries("vertex", lambda: self.client.search(request=request))
+        # Sólo la primera página: iterar el pager pediría las siguientes
+        chunks = _chunks_from_results(response.results)
+        self._store(cache_key, chunks)
+        return chunks
+
+    def search(self, query: str, page_size: int = 5) -> str:
+        """Busca en la base de conocimiento (libros y documentación de ingeniería de datos).
+
+        Devuelve pasajes completos, los más relevantes primero, hasta llenar el
+        presupuesto de tokens: una llamada por pregunta suele bastar.
+
+        Args:
+            query: Consulta en lenguaje natural.
+            page_size: Número de documentos a consultar.
+
+        Returns:
+            Lista JSON de pasajes con id del documento, título, puntuación y texto.
+        """
+        from src.config import settings
+
+        chunks = pack_chunks(self.search_chunks(query, page_size), settings.rag_token_budget)
+        if not chunks:
+            # No se memoriza en la sesión: puede ser un fallo pasajero del Data Store
+            return TransientResult(NO_RESULTS)
+        return format_chunks(chunks)
+
+
+class AsyncVertexSearchTool(VertexSearchTool):
+    """
+    Variante con ``SearchServiceAsyncClient`` que permite varias búsquedas a la vez.
+
+    El agente es síncrono, así que ``search_many`` ejecuta las corrutinas en el
+    event loop de búsquedas del proceso; la latencia total queda acotada por la
+    búsqueda más lenta y no por la suma de todas.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        data_store_id: str,
+        location: str = "global",
+        cache: Optional[TieredCache] = None,
+        backend: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        result_mode: Optional[str] = None,
+    ):
+        super().__init__(project_id, data_store_id, location, cache, backend, result_mode)
+        if max_concurrency is None:
+            from src.config import settings
+
+            max_concurrency = settings.vertex_search_max_concurrency
+        self.max_concurrency = max(1, max_concurrency)
+
+    async def asearch_chunks(self, query: str, page_size: int = 5) -> List[SearchChunk]:
+        """Versión asíncrona de ``search_chunks``."""
+        if self.local is not None:
+            # Producto matriz-vector en un hilo para no bloquear el resto de búsquedas
+            chunks = await asyncio.get_running_loop().run_in_executor(None, self._local_chunks, query, page_size)
+            if chunks is not None:
+                return chunks
+
+        cache_key = self._cache_key(query, page_size)
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return cached
+
+        client = get_async_search_client()
+        request = self._request(query, page_size)
+        response = await acall_with_retries("vertex", lambda: client.search(request=request))
+        chunks = _chunks_from_results(response.results)
+        self._store(cache_key, chunks)
+        return chunks
+
+    async def asearch_many(self, queries: List[str], page_size: int = 5) -> Dict[str, Optional[List[SearchChunk]]]:
+        """
+        Lanza todas las búsquedas a la vez (como máximo ``max_concurrency`` en vuelo).
+
+        Las consultas que fallan se registran en el log y quedan con ``None``.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(query: str) -> List[SearchChunk]:
+            async with semaphore:
+                return await self.asearch_chunks(query, page_size)
+
+        # Variantes triviales de la misma consulta comparten búsqueda (y entrada de caché)
+        by_key: Dict[str, str] = {}
+        for query in queries:
+            if query and query.strip():
+                by_key.setdefault(normalize_query(query), query.strip())
+        unique = list(by_key.values())
+        results = await asyncio.gather(*(bounded(q) for q in unique), return_exceptions=True)
+
+        merged: Dict[str, Optional[List[SearchChunk]]] = {}
+        for query, chunks in zip(unique, results):
+            if isinstance(chunks, BaseException):
+                logger.warning(f"Vertex search failed for '{query}': {chunks}")
+                chunks = None
+            merged[query] = chunks
+        return merged
+
+    def search_many(self, queries: List[str], page_size: int = 5) -> str:
+        """Busca varias consultas relacionadas a la vez (p.ej. un concepto y sus trade-offs).
+
+        Usa esta herramienta en lugar de varias llamadas a ``search`` cuando la
+        pregunta tiene varias facetas. El presupuesto de tokens se reparte entre
+        las consultas (el mejor pasaje de cada una primero) y los pasajes
+        repetidos se devuelven una sola vez.
+
+        Args:
+            queries: Lista de consultas en lenguaje natural.
+            page_size: Número de documentos a consultar por consulta.
+
+        Returns:
+            Lista JSON de pasajes con id del documento, título, puntuación y texto.
+        """
+        from src.config import settings
 
-        return "\n".join(results) if results else "⚠️ No encontré resultados en el Data Store."
+        merged = run_search_coroutine(self.asearch_many(queries, page_size))
+        ranked = [rank_chunks(chunks) for chunks in merged.values() if chunks is not None]
+        chunks = pack_chunks(interleave(ranked), settings.rag_token_budget, by_score=False)
+        if not chunks:
+            return TransientResult(NO_RESULTS)
+        response = format_chunks(chunks)
+        # Con alguna consulta fallida la respuesta está incompleta: no se memoriza en la sesión
+        return TransientResult(response) if len(ranked) < len(merged) else response
 
 
 if __name__ == "__main__":
@@ -0,0 +1,353 @@
+"""
+Búsqueda web del Web Agent con caché y deduplicación.
+
+``CachedDuckDuckGoTools`` extiende el toolkit de DuckDuckGo de agno:
+
+- Resultados por consulta normalizada en ``TieredCache`` (memoria + SQLite),
+  con TTL más corto para noticias que para búsquedas generales.
+- ``fetch_page``: contenido de una URL cacheado por URL. Mientras la copia está
+  fresca (``Cache-Control: max-age`` o ``WEB_PAGE_FRESH_SECONDS``) no hay red;
+  después se revalida con ``If-None-Match``/``If-Modified-Since`` y un 304
+  reutiliza el contenido guardado. Las páginas se desalojan por tamaño total.
+  Como la herramienta se expone también desde ``serve``, sólo se descargan
+  URL http(s) cuyo host resuelve a direcciones públicas, también tras cada
+  redirección (nada de loopback, redes privadas, link-local ni reservadas).
+  La conexión se hace a la IP verificada, sin una segunda resolución DNS.
+- Dentro de una misma ejecución del agente (un turno), los resultados cuyas URL
+  ya se devolvieron en una búsqueda anterior no se repiten (esas respuestas no
+  se memorizan por sesión, ver ``src.storage.tool_memo``; los resultados
+  memorizados se deduplican igual con ``replay_memo``).
+"""
+import http.client
+import ipaddress
+import json
+import logging
+import re
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from html import unescape
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+from agno.agent import Agent
+from agno.tools.duckduckgo import DuckDuckGoTools
+
+from src.config import settings
+from src.storage.cache import TieredCache, get_cache, make_cache_key, normalize_query
+from src.storage.tool_memo import TransientResult
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (compatible; DataEngineeringAgentTeam/1.0)"
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def get_web_caches() -> Optional[Dict[str, TieredCache]]:
+    """Cachés compartidas de búsquedas, noticias y páginas (None si están deshabilitadas)."""
+    if not settings.web_cache_enabled:
+        return None
+    return {
+        "text": get_cache(
+            "web_search",
+            ttl_seconds=settings.web_cache_ttl_seconds,
+            max_memory_entries=settings.search_cache_memory_entries,
+            max_disk_entries=settings.web_cache_disk_entries,
+        ),
+        "news": get_cache(
+            "web_news",
+            ttl_seconds=settings.web_news_cache_ttl_seconds,
+            max_memory_entries=settings.search_cache_memory_entries,
+            max_disk_entries=settings.web_cache_disk_entries,
+        ),
+        # El TTL de las páginas es cuánto se conservan los validadores; la frescura va aparte
+        "pages": get_cache(
+            "web_pages",
+            ttl_seconds=settings.web_page_cache_ttl_seconds,
+            max_memory_entries=32,
+            max_disk_entries=settings.web_cache_disk_entries,
+            max_disk_bytes=settings.web_page_cache_max_bytes,
+        ),
+    }
+
+
+class _TextExtractor(HTMLParser):
+    """Texto visible de un documento HTML (sin scripts, estilos ni navegación)."""
+
+    SKIP = {"script", "style", "noscript", "nav", "footer", "header", "svg"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth and data.strip():
+            self.parts.append(data.strip())
+
+
+def html_to_text(html: str) -> str:
+    extractor = _TextExtractor()
+    try:
+        extractor.feed(html)
+    except Exception:
+        # HTML mal formado: quitar etiquetas a lo bruto
+        return " ".join(unescape(re.sub(r"<[^>]+>", " ", html)).split())
+    return " ".join(" ".join(extractor.parts).split())
+
+
+def _public_addresses(host: str, port: int) -> List[str]:
+    """Direcciones de ``host``; ``ValueError`` si no resuelve o alguna no es pública."""
+    try:
+        infos = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise ValueError(f"no se pudo resolver {host}: {e}")
+    addresses = []
+    for *_, sockaddr in infos:
+        address = ipaddress.ip_address(sockaddr[0].split("%", 1)[0])
+        # is_global excluye loopback, privadas, link-local, reservadas y no especificadas
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"{host} resuelve a una dirección no pública ({address})")
+        if str(address) not in addresses:
+            addresses.append(str(address))
+    return addresses
+
+
+def check_public_url(url: str) -> None:
+    """Falla con ``ValueError`` si la URL no es http(s) o su host resuelve a una dirección no pública."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("debe ser una URL http:// o https://")
+    _public_addresses(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+
+
+def _create_public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """
+    ``socket.create_connection`` que conecta a la IP verificada en esta misma resolución.
+
+    Así un host con DNS rebinding no puede pasar ``check_public_url`` y después
+    resolver a una dirección privada al conectar.
+    """
+    host, port = address
+    error = None
+    for ip in _public_addresses(host, port):
+        try:
+            return socket.create_connection((ip, port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    # Sólo cambia la dirección del socket: SNI, verificación del certificado y Host usan el nombre original
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _PublicRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Sigue sólo redirecciones a URL http(s) públicas (urllib también seguiría ftp://)."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_public_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+# Sin proxies del entorno: la conexión debe ir a la IP verificada del host
+_opener = urllib.request.build_opener(
+    urllib.request.ProxyHandler({}),
+    _PublicHTTPHandler,
+    _PublicHTTPSHandler,
+    _PublicRedirectHandler,
+)
+
+
+def _fresh_until(headers, now: float) -> float:
+    match = _MAX_AGE.search(headers.get("Cache-Control", "") or "")
+    if match:
+        return now + int(match.group(1))
+    return now + settings.web_page_fresh_seconds
+
+
+class CachedDuckDuckGoTools(DuckDuckGoTools):
+    """``DuckDuckGoTools`` con caché de resultados y páginas y deduplicación por turno."""
+
+    def __init__(self, caches: Optional[Dict[str, TieredCache]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.caches = caches if caches is not None else get_web_caches()
+        self.register(self.fetch_page)
+        self._seen_lock = threading.Lock()
+        self._seen_run_id: Optional[str] = None
+        self._seen_urls: set = set()
+
+    def _cache(self, kind: str) -> Optional[TieredCache]:
+        return self.caches.get(kind) if self.caches else None
+
+    def _cached_results(self, kind: str, query: str, max_results: int, fetch) -> List[Dict[str, Any]]:
+        cache = self._cache(kind)
+        key = make_cache_key(kind, normalize_query(query), max_results, self.modifier)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        results = json.loads(fetch(query, max_results))
+        if results and cache is not None:
+            cache.set(key, results)
+        return results
+
+    def _dedupe(self, results: List[Dict[str, Any]], agent: Optional[Agent]) -> List[Dict[str, Any]]:
+        """Quita las URL ya devueltas en esta ejecución del agente."""
+        run_id = getattr(agent, "run_id", None)
+        with self._seen_lock:
+            if run_id is None or run_id != self._seen_run_id:
+                self._seen_run_id = run_id
+                self._seen_urls = set()
+            fresh = []
+            for result in results:
+                url = result.get("href") or result.get("url")
+                if url in self._seen_urls:
+                    continue
+                if url:
+                    self._seen_urls.add(url)
+                fresh.append(result)
+            return fresh
+
+    def _respond(self, results: List[Dict[str, Any]], agent: Optional[Agent]) -> str:
+        fresh = self._dedupe(results, agent)
+        if results and not fresh:
+            return TransientResult("Todos los resultados ya se devolvieron en búsquedas anteriores de este turno.")
+        response = json.dumps(fresh, indent=2, ensure_ascii=False)
+        # Sin las URL ya vistas en el turno, la respuesta no sirve para otros turnos
+        return TransientResult(response) if len(fresh) < len(results) else response
+
+    def replay_memo(self, function_name: str, result: str, agent: Optional[Agent]) -> str:
+        """Resultado memorizado en la sesión (ver ``tool_memo``), deduplicado contra este turno."""
+        if function_name not in ("duckduckgo_search", "duckduckgo_news"):
+            return result
+        try:
+            results = json.loads(result)
+        except ValueError:
+            return result
+        return self._respond(results, agent) if isinstance(results, list) else result
+
+    def duckduckgo_search(self, query: str, max_results: int = 5, agent: Optional[Agent] = None) -> str:
+        """Use this function to search DuckDuckGo for a query.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+
+        Returns:
+            The result from DuckDuckGo.
+        """
+        max_results = self.fixed_max_results or max_results
+        results = self._cached_results("text", query, max_results, super().duckduckgo_search)
+        return self._respond(results, agent)
+
+    def duckduckgo_news(self, query: str, max_results: int = 5, agent: Optional[Agent] = None) -> str:
+        """Use this function to get the latest news from DuckDuckGo.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+
+        Returns:
+            The latest news from DuckDuckGo.
+        """
+        max_results = self.fixed_max_results or max_results
+        results = self._cached_results("news", query, max_results, super().duckduckgo_news)
+        return self._respond(results, agent)
+
+    def fetch_page(self, url: str) -> str:
+        """Use this function to read the text content of a web page (e.g. official documentation).
+
+        Args:
+            url(str): The URL of the page, usually taken from a search result.
+
+        Returns:
+            The visible text of the page, truncated.
+        """
+        if not url.startswith(("http://", "https://")):
+            return TransientResult("URL no válida: debe empezar por http:// o https://")
+        # Antes de la caché: una copia guardada no se sirve si el host ya no es público
+        try:
+            check_public_url(url)
+        except ValueError as e:
+            logger.warning(f"Blocked fetch of {url}: {e}")
+            return TransientResult(f"URL no permitida: {e}")
+
+        cache = self._cache("pages")
+        key = make_cache_key("page", url)
+        entry = cache.get(key) if cache is not None else None
+        now = time.time()
+        if entry is not None and entry["fresh_until"] > now:
+            return entry["content"]
+
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        if entry is not None:
+            if entry.get("etag"):
+                request.add_header("If-None-Match", entry["etag"])
+            if entry.get("last_modified"):
+                request.add_header("If-Modified-Since", entry["last_modified"])
+        try:
+            with _opener.open(request, timeout=self.timeout or 10) as response:
+                raw = response.read(settings.web_page_max_bytes)
+                charset = response.headers.get_content_charset() or "utf-8"
+                headers = response.headers
+                content_type = headers.get("Content-Type", "")
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and entry is not None:
+                # Sin cambios: se reutiliza el contenido y se renueva la frescura
+                entry["fresh_until"] = _fresh_until(e.headers, now)
+                cache.set(key, entry)
+                return entry["content"]
+            return TransientResult(f"Error al obtener {url}: HTTP {e.code}")
+        except ValueError as e:
+            # Redirección o resolución al conectar hacia una dirección no pública
+            logger.warning(f"Blocked fetch of {url}: {e}")
+            return TransientResult(f"URL no permitida: {e}")
+        except Exception as e:
+            if entry is not None:
+                logger.warning(f"Revalidation failed for {url}, serving stale copy: {e}")
+                return entry["content"]
+            return TransientResult(f"Error al obtener {url}: {e}")
+
+        text = raw.decode(charset, errors="ignore")
+        if "html" in content_type or text.lstrip().startswith("<"):
+            text = html_to_text(text)
+        content = text[:settings.web_page_max_chars]
+        if cache is not None:
+            cache.set(key, {
+                "content": content,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "fresh_until": _fresh_until(headers, now),
+            })
+        return content
@@ -0,0 +1,60 @@
+"""
+Fixtures comunes: cada test usa su propia base de datos en ``tmp_path`` y
+credenciales ficticias; Gemini, Vertex AI Search y DuckDuckGo se sustituyen
+por los stubs deterministas de ``benchmarks.offline_stubs`` (sin red).
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from src.config import get_settings
+from src.storage.connection import close_connections
+
+
+@pytest.fixture
+def app_env(tmp_path, monkeypatch):
+    """Configuración aislada apuntando a una DB temporal; devuelve el directorio."""
+    monkeypatch.setenv("DB_FILE_PATH", str(tmp_path / "agents.db"))
+    monkeypatch.setenv("GOOGLE_PROJECT_ID", "test-project")
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("DATA_STORE_ID", "test-datastore")
+    monkeypatch.setenv("AGNO_TELEMETRY", "false")
+    monkeypatch.setenv("TELEMETRY_ENABLED", "false")
+    monkeypatch.setattr("src.storage.cache._caches", {})
+    monkeypatch.setattr("src.core.rate_limit._limiters", {})
+    get_settings.cache_clear()
+    yield tmp_path
+    close_connections()
+    get_settings.cache_clear()
+
+
+@pytest.fixture(scope="session")
+def stubs():
+    """Instala los stubs offline una vez por sesión de tests y devuelve sus contadores."""
+    from benchmarks.offline_stubs import StubLatency, install_stubs
+
+    return install_stubs(StubLatency(model_ms=0, search_ms=0, web_ms=0, response_words=20))
+
+
+class FakeClock:
+    """Reloj manual para probar TTL y tasas sin esperar."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def patch_clock(monkeypatch, module: str, clock: FakeClock) -> None:
+    """Sustituye el módulo ``time`` que usa ``module`` por el reloj manual."""
+    monkeypatch.setattr(f"{module}.time", SimpleNamespace(time=clock.time, sleep=clock.advance,
+                                                          perf_counter=clock.time, monotonic=clock.time))
@@ -0,0 +1,47 @@
+import numpy as np
+
+from src.core.answer_cache import SemanticAnswerCache, _ScopeIndex
+from tests.conftest import patch_clock
+
+
+def _cache(app_env, vectors, ttl=100):
+    cache = SemanticAnswerCache(threshold=0.9, ttl_seconds=ttl, db_path=str(app_env / "cache.db"))
+    cache.embed = lambda text: np.asarray(vectors[text], dtype=np.float32) / np.linalg.norm(vectors[text])
+    return cache
+
+
+def test_expired_best_match_does_not_hide_valid_answer(app_env, clock, monkeypatch):
+    patch_clock(monkeypatch, "src.core.answer_cache", clock)
+    cache = _cache(app_env, {
+        "vieja": [1.0, 0.0, 0.0],
+        "nueva": [0.97, 0.2, 0.0],
+        "consulta": [1.0, 0.01, 0.0],
+    })
+    cache.store("vieja", "respuesta vieja", "ana")
+    clock.advance(60)
+    cache.store("nueva", "respuesta nueva", "ana")
+    clock.advance(50)  # "vieja" expira; "nueva" sigue vigente
+
+    hit, _ = cache.lookup("consulta", "ana")
+    assert hit is not None
+    assert hit.answer == "respuesta nueva"
+
+    clock.advance(60)
+    assert cache.lookup("consulta", "ana")[0] is None
+
+
+def test_scope_index_grows_geometrically_and_prunes():
+    index = _ScopeIndex(dimensions=4)
+    capacities = set()
+    for row_id in range(200):
+        index.add(row_id, float(row_id), np.full(4, row_id, dtype=np.float32))
+        capacities.add(index._matrix.shape[0])
+
+    assert capacities == {64, 128, 256}
+    assert index.size == 200
+    assert index.matrix[150].tolist() == [150.0] * 4
+
+    index.prune(cutoff=190.0)
+    assert index.ids.tolist() == list(range(190, 200))
+    assert index.matrix[:, 0].tolist() == [float(i) for i in range(190, 200)]
+    assert index.contains(195) and not index.contains(10)
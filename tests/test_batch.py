@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from src.core.batch import BatchQuery, group_queries, load_queries, run_batch
+
+
+def test_load_queries_skips_bad_lines_with_location(tmp_path, caplog):
+    path = tmp_path / "queries.jsonl"
+    path.write_text(
+        '{"query": "uno", "id": "a"}\n'
+        '{"query": "dos", \n'
+        '\n'
+        '["no", "objeto"]\n'
+        '{"id": "sin-query"}\n'
+        '{"query": "tres", "user": "luis", "session": "s1"}\n',
+        encoding="utf-8",
+    )
+    queries = load_queries(str(path), "ana")
+
+    assert [(q.id, q.query, q.user, q.session) for q in queries] == [
+        ("a", "uno", "ana", None),
+        ("3", "tres", "luis", "s1"),
+    ]
+    messages = " ".join(record.getMessage() for record in caplog.records)
+    assert f"{path}:2" in messages
+    assert f"{path}:4" in messages
+    assert f"{path}:5" in messages
+
+
+def test_load_queries_reads_csv_session_column(tmp_path):
+    path = tmp_path / "queries.csv"
+    path.write_text("id,query,session\n1,uno,etl\n2,dos,\n", encoding="utf-8")
+    queries = load_queries(str(path), "ana")
+    assert [(q.id, q.session) for q in queries] == [("1", "etl"), ("2", None)]
+
+
+def test_group_queries_keeps_session_order():
+    queries = [
+        BatchQuery("1", "a", "ana", "s"),
+        BatchQuery("2", "b", "ana"),
+        BatchQuery("3", "c", "luis", "s"),
+        BatchQuery("4", "d", "ana", "s"),
+    ]
+    chains = [[q.id for q in chain] for chain in group_queries(queries)]
+    assert chains == [["1", "4"], ["2"], ["3"]]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_run_batch_sessions_do_not_depend_on_scheduling(app_env, stubs, workers):
+    queries = [
+        BatchQuery("1", "¿Qué es Iceberg?", "ana"),
+        BatchQuery("2", "¿Qué es Hudi?", "ana"),
+        BatchQuery("3", "¿Qué es Delta?", "ana", "etl"),
+        BatchQuery("4", "¿Y sus diferencias?", "ana", "etl"),
+    ]
+    output = app_env / "results.jsonl"
+    summary = run_batch(queries, str(output), workers=workers)
+
+    results = {row["id"]: row for row in map(json.loads, output.read_text(encoding="utf-8").splitlines())}
+    assert summary.succeeded == 4
+    assert results["1"]["session_id"] != results["2"]["session_id"]
+    assert results["3"]["session_id"] == results["4"]["session_id"]
+    assert results["3"]["session_id"] not in {results["1"]["session_id"], results["2"]["session_id"]}
@@ -0,0 +1,81 @@
+from src.storage.cache import TieredCache, make_cache_key, normalize_query
+from tests.conftest import patch_clock
+
+
+def _cache(app_env, **overrides):
+    options = dict(namespace="test", ttl_seconds=60, max_memory_entries=2, max_disk_entries=100,
+                   db_path=str(app_env / "cache.db"))
+    options.update(overrides)
+    return TieredCache(**options)
+
+
+def test_normalized_queries_share_key():
+    assert normalize_query("  Data   LAKEHOUSE ") == "data lakehouse"
+    assert make_cache_key("a", 1) == make_cache_key("a", 1)
+    assert make_cache_key("a", 1) != make_cache_key("a", 2)
+
+
+def test_memory_lru_evicts_least_recently_used_and_disk_keeps_it(app_env):
+    cache = _cache(app_env)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" pasa a ser el menos usado
+    cache.set("c", 3)
+
+    assert list(cache._memory) == ["a", "c"]
+    assert cache.get("b") == 2
+    assert cache.disk_hits == 1
+
+
+def test_entries_expire_after_ttl(app_env, monkeypatch, clock):
+    patch_clock(monkeypatch, "src.storage.cache", clock)
+    cache = _cache(app_env)
+    cache.set("key", {"value": 1})
+
+    clock.advance(59)
+    assert cache.get("key") == {"value": 1}
+    clock.advance(2)
+    assert cache.get("key") is None
+    # También caducó en disco: otra instancia no la ve
+    assert _cache(app_env).get("key") is None
+
+
+def test_disk_tier_survives_new_instance(app_env):
+    _cache(app_env).set("key", ["persisted"])
+    assert _cache(app_env).get("key") == ["persisted"]
+
+
+def test_disk_eviction_keeps_most_recently_used(app_env, monkeypatch, clock):
+    monkeypatch.setattr("src.storage.cache.EVICTION_INTERVAL", 1)
+    patch_clock(monkeypatch, "src.storage.cache", clock)
+    cache = _cache(app_env, max_memory_entries=0, max_disk_entries=3)
+    for key in "abc":
+        cache.set(key, key)
+        clock.advance(1)
+    cache.get("a")  # actualiza last_access
+    clock.advance(1)
+    cache.set("d", "d")
+
+    survivors = {key for key in "abcd" if cache.get(key) is not None}
+    assert survivors == {"a", "c", "d"}
+
+
+def test_disk_eviction_by_total_size(app_env, monkeypatch, clock):
+    monkeypatch.setattr("src.storage.cache.EVICTION_INTERVAL", 1)
+    patch_clock(monkeypatch, "src.storage.cache", clock)
+    cache = _cache(app_env, max_memory_entries=0, max_disk_bytes=250)
+    for key in "abc":
+        cache.set(key, "x" * 100)
+        clock.advance(1)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "x" * 100
+    assert cache.get("c") == "x" * 100
+
+
+def test_clear_removes_both_tiers(app_env):
+    cache = _cache(app_env)
+    cache.set("key", 1)
+    cache.clear()
+    assert cache.get("key") is None
+    assert _cache(app_env).get("key") is None
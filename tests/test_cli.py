@@ -0,0 +1,39 @@
+import json
+
+import pytest
+from typer.testing import CliRunner
+
+from main import app
+from src.storage.tool_memo import TransientResult
+from src.tools.vector_embedding import NO_RESULTS, VertexSearchTool
+
+runner = CliRunner()
+
+
+def _patch_search(monkeypatch, search):
+    monkeypatch.setattr(VertexSearchTool, "search", lambda self, query, page_size=5: search())
+    monkeypatch.setenv("SEARCH_CACHE_ENABLED", "false")
+    from src.config import get_settings
+
+    get_settings.cache_clear()
+
+
+def test_connection_accepts_passages_that_mention_errors(app_env, monkeypatch):
+    passage = json.dumps([{"id": "doc-1", "title": "Pipelines", "text": "Error handling and retries in Airflow"}])
+    _patch_search(monkeypatch, lambda: passage)
+    result = runner.invoke(app, ["test-connection"])
+    assert "Vertex AI Search conectado correctamente" in result.output
+    assert "Error en Vertex AI" not in result.output
+
+
+@pytest.mark.parametrize("failure", ["exception", "no_results"])
+def test_connection_reports_search_failures(app_env, monkeypatch, failure):
+    def search():
+        if failure == "exception":
+            raise RuntimeError("503 Service Unavailable")
+        return TransientResult(NO_RESULTS)
+
+    _patch_search(monkeypatch, search)
+    result = runner.invoke(app, ["test-connection"])
+    assert "Error en Vertex AI" in result.output
+    assert "Todas las conexiones funcionan" not in result.output
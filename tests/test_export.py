@@ -0,0 +1,63 @@
+import pytest
+
+from src.storage.turns import append_turn, get_turns, get_turns_connection
+
+pytest.importorskip("pyarrow")
+
+from src.storage.export import export_turns, import_turns  # noqa: E402
+
+
+def _turns():
+    append_turn("ana", "s1", "¿Qué es Iceberg?", "Un formato de tabla abierto.", agent="RAG Agent",
+                duration_ms=120.5, tier="pro")
+    append_turn("ana", "s1", "¿Y Hudi?", "Otro formato de tabla.", agent="team", tier="flash")
+    append_turn("luis", "s2", "Escribe un DAG", "```python\n...```", agent="Code Standards Agent")
+
+
+def _rows():
+    return get_turns_connection().execute(
+        "SELECT user_id, session_id, turn, query, answer, tokens, agent, duration_ms, tier, "
+        "ROUND(created_at, 3) FROM session_turns ORDER BY user_id, session_id, turn"
+    ).fetchall()
+
+
+def test_export_import_round_trip(app_env, monkeypatch):
+    _turns()
+    original = _rows()
+    path = str(app_env / "export" / "turns.parquet")
+    exported = export_turns(path, batch_size=2)
+    assert exported.rows == 3
+
+    from src.config import get_settings
+
+    monkeypatch.setenv("DB_FILE_PATH", str(app_env / "restored.db"))
+    get_settings.cache_clear()
+    imported = import_turns(path, batch_size=2)
+
+    assert (imported.rows, imported.skipped) == (3, 0)
+    assert _rows() == original
+    # El índice de texto completo también se reconstruye con los triggers
+    assert get_turns_connection().execute(
+        "SELECT COUNT(*) FROM session_turns_fts WHERE session_turns_fts MATCH 'iceberg'"
+    ).fetchone()[0] == 1
+
+
+def test_import_skips_existing_turns_unless_overwrite(app_env):
+    _turns()
+    path = str(app_env / "turns.parquet")
+    export_turns(path, user="ana")
+
+    assert import_turns(path).skipped == 2
+    get_turns_connection().execute("UPDATE session_turns SET answer = 'editada' WHERE user_id = 'ana'")
+    assert import_turns(path, overwrite=True).rows == 2
+    assert [turn.answer for turn in get_turns("ana", "s1")] == ["Un formato de tabla abierto.", "Otro formato de tabla."]
+
+
+def test_import_rejects_unrelated_parquet(app_env):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = str(app_env / "other.parquet")
+    pq.write_table(pa.table({"x": [1, 2]}), path)
+    with pytest.raises(ValueError):
+        import_turns(path)
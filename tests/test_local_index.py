@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.tools.local_index import (
+    LOCAL_NO_RESULTS,
+    NOT_BUILT,
+    GeminiTextEmbedder,
+    LocalSearchTool,
+    default_index_dir,
+    write_index,
+)
+
+DIMENSIONS = 4
+
+
+class _QuotaExhausted(Exception):
+    code = 429
+
+
+class _FailingModels:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_content(self, **kwargs):
+        self.calls += 1
+        raise _QuotaExhausted("Resource exhausted")
+
+
+class _FixedEmbedder:
+    def __init__(self, vector):
+        self.vector = np.asarray(vector, dtype=np.float32)
+
+    def embed_query(self, query, max_retries=None):
+        return self.vector
+
+
+def _build_index(directory):
+    chunks = [("libro.md", "Particionado por fecha en Iceberg."), ("libro.md", "Compactación de ficheros pequeños.")]
+    vectors = iter([np.eye(DIMENSIONS, dtype=np.float32)[:2]])
+    write_index(directory, chunks, lambda texts: next(vectors), DIMENSIONS)
+
+
+def test_search_distinguishes_missing_index_from_no_results(app_env):
+    directory = str(app_env / "indice")
+    assert LocalSearchTool(directory=directory, embedder=_FixedEmbedder([1, 0, 0, 0])).search("x") == NOT_BUILT
+
+    _build_index(directory)
+    assert "Iceberg" in LocalSearchTool(directory=directory, embedder=_FixedEmbedder([1, 0, 0, 0])).search("x")
+    assert LocalSearchTool(directory=directory, embedder=_FixedEmbedder([-1, -1, 0, 0])).search("x") == LOCAL_NO_RESULTS
+
+
+def test_hybrid_falls_back_to_vertex_without_retrying_embeddings(app_env, stubs, monkeypatch):
+    from src.config import get_settings
+    from src.tools.vector_embedding import VertexSearchTool
+
+    monkeypatch.setenv("RAG_BACKEND", "hybrid")
+    monkeypatch.setenv("SEARCH_CACHE_ENABLED", "false")
+    get_settings.cache_clear()
+    _build_index(default_index_dir())
+
+    tool = VertexSearchTool(project_id="p", data_store_id="d")
+    models = _FailingModels()
+    embedder = GeminiTextEmbedder(dimensions=DIMENSIONS)
+    embedder._client = SimpleNamespace(models=models)
+    tool.local.embedder = embedder
+
+    searches = stubs.calls["search"]
+    chunks = tool.search_chunks("particionado en Iceberg", page_size=2)
+
+    assert chunks
+    assert models.calls == 1
+    assert stubs.calls["search"] == searches + 1
@@ -0,0 +1,65 @@
+import time
+
+from src.storage.connection import get_connection, transaction
+from src.storage.sessions import build_session_storage, migrate_per_session_tables, table_exists
+
+
+def _per_session_table(user, session_id, owner=None):
+    storage = build_session_storage(user, session_id)
+    storage.create()
+    with transaction(get_connection()) as conn:
+        conn.execute(
+            f'INSERT INTO "{storage.table_name}" (session_id, user_id, memory, created_at, updated_at) '
+            f"VALUES (?, ?, ?, ?, ?)",
+            (session_id, owner or user, f'{{"owner": "{owner or user}"}}', int(time.time()), int(time.time())),
+        )
+    return storage.table_name
+
+
+def _shared_rows():
+    return get_connection().execute("SELECT session_id, user_id, memory FROM team_sessions ORDER BY user_id").fetchall()
+
+
+def test_migration_copies_and_drops_verified_tables(app_env):
+    table = _per_session_table("ana", "ana_20240101_120000_0000abcd")
+    result = migrate_per_session_tables()
+
+    assert (result.tables, result.rows, result.conflicts) == (1, 1, [])
+    assert not table_exists(get_connection(), table)
+    assert _shared_rows() == [("ana_20240101_120000_0000abcd", "ana", '{"owner": "ana"}')]
+
+
+def test_session_id_conflict_between_users_is_reported_not_overwritten(app_env):
+    ana = _per_session_table("ana", "s1")
+    bob = _per_session_table("bob", "s1")
+    result = migrate_per_session_tables()
+
+    assert result.tables == 1
+    assert len(result.conflicts) == 1
+    # La primera tabla migra; la segunda se conserva intacta
+    assert not table_exists(get_connection(), ana)
+    assert table_exists(get_connection(), bob)
+    assert _shared_rows() == [("s1", "ana", '{"owner": "ana"}')]
+
+
+def test_tables_without_agno_schema_are_left_alone(app_env):
+    with transaction(get_connection()) as conn:
+        conn.execute('CREATE TABLE "team_reporting_daily" (id INTEGER PRIMARY KEY, session_id TEXT, total REAL)')
+        conn.execute('INSERT INTO "team_reporting_daily" (session_id, total) VALUES (?, ?)', ("x", 1.0))
+    result = migrate_per_session_tables()
+
+    assert result.tables == 0
+    assert result.skipped_tables == ["team_reporting_daily"]
+    assert table_exists(get_connection(), "team_reporting_daily")
+    assert _shared_rows() == []
+
+
+def test_rerun_after_keeping_tables_is_idempotent(app_env):
+    table = _per_session_table("ana", "ana_20240101_120000_0000abcd")
+    assert migrate_per_session_tables(drop_old=False).tables == 1
+    assert table_exists(get_connection(), table)
+
+    result = migrate_per_session_tables()
+    assert (result.tables, result.conflicts) == (1, [])
+    assert not table_exists(get_connection(), table)
+    assert len(_shared_rows()) == 1
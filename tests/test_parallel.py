@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.core.parallel import ParallelTeam
+
+
+class _Member:
+    def __init__(self, name):
+        self.name = name
+        self.queries = []
+
+    def run(self, query, **kwargs):
+        self.queries.append(query)
+        return SimpleNamespace(content=f"{self.name}: resultado")
+
+
+class _Team:
+    def __init__(self, members):
+        self.members = members
+        self.additional_context = "contexto de sesión"
+        self.contexts = []
+
+    def run(self, query, stream=False, **kwargs):
+        self.contexts.append(self.additional_context)
+        return SimpleNamespace(content="síntesis")
+
+
+@pytest.fixture
+def parallel(app_env):
+    rag, web, code = _Member("RAG Agent"), _Member("Web Agent"), _Member("Code Standards Agent")
+    team = _Team([web, rag, code])
+    return ParallelTeam(team, fan_out_members=[rag, web], default_timeout=5), team, rag, web
+
+
+def test_code_only_query_skips_fan_out(parallel):
+    wrapper, team, rag, web = parallel
+    response = wrapper.run("Escribe un job de PySpark que deduplique eventos por clave")
+
+    assert response.content == "síntesis"
+    assert rag.queries == [] and web.queries == []
+    assert team.contexts == ["contexto de sesión"]
+
+
+def test_open_query_fans_out_to_research_members(parallel):
+    wrapper, team, rag, web = parallel
+    wrapper.run("¿Qué es un data lakehouse?")
+
+    assert rag.queries == ["¿Qué es un data lakehouse?"]
+    assert web.queries == ["¿Qué es un data lakehouse?"]
+    assert "RAG Agent: resultado" in team.contexts[0]
+    assert team.additional_context == "contexto de sesión"
@@ -0,0 +1,47 @@
+import json
+
+from src.storage.turns import estimate_tokens
+from src.tools.rag_chunks import SearchChunk, format_chunks, interleave, pack_chunks, rank_chunks
+
+
+def _chunk(doc, text, score=None):
+    return SearchChunk(document_id=doc, text=text, score=score, title=f"Libro {doc}")
+
+
+def test_pack_orders_by_score_and_drops_duplicates():
+    chunks = [_chunk("a", "Primero.", 0.2), _chunk("b", "Segundo.", 0.9), _chunk("c", "  segundo. ", 0.5)]
+    packed = pack_chunks(chunks, token_budget=500)
+    assert [chunk.document_id for chunk in packed] == ["b", "a"]
+
+
+def test_pack_respects_budget_and_trims_at_sentence_end():
+    long_text = "Una frase completa sobre particiones. " * 40
+    packed = pack_chunks([_chunk("a", "Pasaje corto.", 0.9), _chunk("b", long_text, 0.8)], token_budget=120)
+
+    assert sum(estimate_tokens(chunk.text) for chunk in packed) <= 120
+    assert packed[1].document_id == "b"
+    assert packed[1].text.endswith(".")
+    assert len(packed[1].text) < len(long_text)
+
+
+def test_pack_skips_passages_without_room_for_a_sentence():
+    packed = pack_chunks([_chunk("a", "x" * 400, 0.9), _chunk("b", "Cabe.", 0.1)], token_budget=60)
+    assert [chunk.document_id for chunk in packed] == ["b"]
+
+
+def test_unscored_chunks_keep_arrival_order_after_scored():
+    ranked = rank_chunks([_chunk("a", "1"), _chunk("b", "2", 0.1), _chunk("c", "3")])
+    assert [chunk.document_id for chunk in ranked] == ["b", "a", "c"]
+
+
+def test_interleave_and_keep_order_without_score():
+    groups = [[_chunk("a1", "A1."), _chunk("a2", "A2.")], [_chunk("b1", "B1.")]]
+    merged = interleave(groups)
+    assert [chunk.document_id for chunk in merged] == ["a1", "b1", "a2"]
+    assert [chunk.document_id for chunk in pack_chunks(merged, 500, by_score=False)] == ["a1", "b1", "a2"]
+
+
+def test_format_chunks_is_json_with_rounded_scores():
+    data = json.loads(format_chunks([_chunk("a", "Texto.", 0.123456)]))
+    assert data == [{"id": "a", "title": "Libro a", "score": 0.123, "text": "Texto."}]
+    assert SearchChunk.from_dict(_chunk("a", "t", 1.0).to_dict()) == _chunk("a", "t", 1.0)
@@ -0,0 +1,95 @@
+import pytest
+
+from src.core.rate_limit import (
+    DECREASE_FACTOR,
+    INCREASE_FRACTION,
+    SharedTokenBucket,
+    TokenBucket,
+    error_status,
+    get_limiter,
+    retry_after_seconds,
+)
+from tests.conftest import patch_clock
+
+
+@pytest.fixture
+def frozen(monkeypatch, clock):
+    patch_clock(monkeypatch, "src.core.rate_limit", clock)
+    return clock
+
+
+def test_bucket_allows_burst_then_paces(app_env, frozen):
+    bucket = TokenBucket(60, burst=3, name="gemini")  # 1 por segundo
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(1.0)
+    frozen.advance(5)
+    assert bucket.reserve() == 0.0
+
+
+def test_unlimited_bucket_only_honours_retry_after(app_env, frozen):
+    bucket = TokenBucket(0, name="vertex")
+    assert all(bucket.reserve() == 0.0 for _ in range(100))
+    bucket.throttled(retry_after=7)
+    assert bucket.reserve() == pytest.approx(7.0)
+
+
+def test_aimd_halves_once_per_window_and_recovers(app_env, frozen):
+    bucket = TokenBucket(60, name="gemini")
+    bucket.throttled()
+    bucket.throttled()  # 429 de peticiones ya en vuelo: misma ventana
+    assert bucket._state.rate == pytest.approx(1.0 * DECREASE_FACTOR)
+
+    frozen.advance(2)
+    bucket.throttled()
+    assert bucket._state.rate == pytest.approx(1.0 * DECREASE_FACTOR ** 2)
+
+    bucket.succeeded()
+    assert bucket._state.rate == pytest.approx(1.0 * DECREASE_FACTOR ** 2 + INCREASE_FRACTION)
+    for _ in range(100):
+        bucket.succeeded()
+    assert bucket._state.rate == pytest.approx(1.0)
+
+
+def test_throttled_blocks_until_retry_after(app_env, frozen):
+    bucket = TokenBucket(600, name="gemini")
+    bucket.throttled(retry_after=30)
+    assert bucket.reserve() >= 30
+    frozen.advance(31)
+    assert bucket.reserve() < 1
+
+
+def test_shared_bucket_state_is_seen_by_other_instances(app_env, frozen):
+    first = SharedTokenBucket(60, burst=2, name="gemini", path=str(app_env / "rate_limits.db"))
+    second = SharedTokenBucket(60, burst=2, name="gemini", path=str(app_env / "rate_limits.db"))
+    assert first.reserve() == 0.0
+    assert second.reserve() == 0.0
+    assert first.reserve() == pytest.approx(1.0)
+
+    second.throttled(retry_after=10)
+    assert first.reserve() >= 10
+
+
+class _ApiError(Exception):
+    def __init__(self, code, message=""):
+        super().__init__(message)
+        self.code = code
+
+
+def test_error_helpers_read_status_and_retry_delay():
+    error = _ApiError(429, "Resource exhausted. retryDelay: '12s'")
+    assert error_status(error) == 429
+    assert retry_after_seconds(error) == pytest.approx(12.0)
+    assert error_status(ValueError("boom")) is None
+
+
+def test_shared_buckets_only_for_configured_limits(app_env, monkeypatch):
+    from src.config import get_settings
+
+    monkeypatch.setenv("GEMINI_REQUESTS_PER_MINUTE", "60")
+    monkeypatch.setenv("MODEL_REQUESTS_PER_MINUTE", '{"gemini-2.5-pro": 5}')
+    get_settings.cache_clear()
+
+    assert type(get_limiter("gemini")) is SharedTokenBucket
+    assert type(get_limiter("gemini:gemini-2.5-pro")) is SharedTokenBucket
+    assert type(get_limiter("vertex")) is TokenBucket
+    assert type(get_limiter("gemini:gemini-2.5-flash")) is TokenBucket
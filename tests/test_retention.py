@@ -0,0 +1,93 @@
+import time
+
+import pytest
+from rich.console import Console
+
+from src.storage.connection import get_connection, transaction
+from src.storage.db_utils import cleanup_old_sessions, get_user_sessions
+from src.storage.sessions import (
+    build_session_storage,
+    create_shared_table,
+    per_session_table_name,
+    table_exists,
+)
+from src.storage.turns import append_turn, get_turns
+
+DAY = 86400
+
+
+def _console():
+    return Console(quiet=True)
+
+
+def _write_session(user, session_id, age_days, updated=True):
+    """Crea la fila de sesión de agno con la antigüedad indicada (``updated_at`` NULL si no se actualizó)."""
+    storage = build_session_storage(user, session_id)
+    storage.create()
+    created = int(time.time() - age_days * DAY)
+    with transaction(get_connection()) as conn:
+        conn.execute(
+            f'INSERT INTO "{storage.table_name}" (session_id, user_id, created_at, updated_at) VALUES (?, ?, ?, ?)',
+            (session_id, user, created, created if updated else None),
+        )
+    return storage.table_name
+
+
+@pytest.fixture
+def per_session(app_env, monkeypatch):
+    monkeypatch.setenv("SESSION_STORAGE_MODE", "per_session")
+    return app_env
+
+
+@pytest.fixture
+def shared(app_env, monkeypatch):
+    monkeypatch.setenv("SESSION_STORAGE_MODE", "shared")
+    create_shared_table()
+    return app_env
+
+
+def test_per_session_drops_only_expired_tables(per_session):
+    old = _write_session("bob", "bob_20250101_120000_aaaaaaaa", age_days=90)
+    recent = _write_session("bob", "bob_20250601_120000_bbbbbbbb", age_days=1)
+
+    assert cleanup_old_sessions("bob", 30, _console()) == 1
+    conn = get_connection()
+    assert not table_exists(conn, old)
+    assert table_exists(conn, recent)
+
+
+def test_per_session_ignores_users_sharing_a_prefix(per_session):
+    mine = _write_session("bob", "bob_20250101_120000_aaaaaaaa", age_days=90)
+    theirs = _write_session("bob_smith", "bob_smith_20250101_120000_bbbbbbbb", age_days=90)
+    empty = per_session_table_name("bob_smith", "bob_smith_20250101_120000_cccccccc")
+    build_session_storage("bob_smith", "bob_smith_20250101_120000_cccccccc").create()
+
+    assert get_user_sessions("bob") == ["bob_20250101_120000_aaaaaaaa"]
+    assert cleanup_old_sessions("bob", 30, _console()) == 1
+    conn = get_connection()
+    assert not table_exists(conn, mine)
+    assert table_exists(conn, theirs)
+    assert table_exists(conn, empty)
+
+
+def test_shared_mode_deletes_expired_rows_including_never_updated(shared):
+    _write_session("bob", "bob_old", age_days=90)
+    _write_session("bob", "bob_once", age_days=90, updated=False)
+    _write_session("bob", "bob_new", age_days=1)
+    _write_session("alice", "alice_old", age_days=90)
+
+    assert cleanup_old_sessions("bob", 30, _console()) == 2
+    assert get_user_sessions("bob") == ["bob_new"]
+    assert get_user_sessions("alice") == ["alice_old"]
+
+
+def test_cleanup_removes_inactive_turns(shared, monkeypatch):
+    _write_session("bob", "bob_old", age_days=90)
+    append_turn("bob", "bob_old", "¿qué es un lakehouse?", "Una arquitectura...")
+    append_turn("bob", "bob_new", "¿y un data mesh?", "Un enfoque...")
+    with transaction(get_connection()) as conn:
+        conn.execute("UPDATE session_turns SET created_at = ? WHERE session_id = 'bob_old'", (time.time() - 90 * DAY,))
+
+    cleanup_old_sessions("bob", 30, _console())
+    assert get_turns("bob", "bob_old") == []
+    assert len(get_turns("bob", "bob_new")) == 1
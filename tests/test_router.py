@@ -0,0 +1,65 @@
+import pytest
+
+from src.core.router import TEAM_ROUTE, RouteDecision, classify_keywords, log_decision
+
+
+@pytest.mark.parametrize("query, member", [
+    ("Escribe un job de PySpark que deduplique eventos por clave y lo guarde en Delta", "Code Standards Agent"),
+    ("Revisa este código SQL y optimiza la consulta ```select * from t```", "Code Standards Agent"),
+    ("Busca en la web la última versión de Apache Airflow y su changelog", "Web Agent"),
+    ("Según el libro, ¿qué dice sobre slowly changing dimensions? Resume el capítulo", "RAG Agent"),
+    ("Novedades de la release de Spark de 2025", "Web Agent"),
+])
+def test_single_intent_queries_route_to_member(app_env, query, member):
+    decision = classify_keywords(query)
+    assert decision.route == member
+    assert decision.member == member
+
+
+@pytest.mark.parametrize("query", [
+    "¿Qué es un data lakehouse?",
+    "Compara Kafka y Pulsar y escribe un script de benchmark",
+    "Diseña la arquitectura de un pipeline de streaming",
+    "Busca la última versión de Spark y escribe un job de PySpark para leerla",
+    "Diseño de particiones para datos de 2024",
+])
+def test_ambiguous_or_multi_intent_queries_go_to_team(app_env, query):
+    decision = classify_keywords(query)
+    assert decision.route == TEAM_ROUTE
+    assert decision.member is None
+
+
+def test_threshold_controls_direct_routing(app_env, monkeypatch):
+    query = "Escribe un job de PySpark que deduplique eventos por clave y lo guarde en Delta"
+    monkeypatch.setenv("ROUTER_CONFIDENCE_THRESHOLD", "0.99")
+    from src.config import get_settings
+
+    get_settings.cache_clear()
+    decision = classify_keywords(query)
+    assert decision.route == "Code Standards Agent"
+    assert decision.member is None
+
+
+@pytest.mark.parametrize("query", [
+    "Resume el capítulo 3 del libro",
+    "```select 1```",
+    "¿Cuál es el changelog?",
+])
+def test_single_keyword_hit_stays_below_default_threshold(app_env, query):
+    decision = classify_keywords(query)
+    assert decision.route != TEAM_ROUTE
+    assert decision.member is None
+
+
+def test_routing_log_schema_is_created_per_database(app_env, monkeypatch):
+    from src.config import get_settings
+    from src.storage.connection import get_connection
+
+    decision = RouteDecision(route=TEAM_ROUTE, confidence=0.0, method="keywords")
+    log_decision(decision, "uno", "ana", "s1")
+    monkeypatch.setenv("DB_FILE_PATH", str(app_env / "other.db"))
+    get_settings.cache_clear()
+    log_decision(decision, "dos", "ana", "s1")
+
+    rows = get_connection().execute("SELECT query FROM routing_decisions").fetchall()
+    assert rows == [("dos",)]
@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from src.server.app import create_app  # noqa: E402
+
+
+@pytest.fixture
+def client(app_env):
+    # Sin ``with``: no se ejecuta el lifespan, así que no se precalientan equipos
+    return TestClient(create_app(pool_size=1))
+
+
+@pytest.fixture
+def api_keys(app_env, monkeypatch):
+    from src.config import get_settings
+
+    monkeypatch.setenv("SERVER_API_KEYS", '{"clave-ana": "ana", "clave-bob": "bob"}')
+    get_settings.cache_clear()
+
+
+def test_without_keys_user_comes_from_request(client):
+    response = client.get("/sessions", params={"user": "ana"})
+    assert response.status_code == 200
+    assert response.json()["user"] == "ana"
+    assert client.get("/sessions").status_code == 422
+
+
+def test_keys_require_valid_header(client, api_keys):
+    assert client.get("/sessions", params={"user": "ana"}).status_code == 401
+    assert client.get("/sessions", headers={"X-API-Key": "otra"}).status_code == 401
+
+
+def test_user_is_derived_from_api_key(client, api_keys):
+    response = client.post("/sessions", json={}, headers={"X-API-Key": "clave-bob"})
+    assert response.status_code == 200
+    assert response.json()["user"] == "bob"
+    assert response.json()["session_id"].startswith("bob_")
+
+    listed = client.get("/sessions", headers={"X-API-Key": "clave-ana"})
+    assert listed.json()["user"] == "ana"
+
+
+def test_other_users_sessions_are_forbidden(client, api_keys):
+    headers = {"X-API-Key": "clave-ana"}
+    assert client.get("/sessions", params={"user": "bob"}, headers=headers).status_code == 403
+    assert client.delete("/sessions/bob_x", params={"user": "bob"}, headers=headers).status_code == 403
+    assert client.post("/query", json={"user": "bob", "query": "hola"}, headers=headers).status_code == 403
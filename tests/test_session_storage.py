@@ -0,0 +1,30 @@
+import pytest
+
+from src.storage.connection import close_connections
+
+
+@pytest.mark.parametrize("mode", ["per_session", "shared"])
+def test_session_written_by_build_team_survives_fresh_storage(app_env, stubs, monkeypatch, mode):
+    from agno.storage.sqlite import SqliteStorage
+
+    from src.config import get_settings, settings
+    from src.core.runner import run_turn
+    from src.core.team_builder import build_team, generate_session_id, unwrap_team
+    from src.storage.sessions import session_table_name
+
+    monkeypatch.setenv("SESSION_STORAGE_MODE", mode)
+    get_settings.cache_clear()
+
+    session_id = generate_session_id("ana")
+    team = build_team("ana", session_id)
+    run_turn(team, "¿Qué es un lakehouse?", "ana", session_id)
+    table = session_table_name("ana", session_id)
+    unwrap_team(team).storage.db_engine.dispose()
+    close_connections()
+
+    # Storage nuevo sobre el mismo fichero: la sesión debe seguir ahí
+    fresh = SqliteStorage(table_name=table, db_file=settings.db_file_path, mode="team")
+    session = fresh.read(session_id=session_id, user_id="ana")
+    assert session is not None
+    assert session.user_id == "ana"
+    assert session.memory and session.memory.get("runs")
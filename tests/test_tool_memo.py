@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+
+from src.storage.tool_memo import (
+    TransientResult,
+    delete_session_memo,
+    get_memo,
+    normalize_args,
+    tool_memo_hook,
+)
+
+
+def _agent(session_id="s1", tools=(), run_id="run-1"):
+    return SimpleNamespace(user_id="ana", session_id=session_id, tools=list(tools), run_id=run_id)
+
+
+class _Counter:
+    """Herramienta falsa que cuenta sus ejecuciones."""
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, **arguments):
+        self.calls += 1
+        return self.result(arguments) if callable(self.result) else self.result
+
+
+def test_repeated_call_is_served_from_memo(app_env):
+    tool = _Counter(lambda args: f"resultado de {args['query']}")
+    first = tool_memo_hook(_agent(), "search", tool, {"query": "Data  Lakehouse"})
+    second = tool_memo_hook(_agent(), "search", tool, {"query": "data lakehouse "})
+
+    assert first == second == "resultado de Data  Lakehouse"
+    assert tool.calls == 1
+
+
+def test_memo_is_scoped_to_session_and_cleared_with_it(app_env):
+    tool = _Counter("ok")
+    tool_memo_hook(_agent("s1"), "search", tool, {"query": "kafka"})
+    tool_memo_hook(_agent("s2"), "search", tool, {"query": "kafka"})
+    assert tool.calls == 2
+
+    assert delete_session_memo("ana", "s1") == 1
+    tool_memo_hook(_agent("s1"), "search", tool, {"query": "kafka"})
+    assert tool.calls == 3
+
+
+def test_transient_results_and_unlisted_tools_are_not_memoized(app_env):
+    failing = _Counter(TransientResult("⚠️ No encontré resultados"))
+    tool_memo_hook(_agent(), "search", failing, {"query": "kafka"})
+    tool_memo_hook(_agent(), "search", failing, {"query": "kafka"})
+    assert failing.calls == 2
+
+    other = _Counter("ok")
+    tool_memo_hook(_agent(), "transfer_task_to_member", other, {"member_id": "rag-agent"})
+    tool_memo_hook(_agent(), "transfer_task_to_member", other, {"member_id": "rag-agent"})
+    assert other.calls == 2
+
+
+def test_injected_agent_argument_does_not_change_key():
+    assert normalize_args({"query": "Kafka", "agent": object()}) == normalize_args({"query": "kafka"})
+    assert normalize_args({"url": "https://ex.com/A"}) != normalize_args({"url": "https://ex.com/a"})
+
+
+def test_failed_vertex_search_is_not_memoized(app_env, stubs, monkeypatch):
+    import src.tools.vector_embedding as vector_embedding
+
+    tool = vector_embedding.AsyncVertexSearchTool("p", "d", cache=None)
+    queries = {"queries": ["kafka exactly once", "spark streaming"]}
+
+    class _Unavailable:
+        async def search(self, request):
+            raise RuntimeError("503 Service Unavailable")
+
+    healthy = vector_embedding._async_search_client
+    monkeypatch.setattr(vector_embedding, "_async_search_client", _Unavailable())
+    failed = tool_memo_hook(_agent(tools=[tool]), "search_many", tool.search_many, dict(queries))
+    assert isinstance(failed, TransientResult)
+
+    monkeypatch.setattr(vector_embedding, "_async_search_client", healthy)
+    recovered = tool_memo_hook(_agent(tools=[tool]), "search_many", tool.search_many, dict(queries))
+    assert recovered.startswith("[")
+    assert get_memo("ana", "s1", "search_many", normalize_args(queries)) == recovered
+
+
+def test_duckduckgo_memo_hits_are_deduplicated_per_turn(app_env, stubs):
+    from src.tools.web_search import CachedDuckDuckGoTools
+
+    web = CachedDuckDuckGoTools(caches={})
+    arguments = {"query": "spark 4 release", "max_results": 3}
+    agent = _agent(tools=[web], run_id="turn-1")
+    first = tool_memo_hook(agent, "duckduckgo_search", web.duckduckgo_search, dict(arguments))
+
+    agent.run_id = "turn-2"
+    # Acierto de la memo en un turno nuevo: resultados completos y URL registradas como vistas
+    assert tool_memo_hook(agent, "duckduckgo_search", web.duckduckgo_search, dict(arguments)) == first
+    repeated = tool_memo_hook(agent, "duckduckgo_search", web.duckduckgo_search, dict(arguments))
+    assert isinstance(repeated, TransientResult)
+    assert "ya se devolvieron" in repeated
+
+
+def test_memo_hit_is_recorded_on_tool_span(app_env, monkeypatch):
+    from src.config import get_settings
+    from src.core.telemetry import current_span, span, trace_turn
+
+    monkeypatch.setenv("TELEMETRY_ENABLED", "true")
+    get_settings.cache_clear()
+    tool = _Counter("ok")
+    seen = []
+    with trace_turn("ana", "s1"):
+        for _ in range(2):
+            with span("tool:search", "tool"):
+                tool_memo_hook(_agent(), "search", tool, {"query": "kafka"})
+                seen.append(current_span().attributes.get("memo_hit"))
+    assert seen == [False, True]
@@ -0,0 +1,51 @@
+from src.storage.turns import MATCH_END, MATCH_START, append_turn, list_session_metadata, search_turns
+
+
+def _history():
+    append_turn("ana", "s1", "¿Cómo particiono una tabla Delta?", "Particiona por fecha de ingesta.")
+    append_turn("ana", "s1", "¿Y el Z-ordering en Delta?", "Agrupa datos relacionados en los mismos archivos.")
+    append_turn("ana", "s2", "Explícame la compactación", "La compactación de Delta reduce archivos pequeños.")
+    append_turn("luis", "s3", "¿Qué es Delta Lake?", "Una capa de almacenamiento transaccional.")
+
+
+def test_search_groups_best_turn_per_session(app_env):
+    _history()
+    matches = search_turns("delta", user="ana")
+
+    assert {match.session_id for match in matches} == {"s1", "s2"}
+    s1 = next(match for match in matches if match.session_id == "s1")
+    assert s1.session_matches == 2
+    assert MATCH_START in s1.query_snippet + s1.answer_snippet
+    assert MATCH_END in s1.query_snippet + s1.answer_snippet
+
+
+def test_search_filters_by_user_and_ignores_accents(app_env):
+    _history()
+    assert [match.user_id for match in search_turns("almacenamiento transaccional")] == ["luis"]
+    assert search_turns("compactacion", user="luis") == []
+    assert [match.session_id for match in search_turns("compactacion", user="ana")] == ["s2"]
+
+
+def test_search_all_terms_or_any(app_env):
+    _history()
+    assert search_turns("particiona zorder", user="ana") == []
+    assert len(search_turns("particiona compactación", user="ana", match_any=True)) == 2
+
+
+def test_search_without_grouping_returns_every_turn(app_env):
+    _history()
+    matches = search_turns("delta", user="ana", group_sessions=False)
+    assert sorted((match.session_id, match.turn) for match in matches) == [("s1", 1), ("s1", 2), ("s2", 1)]
+
+
+def test_search_handles_fts_syntax_in_input(app_env):
+    _history()
+    assert search_turns('delta"* (', user="ana")
+    assert search_turns("   ") == []
+
+
+def test_session_metadata_follows_turns(app_env):
+    _history()
+    metadata = {item.session_id: item for item in list_session_metadata("ana")}
+    assert metadata["s1"].turns == 2
+    assert metadata["s2"].turns == 1
@@ -0,0 +1,110 @@
+import socket
+import time
+import urllib.request
+
+import pytest
+
+from src.storage.cache import make_cache_key
+from src.storage.tool_memo import TransientResult
+from src.tools.web_search import CachedDuckDuckGoTools, _PublicRedirectHandler, check_public_url, get_web_caches
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8000/",
+    "http://localhost/admin",
+    "http://10.1.2.3/",
+    "http://192.168.0.10/",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://100.64.0.1/",
+    "http://0.0.0.0/",
+    "http://[::1]/",
+    "http://[::ffff:127.0.0.1]/",
+    "http://[fe80::1]/",
+    "http://224.0.0.1/",
+])
+def test_non_public_addresses_are_rejected(url):
+    with pytest.raises(ValueError):
+        check_public_url(url)
+
+
+@pytest.mark.parametrize("url", ["ftp://93.184.216.34/file", "file:///etc/passwd", "http:///path", "gopher://x"])
+def test_only_http_urls_with_host_are_accepted(url):
+    with pytest.raises(ValueError):
+        check_public_url(url)
+
+
+def test_public_address_is_accepted():
+    check_public_url("https://93.184.216.34/docs")
+
+
+def test_redirects_are_checked_again():
+    handler = _PublicRedirectHandler()
+    request = urllib.request.Request("https://93.184.216.34/")
+    with pytest.raises(ValueError):
+        handler.redirect_request(request, None, 302, "Found", {}, "http://127.0.0.1/admin")
+    with pytest.raises(ValueError):
+        handler.redirect_request(request, None, 302, "Found", {}, "ftp://93.184.216.34/file")
+    followed = handler.redirect_request(request, None, 302, "Found", {}, "https://93.184.216.34/next")
+    assert followed.full_url == "https://93.184.216.34/next"
+
+
+def test_fetch_page_refuses_private_hosts_without_connecting(app_env, monkeypatch):
+    def _no_network(*args, **kwargs):
+        raise AssertionError("no debe abrir conexiones")
+
+    monkeypatch.setattr("src.tools.web_search._opener.open", _no_network)
+    result = CachedDuckDuckGoTools(caches={}).fetch_page("http://127.0.0.1:9/")
+    assert isinstance(result, TransientResult)
+    assert "no permitida" in result
+
+
+def _resolver(*answers):
+    """``getaddrinfo`` falso que devuelve cada respuesta en orden (la última se repite)."""
+    calls = []
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        address = answers[min(len(calls), len(answers) - 1)]
+        calls.append(host)
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", (address, port))]
+
+    return getaddrinfo, calls
+
+
+def test_connection_is_pinned_to_the_verified_address(app_env, monkeypatch):
+    getaddrinfo, _ = _resolver("93.184.216.34")
+    connected = []
+
+    def create_connection(address, *args, **kwargs):
+        connected.append(address)
+        raise OSError("sin red en los tests")
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    monkeypatch.setattr(socket, "create_connection", create_connection)
+    result = CachedDuckDuckGoTools(caches={}).fetch_page("http://docs.example.org/guide")
+
+    assert isinstance(result, TransientResult)
+    assert connected == [("93.184.216.34", 80)]
+
+
+def test_dns_rebinding_after_check_is_blocked(app_env, monkeypatch):
+    getaddrinfo, calls = _resolver("93.184.216.34", "127.0.0.1")
+    connected = []
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    monkeypatch.setattr(socket, "create_connection", lambda address, *a, **k: connected.append(address))
+
+    result = CachedDuckDuckGoTools(caches={}).fetch_page("http://rebind.example.org/")
+
+    assert len(calls) == 2
+    assert "no permitida" in result
+    assert connected == []
+
+
+def test_cached_page_is_not_served_for_blocked_hosts(app_env):
+    tools = CachedDuckDuckGoTools(caches=get_web_caches())
+    url = "http://127.0.0.1:8080/admin"
+    tools._cache("pages").set(make_cache_key("page", url), {
+        "content": "secreto", "etag": None, "last_modified": None, "fresh_until": time.time() + 3600,
+    })
+    result = tools.fetch_page(url)
+    assert "no permitida" in result
+    assert "secreto" not in result